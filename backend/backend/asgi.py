@@ -5,6 +5,13 @@ It exposes the ASGI callable as a module-level variable named ``application``.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.0/howto/deployment/asgi/
+
+El stream de notificaciones (/api/notificaciones/stream/) mantiene conexiones
+abiertas: sírvelo con un servidor ASGI (uvicorn/daphne), no con WSGI. Pago,
+carrito, perfil y notificaciones son vistas async: bajo WSGI funcionan, pero
+cada petición ocupa un hilo mientras espera a Transbank
+(`manage.py benchmark_asgi` compara ambos; `manage.py benchmark_sse` mide
+cuántos streams inactivos aguanta un worker).
 """
 
 import os
@@ -13,4 +20,19 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
 
-application = get_asgi_application()
+django_asgi = get_asgi_application()
+
+from django.urls import reverse  # noqa: E402  (necesita django.setup())
+
+RUTA_STREAM = reverse('notificaciones_stream')
+
+
+async def application(scope, receive, send):
+    # Django abre un ThreadSensitiveContext por petición, y con él un hilo propio
+    # para sync_to_async que vive hasta que la respuesta termina: un stream abierto
+    # retenía un hilo (~270 KB por conexión). Sin ese contexto, lo síncrono de los
+    # streams (autenticar, leer pendientes) corre en el hilo único compartido de
+    # asgiref: son consultas cortas y solo al conectar.
+    if scope['type'] == 'http' and scope['path'] == RUTA_STREAM:
+        return await django_asgi.handle(scope, receive, send)
+    return await django_asgi(scope, receive, send)
@@ -12,6 +12,8 @@ https://docs.djangoproject.com/en/5.0/ref/settings/
 
 from pathlib import Path
 from decouple import config # ### MODIFICADO 1: Importamos config ###
+from corsheaders.defaults import default_headers
+from django.core.exceptions import ImproperlyConfigured
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -60,6 +62,7 @@ MIDDLEWARE = [
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
     'corsheaders.middleware.CorsMiddleware',
+    'tienda.routers.LecturaReplicaMiddleware',
 ]
 
 REST_FRAMEWORK = {
@@ -75,6 +78,8 @@ CORS_ALLOWED_ORIGINS = [
 ]
 # CORS_ALLOW_ALL_ORIGINS = True # Comentado o Falso
 CORS_ALLOW_CREDENTIALS = True
+# Token del carrito de invitado (ver tienda/carrito.py)
+CORS_ALLOW_HEADERS = (*default_headers, 'x-carrito-invitado')
 # --- Fin de CORS ---
 
 
@@ -102,13 +107,94 @@ WSGI_APPLICATION = 'backend.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.0/ref/settings/#databases
 
-DATABASES = {
+# DB_ENGINE=postgresql para producción (requiere psycopg 3; DB_POOL además psycopg[pool]).
+# Sin configurar se usa SQLite, afinado en tienda/db.py al abrir cada conexión.
+DB_ENGINE = config('DB_ENGINE', default='sqlite')
+
+if DB_ENGINE == 'postgresql':
+    DB_POOL = config('DB_POOL', default=False, cast=bool)
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': config('DB_NAME', default='tienda'),
+            'USER': config('DB_USER', default='tienda'),
+            'PASSWORD': config('DB_PASSWORD', default=''),
+            'HOST': config('DB_HOST', default='localhost'),
+            'PORT': config('DB_PORT', default='5432'),
+            # Conexiones persistentes entre peticiones; con pool las recicla psycopg_pool
+            # (Django no permite ambas cosas a la vez)
+            'CONN_MAX_AGE': 0 if DB_POOL else config('DB_CONN_MAX_AGE', default=60, cast=int),
+            # Comprueba la conexión reutilizada antes de la primera consulta de cada petición
+            'CONN_HEALTH_CHECKS': True,
+            'OPTIONS': {
+                'pool': {
+                    'min_size': config('DB_POOL_MIN', default=2, cast=int),
+                    'max_size': config('DB_POOL_MAX', default=10, cast=int),
+                    'timeout': config('DB_POOL_TIMEOUT', default=10, cast=int),
+                },
+            } if DB_POOL else {},
+        }
+    }
+elif DB_ENGINE == 'sqlite':
+    # Las transacciones que escriben empiezan escribiendo (UPDATE sin cambios), así
+    # toman el lock de escritura de entrada y esperan busy_timeout en vez de fallar
+    # con "database is locked" al pasar de lectura a escritura. Con
+    # SQLITE_TRANSACTION_MODE=IMMEDIATE toda transacción lo toma al empezar, aunque
+    # solo lea. Es opcional: con muchas escrituras simultáneas reparte mejor la espera
+    # (estres_checkout con 20 hilos: p95 ~60 ms contra ~2 s), y cubre código que no
+    # siga la regla.
+    SQLITE_TRANSACTION_MODE = config('SQLITE_TRANSACTION_MODE', default='')
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': config('DB_NAME', default=str(BASE_DIR / 'db.sqlite3')),
+            'OPTIONS': {'transaction_mode': SQLITE_TRANSACTION_MODE} if SQLITE_TRANSACTION_MODE else {},
+            # Base de prueba en archivo y no en memoria: los tests de concurrencia usan
+            # hilos, y la memoria compartida de SQLite responde "table is locked" sin
+            # esperar el busy_timeout ni usar WAL
+            'TEST': {'NAME': str(BASE_DIR / 'test_db.sqlite3')},
+        }
+    }
+else:
+    raise ImproperlyConfigured("DB_ENGINE debe ser 'sqlite' o 'postgresql'")
+
+# Réplica de lectura opcional (ver tienda/routers.py): DB_REPLICA_HOST en PostgreSQL
+# o DB_REPLICA_NAME con otro archivo en SQLite. En los tests apunta a la base de
+# prueba principal (MIRROR), así que no hace falta sincronizar nada.
+_replica = {
+    'postgresql': {'HOST': config('DB_REPLICA_HOST', default='')},
+    'sqlite': {'NAME': config('DB_REPLICA_NAME', default='')},
+}[DB_ENGINE]
+if all(_replica.values()):
+    DATABASES['replica'] = {
+        **DATABASES['default'], **_replica,
+        'OPTIONS': dict(DATABASES['default']['OPTIONS']),
+        'TEST': {'MIRROR': 'default'},
+    }
+DATABASE_ROUTERS = ['tienda.routers.RouterReplica']
+# Segundos que las lecturas de un cliente siguen en la primaria después de que escribe
+DB_REPLICA_PEGADO = config('DB_REPLICA_PEGADO', default=5, cast=int)
+
+# Milisegundos que una conexión SQLite espera el lock de escritura antes de fallar
+SQLITE_BUSY_TIMEOUT = config('SQLITE_BUSY_TIMEOUT', default=10000, cast=int)
+
+
+# Cache
+# https://docs.djangoproject.com/en/5.0/topics/cache/
+# LocMemCache es por proceso: con varios workers conviene apuntar CACHE_BACKEND a
+# Redis o Memcached para que la invalidación por versión llegue a todos.
+
+CACHES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+        'BACKEND': config('CACHE_BACKEND', default='django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': config('CACHE_LOCATION', default='tienda'),
     }
 }
 
+# Cache de lecturas públicas (catálogo, planes, noticias); ver tienda/cache.py
+TIENDA_CACHE_ALIAS = 'default'
+TIENDA_CACHE_TIMEOUT = config('TIENDA_CACHE_TIMEOUT', default=300, cast=int)
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.0/ref/settings/#auth-password-validators
@@ -153,13 +239,54 @@ import os
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Boletas PDF (tienda/boletas.py): procesos que corren xhtml2pdf (0 = en el mismo
+# hilo) y segundos máximos que una descarga espera a que se genere la suya.
+BOLETAS_WORKERS = config('BOLETAS_WORKERS', default=2, cast=int)
+BOLETAS_TIMEOUT = config('BOLETAS_TIMEOUT', default=30, cast=int)
+# Tope de pedidos para /api/boletas/exportar/?formato=pdf (el ZIP no tiene tope)
+BOLETAS_EXPORT_MAX_PDF = config('BOLETAS_EXPORT_MAX_PDF', default=500, cast=int)
+
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 # --- CONFIGURACIÓN TRANSBANK WEBPAY (INTEGRACIÓN DE PRUEBA) ---
-TRANSBANK_BASE_URL = "https://webpay3gint.transbank.cl"
+TRANSBANK_BASE_URL = config('TRANSBANK_BASE_URL', default="https://webpay3gint.transbank.cl")
 TRANSBANK_API_KEY_ID = "597055555532"  # Código de comercio de prueba Webpay Plus
 TRANSBANK_API_KEY_SECRET = "579B532A7440BB0C9079DED94D31EA1615BACEB56610332264630D42D0A36B1C"
 
+# Cliente HTTP hacia Transbank (tienda/transbank.py). Timeouts en segundos.
+TRANSBANK_CONNECT_TIMEOUT = config('TRANSBANK_CONNECT_TIMEOUT', default=3.05, cast=float)
+TRANSBANK_READ_TIMEOUT = config('TRANSBANK_READ_TIMEOUT', default=15, cast=float)
+TRANSBANK_REINTENTOS = config('TRANSBANK_REINTENTOS', default=2, cast=int)
+TRANSBANK_BACKOFF = config('TRANSBANK_BACKOFF', default=0.3, cast=float)
+TRANSBANK_POOL = config('TRANSBANK_POOL', default=20, cast=int)
+TRANSBANK_CIRCUITO_UMBRAL = config('TRANSBANK_CIRCUITO_UMBRAL', default=5, cast=int)
+TRANSBANK_CIRCUITO_SEGUNDOS = config('TRANSBANK_CIRCUITO_SEGUNDOS', default=30, cast=int)
+
+# Vistas async (tienda/asincrono.py): hilos que pueden correr a la vez código
+# síncrono (transacciones, serializers) por proceso ASGI. Cada uno puede tener
+# abierta una conexión a la BD, así que no debería superar DB_POOL_MAX.
+ASYNC_MAX_HILOS = config('ASYNC_MAX_HILOS', default=10, cast=int)
+
+# Stream de notificaciones (tienda/eventos.py): los eventos pasan entre procesos
+# por la BD (varios workers, cron). Solo con un único worker puede apagarse.
+NOTIFICACIONES_ENTRE_PROCESOS = config('NOTIFICACIONES_ENTRE_PROCESOS', default=True, cast=bool)
+# Segundos entre lecturas de los eventos de otros procesos
+NOTIFICACIONES_INTERVALO = config('NOTIFICACIONES_INTERVALO', default=1.0, cast=float)
+
+# Minutos que se mantiene reservado el stock de un carrito mientras se paga
+RESERVA_STOCK_MINUTOS = config('RESERVA_STOCK_MINUTOS', default=15, cast=int)
+
+# Variantes WebP de las imágenes subidas (ver tienda/imagenes.py). 0 workers = en el mismo hilo
+IMAGENES_WORKERS = config('IMAGENES_WORKERS', default=2, cast=int)
+IMAGENES_ANCHOS = (160, 480, 960)
+IMAGENES_CALIDAD = config('IMAGENES_CALIDAD', default=80, cast=int)
+
+# Días sin actividad tras los que vence el carrito de un visitante sin cuenta
+CARRITO_INVITADO_DIAS = config('CARRITO_INVITADO_DIAS', default=7, cast=int)
+
+# Días de anticipación con que se avisa que una suscripción está por vencer
+SUSCRIPCION_AVISO_DIAS = config('SUSCRIPCION_AVISO_DIAS', default=7, cast=int)
+
 # Callback URLs
 WEBPAY_RETURN_URL = "http://127.0.0.1:8000/api/webpay/return/"
 WEBPAY_FINAL_URL = "http://localhost:3000/resultado"
\ No newline at end of file
@@ -1,8 +1,11 @@
 from django.apps import AppConfig
+from django.db.backends.signals import connection_created
 
 class TiendaConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'tienda'
 
     def ready(self):
-        pass
+        from . import signals
+        from .db import configurar_sqlite
+        connection_created.connect(configurar_sqlite, dispatch_uid='tienda_configurar_sqlite')
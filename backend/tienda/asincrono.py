@@ -0,0 +1,109 @@
+import asyncio
+import json
+import weakref
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.http import JsonResponse, QueryDict
+from django.http.multipartparser import MultiPartParser, MultiPartParserError
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+
+
+# --- VISTAS ASYNC (ASGI) ---
+# Las vistas de pago, carrito, perfil y notificaciones son corrutinas: mientras
+# esperan a Transbank o a la BD no retienen un hilo. Lo que sigue siendo síncrono
+# (transacciones con locks, serializers de DRF, JWTAuthentication) corre con
+# `en_hilo`, que limita cuántos hilos usa el proceso a la vez: Django da a cada
+# petición ASGI su propio hilo para sync_to_async, y sin tope 500 pagos esperando
+# serían 500 hilos y 500 conexiones a la BD. DRF no soporta vistas async, así que
+# `api_async` hace lo poco que usaban estas vistas de @api_view: método, JWT y
+# cuerpo JSON o multipart en `request.data`.
+
+_limites = weakref.WeakKeyDictionary()
+
+
+def _limite():
+    """Un semáforo por event loop (asyncio no permite compartirlos entre loops)."""
+    loop = asyncio.get_running_loop()
+    limite = _limites.get(loop)
+    if limite is None:
+        limite = _limites[loop] = asyncio.Semaphore(settings.ASYNC_MAX_HILOS)
+    return limite
+
+async def en_hilo(funcion, *args, **kwargs):
+    """Corre código síncrono (ORM con transacciones, DRF) sin bloquear el loop, con tope de hilos."""
+    async with _limite():
+        return await sync_to_async(funcion)(*args, **kwargs)
+
+
+def _usuario_jwt(raw_token):
+    auth = JWTAuthentication()
+    try:
+        return auth.get_user(auth.get_validated_token(raw_token))
+    except (InvalidToken, AuthenticationFailed):
+        return None
+
+async def usuario_jwt(raw_token):
+    """Usuario activo del access token, o None si falta, es inválido o está inactivo."""
+    if not raw_token:
+        return None
+    user = await en_hilo(_usuario_jwt, raw_token)
+    return user if user is not None and user.is_active else None
+
+
+def _leer_datos(request):
+    """Lo mismo que request.data de DRF: JSON, formulario o multipart (archivos incluidos)."""
+    if request.content_type == 'application/json':
+        datos = json.loads(request.body or b'{}')
+        if not isinstance(datos, dict):
+            # Las vistas leen campos con .get(): una lista o un escalar no es un cuerpo válido
+            raise ValueError("El cuerpo JSON debe ser un objeto")
+        return datos
+    if request.content_type == 'multipart/form-data':
+        if request.method == 'POST':
+            datos, archivos = request.POST, request.FILES
+        else:
+            # Django solo procesa el multipart de los POST; PATCH/PUT se leen aquí
+            datos, archivos = MultiPartParser(request.META, request, request.upload_handlers, request.encoding).parse()
+        datos = datos.copy()
+        datos.update(archivos)
+        return datos
+    if request.content_type == 'application/x-www-form-urlencoded':
+        return QueryDict(request.body, encoding=request.encoding)
+    return {}
+
+
+def api_async(*metodos, autenticado=True):
+    """
+    Para vistas `async def` de la API: responde 405 a otros métodos, 401 sin un JWT
+    válido (si `autenticado`), deja el usuario en request.user y el cuerpo en
+    request.data. Sin CSRF, como @api_view con JWT.
+    """
+    def decorador(vista):
+        @csrf_exempt
+        @wraps(vista)
+        async def envuelta(request, *args, **kwargs):
+            if request.method not in metodos:
+                return JsonResponse({'detail': f'Método "{request.method}" no permitido.'}, status=405)
+
+            auth = request.headers.get('Authorization', '')
+            user = await usuario_jwt(auth.removeprefix('Bearer ').strip()) if auth.startswith('Bearer ') else None
+            if user is None and autenticado:
+                return JsonResponse({'detail': 'No autenticado'}, status=401)
+            # Reemplaza el usuario perezoso de la sesión, que consultaría la BD dentro del loop
+            request.user = user or AnonymousUser()
+
+            try:
+                if request.content_type == 'multipart/form-data':
+                    request.data = await en_hilo(_leer_datos, request)
+                else:
+                    request.data = _leer_datos(request)
+            except (ValueError, MultiPartParserError):
+                return JsonResponse({'detail': 'Cuerpo de la petición mal formado'}, status=400)
+            return await vista(request, *args, **kwargs)
+        return envuelta
+    return decorador
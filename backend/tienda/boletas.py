@@ -0,0 +1,301 @@
+import hashlib
+import logging
+import multiprocessing
+import os
+import re
+import tempfile
+import threading
+import zipfile
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from django.conf import settings
+from django.db.models import Prefetch
+from django.http import FileResponse, HttpResponse, StreamingHttpResponse
+from django.template.loader import render_to_string
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils import timezone
+from django.utils.http import content_disposition_header
+from pypdf import PdfWriter
+
+from .models import Pedido, PedidoItem
+from .utils import html_a_pdf
+
+logger = logging.getLogger(__name__)
+
+
+# --- BOLETAS PDF CACHEADAS EN DISCO ---
+# Un pedido pagado no cambia, así que su PDF se genera una sola vez. El HTML sí se
+# renderiza en cada descarga (dos consultas y unos milisegundos) y su sha256 es el
+# nombre del archivo: si cambia el template o los datos del cliente sale otra boleta
+# sin invalidar nada a mano. xhtml2pdf, que es lo caro, corre en un pool de procesos
+# para no competir por el GIL con los workers que atienden peticiones.
+
+TEMPLATE_BOLETA = 'tienda/boleta.html'
+TROZO = 64 * 1024
+RANGO = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+_lock = threading.RLock()
+_en_curso = {}
+_procesos = None
+_hilos = None
+
+
+def con_detalle(pedidos):
+    """Cliente, perfil e ítems con su producto en 2 consultas por lote."""
+    items = PedidoItem.objects.select_related('producto').order_by('id')
+    return pedidos.select_related('user__profile').prefetch_related(Prefetch('items', queryset=items))
+
+def cargar_pedido(pedido_id):
+    return con_detalle(Pedido.objects.all()).get(id=pedido_id)
+
+def html_boleta(pedido):
+    # Aseguramos que los subtotales se calculen para el template PDF
+    for item in pedido.items.all():
+        item.subtotal = item.cantidad * item.precio_al_momento_compra
+    return render_to_string(TEMPLATE_BOLETA, {'pedido': pedido})
+
+def digest_de(html):
+    return hashlib.sha256(html.encode('utf-8')).hexdigest()
+
+def ruta_boleta(digest):
+    return os.path.join(settings.MEDIA_ROOT, 'boletas', digest[:2], f'{digest}.pdf')
+
+
+def _pool_procesos():
+    global _procesos
+    with _lock:
+        if _procesos is None:
+            # spawn: un fork con hilos vivos (y conexiones a la BD) no es seguro
+            _procesos = ProcessPoolExecutor(
+                max_workers=settings.BOLETAS_WORKERS,
+                mp_context=multiprocessing.get_context('spawn'),
+            )
+        return _procesos
+
+def _pool_hilos():
+    global _hilos
+    with _lock:
+        if _hilos is None:
+            _hilos = ThreadPoolExecutor(
+                max_workers=max(settings.BOLETAS_WORKERS, 1) * 2, thread_name_prefix='boletas',
+            )
+        return _hilos
+
+def _escribir(ruta, contenido):
+    # Archivo temporal + rename: nadie sirve jamás un PDF a medio escribir
+    directorio = os.path.dirname(ruta)
+    os.makedirs(directorio, exist_ok=True)
+    fd, temporal = tempfile.mkstemp(dir=directorio, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as archivo:
+            archivo.write(contenido)
+        os.replace(temporal, ruta)
+    except BaseException:
+        os.unlink(temporal)
+        raise
+
+def _descartar_pool(roto):
+    """Un pool con un proceso muerto rechaza todo lo que venga: el próximo trabajo crea otro."""
+    global _procesos
+    with _lock:
+        if _procesos is roto:
+            _procesos = None
+    roto.shutdown(wait=False)
+
+def _generar(digest, html):
+    ruta = ruta_boleta(digest)
+    if not os.path.exists(ruta):
+        if settings.BOLETAS_WORKERS:
+            procesos = _pool_procesos()
+            try:
+                pdf = procesos.submit(html_a_pdf, html).result()
+            except BrokenProcessPool:
+                _descartar_pool(procesos)
+                raise
+        else:
+            pdf = html_a_pdf(html)
+        _escribir(ruta, pdf)
+    return ruta
+
+def _trabajo(digest, html):
+    """Un solo trabajo por contenido: quien llegue mientras se genera espera el mismo Future."""
+    with _lock:
+        futuro = _en_curso.get(digest)
+        if futuro is None:
+            futuro = _en_curso[digest] = _pool_hilos().submit(_generar, digest, html)
+            futuro.add_done_callback(lambda f: _en_curso.pop(digest, None))
+    return futuro
+
+
+def obtener_boleta(pedido):
+    """(digest, ruta) del PDF del pedido, generándolo si aún no está en disco."""
+    html = html_boleta(pedido)
+    digest = digest_de(html)
+    ruta = ruta_boleta(digest)
+    if os.path.exists(ruta):
+        return digest, ruta
+    return digest, _trabajo(digest, html).result(timeout=settings.BOLETAS_TIMEOUT)
+
+def encolar_boleta(pedido_id):
+    """Pre-genera la boleta en segundo plano (se llama al confirmar el pago)."""
+    html = html_boleta(cargar_pedido(pedido_id))
+    return _trabajo(digest_de(html), html)
+
+
+# --- EXPORTACIÓN MASIVA ---
+# Los pedidos se leen con iterator() por lotes y a lo más `ventana` boletas están
+# en vuelo a la vez: la memoria no depende de cuántos pedidos abarque el rango.
+
+def boletas_de(pedidos, ventana=None):
+    """
+    Recorre `pedidos` en orden y entrega (pedido, ruta o None si falló). Las que
+    faltan en disco se encolan en el pool mientras se entregan las anteriores.
+    """
+    ventana = ventana or max(settings.BOLETAS_WORKERS, 1) * 4
+    pendientes = deque()
+
+    def resolver(pedido, ruta, futuro):
+        if futuro is None:
+            return pedido, ruta
+        try:
+            return pedido, futuro.result(timeout=settings.BOLETAS_TIMEOUT)
+        except Exception:
+            # Lo que sea (PDF inválido, timeout, pool roto, disco lleno): la exportación
+            # ya empezó a enviarse, así que el pedido se anota y se sigue con el resto
+            logger.exception("No se pudo generar la boleta del pedido %s", pedido.id)
+            return pedido, None
+
+    for pedido in con_detalle(pedidos).iterator(chunk_size=100):
+        html = html_boleta(pedido)
+        digest = digest_de(html)
+        ruta = ruta_boleta(digest)
+        futuro = None if os.path.exists(ruta) else _trabajo(digest, html)
+        # El HTML y los ítems ya no hacen falta: solo guardamos lo mínimo en la ventana
+        pedido._prefetched_objects_cache = {}
+        pendientes.append((pedido, ruta, futuro))
+        if len(pendientes) >= ventana:
+            yield resolver(*pendientes.popleft())
+    while pendientes:
+        yield resolver(*pendientes.popleft())
+
+
+class _SalidaZip:
+    """Destino no buscable para zipfile: acumula lo escrito hasta que el generador lo vacía."""
+
+    def __init__(self):
+        self.trozos = []
+        self.posicion = 0
+
+    def write(self, datos):
+        self.trozos.append(bytes(datos))
+        self.posicion += len(datos)
+        return len(datos)
+
+    def tell(self):
+        return self.posicion
+
+    def flush(self):
+        pass
+
+    def vaciar(self):
+        datos = b''.join(self.trozos)
+        self.trozos.clear()
+        return datos
+
+def zip_boletas(pedidos):
+    """ZIP generado al vuelo, un PDF por pedido; los que fallen se listan en ERRORES.txt."""
+    salida = _SalidaZip()
+    errores = []
+    with zipfile.ZipFile(salida, 'w', compression=zipfile.ZIP_DEFLATED) as archivo_zip:
+        for pedido, ruta in boletas_de(pedidos):
+            if ruta is None:
+                errores.append(f"Pedido {pedido.id} ({pedido.orden_compra}): no se pudo generar la boleta")
+                continue
+            info = zipfile.ZipInfo(
+                f"boleta-pedido-{pedido.id}.pdf",
+                date_time=timezone.localtime(pedido.creado_en).timetuple()[:6],
+            )
+            info.compress_type = zipfile.ZIP_DEFLATED
+            with open(ruta, 'rb') as origen, archivo_zip.open(info, 'w') as destino:
+                for trozo in iter(lambda: origen.read(TROZO), b''):
+                    destino.write(trozo)
+                    yield salida.vaciar()
+            yield salida.vaciar()
+        if errores:
+            archivo_zip.writestr('ERRORES.txt', '\n'.join(errores) + '\n')
+    yield salida.vaciar()
+
+def pdf_boletas(pedidos):
+    """
+    Un solo PDF con todas las boletas. pypdf arma el documento completo antes de
+    escribirlo, por eso la vista acota la cantidad (BOLETAS_EXPORT_MAX_PDF); la
+    salida pasa por un archivo temporal y se envía en trozos.
+    """
+    escritor = PdfWriter()
+    for pedido, ruta in boletas_de(pedidos):
+        if ruta is not None:
+            escritor.append(ruta)
+    with tempfile.SpooledTemporaryFile(max_size=8 * 1024 * 1024) as salida:
+        escritor.write(salida)
+        escritor.close()
+        salida.seek(0)
+        yield from iter(lambda: salida.read(TROZO), b'')
+
+
+def _leer(archivo, restante):
+    try:
+        while restante > 0:
+            trozo = archivo.read(min(TROZO, restante))
+            if not trozo:
+                break
+            restante -= len(trozo)
+            yield trozo
+    finally:
+        archivo.close()
+
+def servir_pdf(request, ruta, digest, nombre):
+    """
+    FileResponse con ETag (el digest), 304 ante If-None-Match y un único rango
+    `bytes=` (206/416) para reanudar descargas. If-Range distinto anula el rango.
+    """
+    etag = f'"{digest}"'
+    no_modificado = get_conditional_response(request, etag=etag)
+    if no_modificado is not None:
+        response = no_modificado
+    else:
+        tamano = os.path.getsize(ruta)
+        match = RANGO.match(request.headers.get('Range', ''))
+        if request.headers.get('If-Range', etag) != etag:
+            match = None
+
+        if match and any(match.groups()):
+            inicio, fin = match.groups()
+            if inicio:
+                inicio = int(inicio)
+                fin = min(int(fin), tamano - 1) if fin else tamano - 1
+            else:
+                inicio, fin = max(tamano - int(fin), 0), tamano - 1
+            if inicio > fin:
+                response = HttpResponse(status=416)
+                response['Content-Range'] = f'bytes */{tamano}'
+                return response
+            archivo = open(ruta, 'rb')
+            archivo.seek(inicio)
+            response = StreamingHttpResponse(
+                _leer(archivo, fin - inicio + 1), status=206, content_type='application/pdf',
+            )
+            response['Content-Range'] = f'bytes {inicio}-{fin}/{tamano}'
+            response['Content-Length'] = str(fin - inicio + 1)
+            response['Content-Disposition'] = content_disposition_header(True, nombre)
+        else:
+            response = FileResponse(
+                open(ruta, 'rb'), as_attachment=True, filename=nombre, content_type='application/pdf',
+            )
+        response['Accept-Ranges'] = 'bytes'
+
+    response['ETag'] = etag
+    patch_cache_control(response, private=True, no_cache=True)
+    patch_vary_headers(response, ['Authorization'])
+    return response
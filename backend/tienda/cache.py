@@ -0,0 +1,160 @@
+import hashlib
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils import timezone
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import http_date
+from django.views.decorators.http import condition
+from rest_framework.response import Response
+
+from .asincrono import en_hilo
+
+
+# --- CACHE VERSIONADA DE LECTURAS PÚBLICAS ---
+# Cada modelo tiene un contador de versión en la cache que las señales post_save /
+# post_delete incrementan. La clave de una respuesta incluye las versiones de todos
+# los modelos de los que depende, así que una escritura invalida sus entradas sin
+# tener que buscarlas: las viejas simplemente dejan de leerse y expiran solas.
+
+def get_cache():
+    return caches[settings.TIENDA_CACHE_ALIAS]
+
+def _clave_version(modelo):
+    return f"tienda:version:{modelo._meta.label_lower}"
+
+def versiones(modelos):
+    cache = get_cache()
+    claves = [_clave_version(modelo) for modelo in modelos]
+    guardadas = cache.get_many(claves)
+    return [guardadas.get(clave, 1) for clave in claves]
+
+def incrementar_version(modelo):
+    cache = get_cache()
+    clave = _clave_version(modelo)
+    # add() no pisa un valor existente; incr() es atómico en los backends que lo soportan
+    cache.add(clave, 1, timeout=None)
+    try:
+        cache.incr(clave)
+    except ValueError:
+        cache.set(clave, 2, timeout=None)
+
+def _contar(evento, namespace):
+    cache = get_cache()
+    clave = f"tienda:stats:{namespace}:{evento}"
+    cache.add(clave, 0, timeout=None)
+    try:
+        cache.incr(clave)
+    except ValueError:
+        cache.set(clave, 1, timeout=None)
+
+def estadisticas(namespaces):
+    cache = get_cache()
+    claves = [
+        f"tienda:stats:{namespace}:{evento}"
+        for namespace in namespaces for evento in ('hits', 'misses')
+    ]
+    valores = cache.get_many(claves)
+    return {
+        namespace: {
+            evento: valores.get(f"tienda:stats:{namespace}:{evento}", 0)
+            for evento in ('hits', 'misses')
+        }
+        for namespace in namespaces
+    }
+
+
+# --- GET CONDICIONAL (ETag / 304) ---
+
+def etag_de(*partes):
+    """ETag a partir de un resumen barato (conteos, máximos) en vez del cuerpo serializado."""
+    return '"%s"' % hashlib.md5('|'.join(str(parte) for parte in partes).encode('utf-8')).hexdigest()
+
+def _sin_cache_compartida(response):
+    # El navegador guarda la respuesta pero revalida siempre con If-None-Match
+    patch_cache_control(response, private=True, no_cache=True)
+    patch_vary_headers(response, ['Authorization'])
+    return response
+
+def etag_condicional(etag_func):
+    """
+    `condition()` de Django para vistas DRF: va por dentro de @api_view (o con
+    method_decorator), de modo que etag_func ya recibe el usuario autenticado.
+    En vistas async va por dentro de @api_async y etag_func (que consulta la BD)
+    corre en un hilo.
+    """
+    def decorator(func):
+        if iscoroutinefunction(func):
+            @wraps(func)
+            async def ainner(request, *args, **kwargs):
+                etag = await en_hilo(etag_func, request, *args, **kwargs)
+                vista = condition(etag_func=lambda *a, **k: etag)(func)
+                return _sin_cache_compartida(await vista(request, *args, **kwargs))
+            return ainner
+
+        vista = condition(etag_func=etag_func)(func)
+
+        @wraps(func)
+        def inner(request, *args, **kwargs):
+            return _sin_cache_compartida(vista(request, *args, **kwargs))
+        return inner
+    return decorator
+
+
+class CachedReadMixin:
+    """
+    Read-through para list/retrieve de un ViewSet. Se cachean los datos ya
+    serializados por separado para staff y para el resto, y la respuesta lleva
+    ETag/Last-Modified. `cache_modelos` lista los modelos de los que depende.
+    """
+    cache_modelos = ()
+
+    def get_cache_namespace(self):
+        return self.basename
+
+    def get_cache_key(self, request):
+        audiencia = 'staff' if request.user.is_staff else 'publico'
+        version = '.'.join(str(v) for v in versiones(self.cache_modelos))
+        url = hashlib.sha1(request.build_absolute_uri().encode('utf-8')).hexdigest()
+        return f"tienda:resp:{self.get_cache_namespace()}:{version}:{audiencia}:{url}"
+
+    def _respuesta_cacheada(self, request, generar, *args, **kwargs):
+        cache = get_cache()
+        namespace = self.get_cache_namespace()
+        clave = self.get_cache_key(request)
+        etag = '"%s"' % hashlib.md5(clave.encode('utf-8')).hexdigest()
+
+        # El ETag sale de la clave, así que un If-None-Match vigente ni siquiera lee la cache
+        no_modificado = get_conditional_response(request, etag=etag)
+        if no_modificado is not None:
+            _contar('hits', namespace)
+            return _sin_cache_compartida(no_modificado)
+
+        entrada = cache.get(clave)
+        if entrada is None:
+            _contar('misses', namespace)
+            response = generar(request, *args, **kwargs)
+            if response.status_code != 200:
+                return response
+            entrada = {
+                'data': response.data,
+                'etag': etag,
+                'last_modified': http_date(timezone.now().timestamp()),
+            }
+            cache.set(clave, entrada, timeout=settings.TIENDA_CACHE_TIMEOUT)
+        else:
+            _contar('hits', namespace)
+            response = Response(entrada['data'])
+
+        response['ETag'] = entrada['etag']
+        response['Last-Modified'] = entrada['last_modified']
+        return _sin_cache_compartida(response)
+
+    def list(self, request, *args, **kwargs):
+        return self._respuesta_cacheada(request, super().list, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self._respuesta_cacheada(request, super().retrieve, *args, **kwargs)
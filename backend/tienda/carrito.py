@@ -0,0 +1,306 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core import signing
+from django.db import transaction
+from django.db.models import F, OuterRef, Prefetch, Q, Subquery, Sum
+from django.db.models.functions import Coalesce
+from django.db.models.lookups import GreaterThanOrEqual
+from django.utils import timezone
+
+from .models import Carrito, CarritoInvitado, CarritoItem, Producto
+from .reservas import StockInsuficiente
+
+
+class OperacionInvalida(Exception):
+    pass
+
+
+MAX_OPERACIONES = 100
+TIPOS = ('add', 'set', 'remove')
+
+
+# --- LECTURA DEL CARRITO ---
+
+def items_con_producto():
+    return CarritoItem.objects.select_related('producto').order_by('id')
+
+def carrito_con_items(user):
+    """
+    Carrito con ítems y productos precargados y el total calculado en SQL:
+    2 consultas sin importar cuántos ítems tenga (3 si hay que crearlo).
+    """
+    carritos = Carrito.objects.annotate(
+        total=Coalesce(Sum(F('items__cantidad') * F('items__producto__precio')), 0),
+    ).prefetch_related(Prefetch('items', queryset=items_con_producto()))
+    try:
+        return carritos.get(user=user)
+    except Carrito.DoesNotExist:
+        carrito, _ = Carrito.objects.get_or_create(user=user)
+        carrito.total = 0
+        carrito._prefetched_objects_cache = {'items': CarritoItem.objects.none()}
+        return carrito
+
+def resumen(carrito_id):
+    return CarritoItem.objects.filter(carrito_id=carrito_id).aggregate(
+        total=Coalesce(Sum(F('cantidad') * F('producto__precio')), 0),
+        unidades=Coalesce(Sum('cantidad'), 0),
+    )
+
+
+# --- ESCRITURAS ATÓMICAS ---
+# La restricción única (carrito, producto) garantiza una línea por producto. Las
+# cantidades se cambian con UPDATE ... WHERE cantidad <= stock: el stock se lee en
+# la misma sentencia, así que no hay ventana entre validar y escribir.
+
+def _stock():
+    return Subquery(Producto.objects.filter(id=OuterRef('producto_id')).values('stock')[:1])
+
+def _sin_stock(producto_id, en_carrito=0):
+    producto = Producto.objects.filter(id=producto_id).values('nombre', 'stock').first()
+    if producto is None:
+        return StockInsuficiente(f"Producto {producto_id} no encontrado")
+    disponible = max(producto['stock'] - en_carrito, 0)
+    return StockInsuficiente(f"Stock insuficiente para {producto['nombre']} (disponible: {disponible})")
+
+def sumar_al_carrito(user, producto_id, cantidad):
+    """
+    Suma `cantidad` a la línea del producto sin leerla antes: la fila se crea en
+    cero con ignore_conflicts y un UPDATE ... F('cantidad') + n la incrementa solo
+    si el resultado no supera el stock. Dos clics simultáneos nunca se pisan ni
+    duplican la línea. Si no alcanza el stock se deshace todo y lanza StockInsuficiente.
+    """
+    # Fuera de la transacción: así su primera sentencia ya es una escritura y en
+    # SQLite toma el lock de escritura de entrada (esperando si está ocupado)
+    carrito, _ = Carrito.objects.get_or_create(user=user)
+    with transaction.atomic():
+        CarritoItem.objects.bulk_create(
+            [CarritoItem(carrito=carrito, producto_id=producto_id, cantidad=0)], ignore_conflicts=True,
+        )
+        sumadas = CarritoItem.objects.filter(
+            carrito=carrito, producto_id=producto_id, cantidad__lte=_stock() - cantidad,
+        ).update(cantidad=F('cantidad') + cantidad)
+        if not sumadas:
+            en_carrito = CarritoItem.objects.filter(carrito=carrito, producto_id=producto_id).values_list('cantidad', flat=True).first()
+            raise _sin_stock(producto_id, en_carrito or 0)
+    return carrito
+
+def fijar_cantidad(item, cantidad):
+    """
+    Fija la cantidad de una línea. Bajarla siempre se permite (aunque el stock
+    haya caído por debajo); subirla solo si el stock actual la cubre.
+    """
+    fijadas = CarritoItem.objects.filter(
+        Q(cantidad__gte=cantidad) | Q(GreaterThanOrEqual(_stock(), cantidad)), id=item.id,
+    ).update(cantidad=cantidad)
+    if not fijadas:
+        raise _sin_stock(item.producto_id)
+
+
+# --- OPERACIONES EN LOTE ---
+
+def _validar(operaciones):
+    if not isinstance(operaciones, list) or not operaciones:
+        raise OperacionInvalida("'operaciones' debe ser una lista no vacía")
+    if len(operaciones) > MAX_OPERACIONES:
+        raise OperacionInvalida(f"Máximo {MAX_OPERACIONES} operaciones por lote")
+    limpias = []
+    for indice, operacion in enumerate(operaciones):
+        if not isinstance(operacion, dict) or operacion.get('op') not in TIPOS:
+            raise OperacionInvalida(f"Operación {indice}: 'op' debe ser add, set o remove")
+        try:
+            producto_id = int(operacion.get('producto_id'))
+            cantidad = int(operacion.get('cantidad', 1 if operacion['op'] == 'add' else 0))
+        except (TypeError, ValueError):
+            raise OperacionInvalida(f"Operación {indice}: producto_id y cantidad deben ser enteros")
+        if operacion['op'] == 'set' and cantidad < 0:
+            raise OperacionInvalida(f"Operación {indice}: cantidad no puede ser negativa")
+        limpias.append((operacion['op'], producto_id, cantidad))
+    return limpias
+
+def _plegar(cantidades, operaciones, productos, recortar=False):
+    """
+    Resuelve en memoria las operaciones sobre {producto_id: cantidad} y devuelve
+    las cantidades finales de los productos tocados (0 = quitar). Subir una
+    cantidad por sobre el stock es un error, o con `recortar` se deja en el stock.
+    """
+    finales = {}
+    for tipo, producto_id, cantidad in operaciones:
+        actual = finales.get(producto_id, cantidades.get(producto_id, 0))
+        if tipo == 'add':
+            finales[producto_id] = actual + cantidad
+        elif tipo == 'set':
+            finales[producto_id] = cantidad
+        else:
+            finales[producto_id] = 0
+
+    for producto_id, cantidad in finales.items():
+        producto = productos[producto_id]
+        # Bajar siempre se permite; subir solo hasta el stock
+        if cantidad > cantidades.get(producto_id, 0) and cantidad > producto['stock']:
+            if not recortar:
+                raise OperacionInvalida(
+                    f"Stock insuficiente para {producto['nombre']} (disponible: {producto['stock']})"
+                )
+            finales[producto_id] = max(producto['stock'], cantidades.get(producto_id, 0))
+    return finales
+
+def _productos(operaciones, recortar=False):
+    """{id: {nombre, stock}} de los productos de las operaciones."""
+    producto_ids = {producto_id for _, producto_id, _ in operaciones}
+    productos = {
+        p['id']: p for p in Producto.objects.filter(id__in=producto_ids).values('id', 'nombre', 'stock')
+    }
+    faltantes = producto_ids - set(productos)
+    if faltantes and not recortar:
+        raise OperacionInvalida(f"Productos no encontrados: {sorted(faltantes)}")
+    return productos
+
+def aplicar_operaciones(user, operaciones, recortar=False):
+    """
+    Aplica add (suma, admite negativos), set (fija) y remove sobre el carrito
+    en una transacción, con semántica de upsert por producto y sin superar el
+    stock al subir cantidades. Las operaciones se resuelven en memoria y se
+    escriben con un bulk_create, un bulk_update y un DELETE: el número de
+    consultas no depende del tamaño del lote. Con `recortar` (fusión del carrito
+    de invitado) los productos que ya no existen se ignoran y lo que exceda el
+    stock se recorta en vez de fallar.
+    Devuelve (ítems creados o modificados, ids de producto eliminados, carrito).
+    """
+    operaciones = _validar(operaciones) if not recortar else operaciones
+
+    with transaction.atomic():
+        # Serializa lotes concurrentes del mismo usuario (UPDATE sin cambios = lock de
+        # fila). Va antes de leer: en SQLite toma ya el lock de escritura
+        Carrito.objects.filter(user=user).update(creado_en=F('creado_en'))
+        carrito, _ = Carrito.objects.get_or_create(user=user)
+
+        productos = _productos(operaciones, recortar)
+        operaciones = [op for op in operaciones if op[1] in productos]
+        lineas = {item.producto_id: item for item in carrito.items.filter(producto_id__in=productos)}
+        cantidades = _plegar(
+            {producto_id: item.cantidad for producto_id, item in lineas.items()},
+            operaciones, productos, recortar,
+        )
+
+        crear, actualizar, borrar, eliminados = [], [], [], []
+        for producto_id, cantidad in cantidades.items():
+            item = lineas.get(producto_id)
+            if cantidad <= 0:
+                if item is not None:
+                    borrar.append(item.id)
+                    eliminados.append(producto_id)
+            elif item is None:
+                crear.append(CarritoItem(carrito=carrito, producto_id=producto_id, cantidad=cantidad))
+            elif item.cantidad != cantidad:
+                item.cantidad = cantidad
+                actualizar.append(item)
+
+        if borrar:
+            CarritoItem.objects.filter(id__in=borrar).delete()
+        if actualizar:
+            CarritoItem.objects.bulk_update(actualizar, ['cantidad'])
+        if crear:
+            # Una suma suelta (sumar_al_carrito) no toma el lock del carrito y pudo
+            # crear la línea entretanto: el lote fija su cantidad final igual
+            CarritoItem.objects.bulk_create(
+                crear, update_conflicts=True,
+                unique_fields=['carrito', 'producto'], update_fields=['cantidad'],
+            )
+
+    cambiados = [pid for pid, c in cantidades.items() if c > 0]
+    items = list(items_con_producto().filter(carrito=carrito, producto_id__in=cambiados))
+    return items, eliminados, carrito
+
+
+# --- CARRITO DE INVITADO ---
+# Un visitante sin cuenta tiene su carrito en una fila de CarritoInvitado. El cliente
+# guarda el id firmado con django.core.signing (no se puede adivinar ni alterar) y
+# lo manda en el header X-Carrito-Invitado. Cada escritura renueva el vencimiento;
+# purgar_carritos_invitado borra en lotes los vencidos. Al iniciar sesión el
+# carrito se fusiona con el del usuario en un solo lote y se borra.
+
+SAL_INVITADO = 'tienda.carrito_invitado'
+
+
+def _vencimiento():
+    return timezone.now() + timedelta(days=settings.CARRITO_INVITADO_DIAS)
+
+def firmar_invitado(carrito):
+    return signing.dumps(str(carrito.id), salt=SAL_INVITADO)
+
+def _id_invitado(token):
+    if not token:
+        return None
+    try:
+        return signing.loads(token, salt=SAL_INVITADO)
+    except signing.BadSignature:
+        return None
+
+def _vigentes():
+    return CarritoInvitado.objects.filter(expira_en__gt=timezone.now())
+
+def obtener_invitado(token):
+    """Carrito vigente del token, o None si no hay token, está alterado o venció."""
+    carrito_id = _id_invitado(token)
+    return _vigentes().filter(id=carrito_id).first() if carrito_id else None
+
+def detalle_invitado(carrito):
+    """
+    Ítems del carrito de invitado como CarritoItem sin guardar (mismo formato que
+    el carrito de usuario al serializarlos) y el total. Una consulta.
+    """
+    cantidades = {int(pid): cantidad for pid, cantidad in (carrito.items if carrito else {}).items()}
+    productos = Producto.objects.in_bulk(cantidades.keys())
+    items = [
+        CarritoItem(producto=productos[pid], cantidad=cantidad)
+        for pid, cantidad in cantidades.items() if pid in productos
+    ]
+    return items, sum(item.subtotal for item in items)
+
+def aplicar_operaciones_invitado(token, operaciones):
+    """Como aplicar_operaciones, sobre el carrito del token (lo crea si no hay uno vigente)."""
+    operaciones = _validar(operaciones)
+    carrito_id = _id_invitado(token)
+    with transaction.atomic():
+        # Renovar el vencimiento es a la vez el lock de la fila
+        if carrito_id and _vigentes().filter(id=carrito_id).update(expira_en=_vencimiento()):
+            carrito = CarritoInvitado.objects.get(id=carrito_id)
+        else:
+            carrito = CarritoInvitado(expira_en=_vencimiento())
+        cantidades = {int(pid): cantidad for pid, cantidad in carrito.items.items()}
+        cantidades.update(_plegar(cantidades, operaciones, _productos(operaciones)))
+        carrito.items = {str(pid): cantidad for pid, cantidad in cantidades.items() if cantidad > 0}
+        carrito.save()
+    return carrito
+
+def fusionar_invitado(user, token):
+    """
+    Suma el carrito de invitado al del usuario en un solo lote (recortando al
+    stock) y lo borra. Devuelve cuántos productos se fusionaron.
+    """
+    carrito_id = _id_invitado(token)
+    if not carrito_id:
+        return 0
+    with transaction.atomic():
+        # Escritura primero: toma el lock de escritura (SQLite) antes de leer
+        _vigentes().filter(id=carrito_id).update(expira_en=F('expira_en'))
+        invitado = _vigentes().filter(id=carrito_id).first()
+        if invitado is None or not CarritoInvitado.objects.filter(id=invitado.id).delete()[0]:
+            return 0
+        operaciones = [('add', int(pid), cantidad) for pid, cantidad in invitado.items.items()]
+        if operaciones:
+            aplicar_operaciones(user, operaciones, recortar=True)
+    return len(operaciones)
+
+def purgar_invitados_vencidos(lote=1000):
+    """Borra carritos de invitado vencidos en lotes (igual que las reservas)."""
+    total = 0
+    while True:
+        ids = list(
+            CarritoInvitado.objects.filter(expira_en__lte=timezone.now())
+            .order_by('expira_en').values_list('id', flat=True)[:lote]
+        )
+        if not ids:
+            return total
+        total += CarritoInvitado.objects.filter(id__in=ids).delete()[0]
@@ -0,0 +1,17 @@
+from django.conf import settings
+
+
+# --- CONEXIONES SQLITE ---
+# WAL deja leer mientras otro escribe; synchronous=NORMAL en WAL solo sincroniza
+# a disco en los checkpoints (un corte de luz puede perder la última transacción,
+# no corromper la base). busy_timeout hace esperar el lock en vez de fallar.
+# Se conecta a connection_created en TiendaConfig.ready.
+
+def configurar_sqlite(sender, connection, **kwargs):
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        # Primero el timeout: cambiar a WAL también puede tener que esperar el lock
+        cursor.execute(f'PRAGMA busy_timeout={int(settings.SQLITE_BUSY_TIMEOUT)}')
+        cursor.execute('PRAGMA journal_mode=WAL')
+        cursor.execute('PRAGMA synchronous=NORMAL')
@@ -0,0 +1,208 @@
+import asyncio
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import DatabaseError, connection
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+
+# --- PUB/SUB EN PROCESO PARA EL STREAM DE NOTIFICACIONES ---
+# Cada conexión SSE abierta es un `Suscriptor` con su propia cola asyncio. Las señales
+# de Django publican desde hilos síncronos, así que la entrega se agenda en el loop
+# de cada suscriptor con call_soon_threadsafe. Un mensaje se formatea una sola vez y
+# se comparte entre todos los destinatarios. Para llegar a otros procesos se
+# publica con `publicar` (ver más abajo), no directo en el Fanout.
+
+MAX_PENDIENTES = 100
+
+
+def formatear_evento(evento, data, event_id=None):
+    lineas = []
+    if event_id is not None:
+        lineas.append(f"id: {event_id}")
+    lineas.append(f"event: {evento}")
+    lineas.append(f"data: {json.dumps(data, separators=(',', ':'), default=str)}")
+    return '\n'.join(lineas) + '\n\n'
+
+
+class Suscriptor:
+    def __init__(self, user_id, loop):
+        self.user_id = user_id
+        self.loop = loop
+        self.cola = asyncio.Queue(maxsize=MAX_PENDIENTES)
+
+    def _entregar(self, event_id, mensaje):
+        # Corre dentro del loop del suscriptor. Si el cliente no da abasto lo
+        # desconectamos (None); al reconectar con Last-Event-ID recupera lo perdido.
+        try:
+            self.cola.put_nowait((event_id, mensaje))
+        except asyncio.QueueFull:
+            while not self.cola.empty():
+                self.cola.get_nowait()
+            self.cola.put_nowait(None)
+
+
+class Fanout:
+    def __init__(self):
+        self._suscriptores = set()
+        self._lock = threading.Lock()
+
+    def suscribir(self, user_id):
+        suscriptor = Suscriptor(user_id, asyncio.get_running_loop())
+        with self._lock:
+            self._suscriptores.add(suscriptor)
+        return suscriptor
+
+    def cancelar(self, suscriptor):
+        with self._lock:
+            self._suscriptores.discard(suscriptor)
+
+    def conectados(self):
+        with self._lock:
+            return len(self._suscriptores)
+
+    def publicar(self, evento, data, event_id=None, user_ids=None):
+        """Envía a todos los conectados, o solo a `user_ids` si se indica."""
+        mensaje = formatear_evento(evento, data, event_id)
+        with self._lock:
+            destinatarios = [
+                s for s in self._suscriptores
+                if user_ids is None or s.user_id in user_ids
+            ]
+        for suscriptor in destinatarios:
+            try:
+                suscriptor.loop.call_soon_threadsafe(suscriptor._entregar, event_id, mensaje)
+            except RuntimeError:
+                # El loop ya se cerró (worker apagándose)
+                self.cancelar(suscriptor)
+
+
+fanout_notificaciones = Fanout()
+
+
+# --- ENTRE PROCESOS ---
+# El Fanout solo alcanza a quienes están conectados a este proceso. Con varios
+# workers, o cuando publica el cron (que corre aparte), el evento se anota además
+# en EventoNotificacion. Cada proceso con streams abiertos tiene un hilo que lee
+# lo nuevo cada NOTIFICACIONES_INTERVALO segundos y lo entrega a sus conectados.
+# Lo publicado por el propio proceso ya se entregó al instante y se salta. Con
+# NOTIFICACIONES_ENTRE_PROCESOS=False todo queda en memoria: sirve solo con un
+# único worker y sin eventos del cron.
+
+RETENCION = timedelta(minutes=5)
+MAX_POR_LECTURA = 500
+
+_origen = (None, None)
+
+
+def origen_proceso():
+    """Id de este proceso; cambia tras un fork (gunicorn --preload)."""
+    global _origen
+    pid = os.getpid()
+    if _origen[0] != pid:
+        _origen = (pid, uuid.uuid4().hex)
+    return _origen[1]
+
+
+def publicar(evento, data, event_id=None, user_ids=None):
+    """Entrega a los conectados a este proceso y deja el evento para los demás."""
+    publicar_varios([(evento, data, event_id, user_ids)])
+
+
+def publicar_varios(eventos):
+    """Como `publicar` para una lista de (evento, data, event_id, user_ids), con un solo INSERT."""
+    for evento, data, event_id, user_ids in eventos:
+        fanout_notificaciones.publicar(evento, data, event_id=event_id, user_ids=user_ids)
+    if not settings.NOTIFICACIONES_ENTRE_PROCESOS or not eventos:
+        return
+    from .models import EventoNotificacion
+    origen = origen_proceso()
+    try:
+        EventoNotificacion.objects.bulk_create([
+            EventoNotificacion(
+                evento=evento, data=data, event_id=event_id,
+                user_ids=sorted(user_ids) if user_ids is not None else None, origen=origen,
+            )
+            for evento, data, event_id, user_ids in eventos
+        ], batch_size=MAX_POR_LECTURA)
+    except DatabaseError:
+        # Los demás procesos lo recuperan al reconectar (Last-Event-ID)
+        logger.exception("No se pudieron anotar %s eventos para otros procesos", len(eventos))
+
+
+class Receptor:
+    """Hilo que pasa al Fanout local los eventos publicados por otros procesos."""
+
+    def __init__(self, fanout):
+        self.fanout = fanout
+        self._pid = None
+        self._lock = threading.Lock()
+        self._detener = None
+
+    def iniciar(self):
+        """Se llama al abrir cada stream; solo el primero de cada proceso arranca el hilo."""
+        if not settings.NOTIFICACIONES_ENTRE_PROCESOS:
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._detener = threading.Event()
+            # Lo anterior al arranque lo recupera cada cliente con Last-Event-ID
+            hilo = threading.Thread(
+                target=self._correr, args=(timezone.now(), self._detener), name='tienda-eventos', daemon=True,
+            )
+            hilo.start()
+
+    def detener(self):
+        with self._lock:
+            if self._detener is not None:
+                self._detener.set()
+            self._pid = self._detener = None
+
+    def _correr(self, desde, detener):
+        from .models import EventoNotificacion
+        ultimo = None
+        purgado = 0
+        try:
+            while not detener.is_set():
+                try:
+                    if ultimo is None:
+                        ultimo = EventoNotificacion.objects.filter(
+                            creado_en__lt=desde).order_by('-id').values_list('id', flat=True).first() or 0
+                    # Lee de a MAX_POR_LECTURA hasta ponerse al día (p. ej. tras un lote del cron)
+                    leidos = MAX_POR_LECTURA
+                    while leidos == MAX_POR_LECTURA:
+                        eventos = list(EventoNotificacion.objects.filter(id__gt=ultimo).order_by('id')[:MAX_POR_LECTURA])
+                        leidos = len(eventos)
+                        ultimo = self.entregar(ultimo, eventos)
+                    if time.monotonic() - purgado > 60:
+                        EventoNotificacion.objects.filter(creado_en__lt=timezone.now() - RETENCION).delete()
+                        purgado = time.monotonic()
+                except DatabaseError:
+                    logger.exception("No se pudieron leer los eventos de otros procesos")
+                    connection.close()
+                detener.wait(settings.NOTIFICACIONES_INTERVALO)
+        finally:
+            connection.close()
+
+    def entregar(self, ultimo, eventos):
+        propio = origen_proceso()
+        for evento in eventos:
+            ultimo = evento.id
+            if evento.origen == propio:
+                continue
+            user_ids = set(evento.user_ids) if evento.user_ids is not None else None
+            self.fanout.publicar(evento.evento, evento.data, event_id=evento.event_id, user_ids=user_ids)
+        return ultimo
+
+
+receptor_notificaciones = Receptor(fanout_notificaciones)
@@ -0,0 +1,197 @@
+import csv
+import tempfile
+from datetime import datetime, timedelta
+
+from django.contrib.auth.models import User
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+
+from .models import PedidoItem, Suscripcion
+
+try:
+    import xlsxwriter
+except ImportError:  # XLSX es opcional; CSV funciona siempre
+    xlsxwriter = None
+
+
+# --- EXPORTACIONES EN STREAMING ---
+# Las filas salen de values_list(...).iterator(chunk_size): los JOIN los hace la BD,
+# no se instancian modelos y el cursor se lee por trozos, así que la memoria no
+# crece con la cantidad de filas. El CSV empieza a enviarse con el encabezado,
+# antes incluso de que la consulta devuelva la primera fila.
+
+CHUNK = 2000
+TAMANO_ENVIO = 64 * 1024
+MAX_FILAS_XLSX = 1048575  # límite de Excel por hoja, sin contar el encabezado
+
+
+class _Eco:
+    """Pseudo-archivo para csv.writer: devuelve lo escrito en vez de guardarlo."""
+
+    def write(self, valor):
+        return valor
+
+
+def _celda(valor):
+    if isinstance(valor, datetime):
+        return timezone.localtime(valor).strftime('%Y-%m-%d %H:%M:%S')
+    return valor
+
+# Excel interpreta como fórmula un texto que empieza así. Nombres, emails y
+# productos los escribe cualquiera: se anteponen con ' para que queden como texto.
+INICIO_FORMULA = ('=', '+', '-', '@', '\t', '\r')
+
+def _celda_csv(valor):
+    valor = _celda(valor)
+    if isinstance(valor, str) and valor.startswith(INICIO_FORMULA):
+        return "'" + valor
+    return valor
+
+
+# --- CONSULTAS ---
+
+PEDIDOS = (
+    ('pedido_id', 'pedido_id'),
+    ('orden_compra', 'pedido__orden_compra'),
+    ('fecha', 'pedido__creado_en'),
+    ('estado', 'pedido__estado'),
+    ('usuario', 'pedido__user__username'),
+    ('email', 'pedido__user__email'),
+    ('monto_total', 'pedido__monto_total'),
+    ('producto_id', 'producto_id'),
+    ('producto', 'producto__nombre'),
+    ('cantidad', 'cantidad'),
+    ('precio_unitario', 'precio_al_momento_compra'),
+)
+
+SUSCRIPCIONES = (
+    ('suscripcion_id', 'id'),
+    ('orden_compra', 'orden_compra'),
+    ('usuario', 'user__username'),
+    ('email', 'user__email'),
+    ('plan', 'plan__nombre'),
+    ('precio_plan', 'plan__precio'),
+    ('fecha_inicio', 'fecha_inicio'),
+    ('fecha_vencimiento', 'fecha_vencimiento'),
+    ('activa', 'activa'),
+)
+
+USUARIOS = (
+    ('user_id', 'id'),
+    ('usuario', 'username'),
+    ('email', 'email'),
+    ('nombre', 'profile__nombre'),
+    ('apellidos', 'profile__apellidos'),
+    ('rut', 'profile__rut'),
+    ('telefono', 'profile__numero_personal'),
+    ('rol', 'profile__role'),
+    ('activo', 'is_active'),
+    ('staff', 'is_staff'),
+    ('fecha_registro', 'date_joined'),
+    ('ultimo_acceso', 'last_login'),
+)
+
+
+def _filas(queryset, columnas):
+    return queryset.values_list(*[campo for _, campo in columnas]).iterator(chunk_size=CHUNK)
+
+def _inicio_del_dia(fecha):
+    return timezone.make_aware(datetime.combine(fecha, datetime.min.time()))
+
+def _entre_fechas(queryset, campo, desde, hasta):
+    """
+    Días locales [desde, hasta] como límites de fecha y hora: `campo__date` envuelve
+    la columna en una conversión y la consulta ya no puede usar su índice.
+    """
+    if desde:
+        queryset = queryset.filter(**{f'{campo}__gte': _inicio_del_dia(desde)})
+    if hasta:
+        queryset = queryset.filter(**{f'{campo}__lt': _inicio_del_dia(hasta + timedelta(days=1))})
+    return queryset
+
+def filas_pedidos(desde=None, hasta=None, estado=None, user_id=None):
+    """Una fila por ítem de pedido, con los datos del pedido repetidos."""
+    items = PedidoItem.objects.order_by('pedido_id', 'id')
+    items = _entre_fechas(items, 'pedido__creado_en', desde, hasta)
+    if estado:
+        items = items.filter(pedido__estado=estado)
+    if user_id:
+        items = items.filter(pedido__user_id=user_id)
+    return [titulo for titulo, _ in PEDIDOS], _filas(items, PEDIDOS)
+
+def filas_suscripciones(desde=None, hasta=None, plan_id=None, activa=None):
+    suscripciones = Suscripcion.objects.order_by('id')
+    suscripciones = _entre_fechas(suscripciones, 'fecha_inicio', desde, hasta)
+    if plan_id:
+        suscripciones = suscripciones.filter(plan_id=plan_id)
+    if activa is not None:
+        suscripciones = suscripciones.filter(activa=activa)
+    return [titulo for titulo, _ in SUSCRIPCIONES], _filas(suscripciones, SUSCRIPCIONES)
+
+def filas_usuarios(desde=None, hasta=None, rol=None, activo=None):
+    """Usuarios con su perfil (LEFT JOIN: los que no tienen perfil salen igual)."""
+    usuarios = User.objects.order_by('id')
+    usuarios = _entre_fechas(usuarios, 'date_joined', desde, hasta)
+    if rol:
+        usuarios = usuarios.filter(profile__role=rol)
+    if activo is not None:
+        usuarios = usuarios.filter(is_active=activo)
+    return [titulo for titulo, _ in USUARIOS], _filas(usuarios, USUARIOS)
+
+
+# --- FORMATOS ---
+
+def csv_en_trozos(encabezado, filas):
+    # BOM para que Excel reconozca UTF-8 (tildes y ñ)
+    escritor = csv.writer(_Eco())
+    yield '\ufeff' + escritor.writerow(encabezado)
+    buffer, tamano = [], 0
+    for fila in filas:
+        linea = escritor.writerow([_celda_csv(valor) for valor in fila])
+        buffer.append(linea)
+        tamano += len(linea)
+        if tamano >= TAMANO_ENVIO:
+            yield ''.join(buffer)
+            buffer, tamano = [], 0
+    if buffer:
+        yield ''.join(buffer)
+
+def xlsx_en_trozos(encabezado, filas):
+    """
+    XlsxWriter en modo constant_memory escribe cada fila a disco al pasar a la
+    siguiente. Un .xlsx es un ZIP que solo queda completo al cerrarlo, así que
+    los bytes salen al terminar; la memoria igual se mantiene plana. Pasado el
+    límite de filas de Excel se sigue en una hoja nueva.
+    """
+    with tempfile.TemporaryDirectory() as directorio, tempfile.TemporaryFile() as salida:
+        libro = xlsxwriter.Workbook(salida, {
+            'constant_memory': True, 'tmpdir': directorio, 'remove_timezone': True,
+            # Un texto que empieza con "=" se guarda como texto, no como fórmula
+            'strings_to_formulas': False,
+        })
+        hoja, fila_actual = None, MAX_FILAS_XLSX
+        for fila in filas:
+            if fila_actual >= MAX_FILAS_XLSX:
+                hoja = libro.add_worksheet()
+                hoja.write_row(0, 0, encabezado)
+                fila_actual = 0
+            fila_actual += 1
+            hoja.write_row(fila_actual, 0, [_celda(valor) for valor in fila])
+        if hoja is None:
+            libro.add_worksheet().write_row(0, 0, encabezado)
+        libro.close()
+        salida.seek(0)
+        yield from iter(lambda: salida.read(TAMANO_ENVIO), b'')
+
+def respuesta_exportacion(nombre, formato, encabezado, filas):
+    if formato == 'xlsx':
+        response = StreamingHttpResponse(
+            xlsx_en_trozos(encabezado, filas),
+            content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+        )
+    else:
+        response = StreamingHttpResponse(csv_en_trozos(encabezado, filas), content_type='text/csv; charset=utf-8')
+    response['Content-Disposition'] = f'attachment; filename="{nombre}.{formato}"'
+    # Que ningún proxy lo acumule antes de enviarlo (nginx)
+    response['X-Accel-Buffering'] = 'no'
+    return response
@@ -0,0 +1,231 @@
+import hashlib
+import io
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.files.uploadhandler import TemporaryFileUploadHandler
+from django.db import connections, transaction
+from django.db.models import F
+from PIL import Image, ImageOps
+
+from .cache import incrementar_version
+from .models import ProductoImagen
+
+logger = logging.getLogger(__name__)
+
+
+# --- VARIANTES REDIMENSIONADAS EN WEBP ---
+# Cada imagen subida (producto, galería y avatar) se guarda tal cual y, al confirmar
+# la transacción, un pool de hilos genera un WebP por cada ancho de IMAGENES_ANCHOS
+# junto al original (productos/foo.jpg -> productos/foo.w480.webp). Pillow suelta
+# el GIL al redimensionar y codificar, así que los hilos no frenan las peticiones.
+# Las rutas quedan en el campo <imagen>_variantes junto con el nombre del original
+# del que salieron: si la imagen cambia, las variantes viejas se reconocen y se
+# reemplazan. Mientras no estén listas los serializers entregan solo el original.
+
+_lock = threading.Lock()
+_hilos = None
+
+
+def _pool():
+    global _hilos
+    with _lock:
+        if _hilos is None:
+            _hilos = ThreadPoolExecutor(
+                max_workers=max(settings.IMAGENES_WORKERS, 1), thread_name_prefix='imagenes',
+            )
+        return _hilos
+
+def ruta_variante(nombre, ancho):
+    base, _ = os.path.splitext(nombre)
+    return f"{base}.w{ancho}.webp"
+
+def vigentes(archivo, variantes):
+    """Variantes {ancho: ruta} si corresponden al archivo actual, si no {}."""
+    if not archivo or not variantes or variantes.get('origen') != archivo.name:
+        return {}
+    return variantes.get('anchos', {})
+
+
+def generar_variantes(nombre):
+    """
+    Lee el original desde el storage y escribe un WebP por ancho, sin agrandar:
+    los anchos mayores que el original se omiten (el original siempre tiene al
+    menos el más chico). Devuelve {'origen': nombre, 'anchos': {ancho: ruta}}.
+    """
+    with default_storage.open(nombre, 'rb') as archivo:
+        imagen = Image.open(archivo)
+        imagen = ImageOps.exif_transpose(imagen)
+        imagen.load()
+    if imagen.mode not in ('RGB', 'RGBA'):
+        transparente = imagen.mode in ('RGBA', 'LA', 'PA') or 'transparency' in imagen.info
+        imagen = imagen.convert('RGBA' if transparente else 'RGB')
+
+    anchos = {}
+    for ancho in sorted(settings.IMAGENES_ANCHOS):
+        if anchos and ancho >= imagen.width:
+            break
+        copia = imagen.copy()
+        copia.thumbnail((ancho, ancho * 10), Image.LANCZOS)
+        salida = io.BytesIO()
+        copia.save(salida, 'WEBP', quality=settings.IMAGENES_CALIDAD, method=4)
+        # Si la ruta está ocupada (foo.jpg y foo.png) el storage elige otro nombre
+        anchos[str(ancho)] = default_storage.save(ruta_variante(nombre, ancho), ContentFile(salida.getvalue()))
+    return {'origen': nombre, 'anchos': anchos}
+
+def borrar_variantes(variantes, conservar=()):
+    for ruta in (variantes or {}).get('anchos', {}).values():
+        if ruta in conservar:
+            continue
+        try:
+            default_storage.delete(ruta)
+        except OSError:
+            pass
+
+
+def procesar(modelo, pk, campo, nombre):
+    """
+    Genera las variantes de `nombre` y las guarda en la fila solo si su imagen
+    sigue siendo esa (con UPDATE, sin pisar otros campos). Las variantes que
+    reemplaza se borran del disco.
+    """
+    columna = f'{campo}_variantes'
+    try:
+        variantes = generar_variantes(nombre)
+        with transaction.atomic():
+            # UPDATE sin cambios primero: toma el lock de la fila (y de escritura en SQLite)
+            # antes de leer, así dos workers sobre la misma fila no se cruzan
+            modelo.objects.filter(pk=pk).update(**{columna: F(columna)})
+            anteriores = modelo.objects.filter(pk=pk).values_list(columna, flat=True).first()
+            if not modelo.objects.filter(pk=pk, **{campo: nombre}).update(**{columna: variantes}):
+                borrar_variantes(variantes)  # la imagen cambió (o se borró) entretanto
+                return None
+        borrar_variantes(anteriores, conservar=variantes['anchos'].values())
+        # El UPDATE no dispara señales: el catálogo cacheado debe ver las variantes
+        incrementar_version(modelo)
+        return variantes
+    except Exception:
+        logger.exception("No se pudieron generar las variantes de %s", nombre)
+        return None
+
+def _procesar_en_hilo(*argumentos):
+    try:
+        return procesar(*argumentos)
+    finally:
+        connections.close_all()  # cada hilo del pool abre su propia conexión
+
+def encolar_variantes(instancia, campo):
+    """
+    Programa la generación para cuando se confirme la transacción, si la imagen
+    actual no tiene variantes. Con IMAGENES_WORKERS = 0 se generan en el mismo hilo.
+    """
+    archivo = getattr(instancia, campo)
+    if not archivo or vigentes(archivo, getattr(instancia, f'{campo}_variantes')):
+        return
+    argumentos = (type(instancia), instancia.pk, campo, archivo.name)
+
+    def lanzar():
+        if settings.IMAGENES_WORKERS:
+            _pool().submit(_procesar_en_hilo, *argumentos)
+        else:
+            procesar(*argumentos)
+    transaction.on_commit(lanzar, robust=True)
+
+
+def urls_variantes(archivo, variantes, request=None):
+    """[{ancho, url}] de menor a mayor, para armar un srcset en el cliente."""
+    urls = []
+    for ancho, ruta in sorted(vigentes(archivo, variantes).items(), key=lambda par: int(par[0])):
+        url = default_storage.url(ruta)
+        urls.append({'ancho': int(ancho), 'url': request.build_absolute_uri(url) if request else url})
+    return urls
+
+
+# --- SUBIDA DE GALERÍA ---
+# Los archivos se escriben a disco a medida que llegan (nunca enteros en memoria) y
+# su sha256 se calcula en el mismo paso. En el storage quedan direccionados por
+# contenido (productos/galeria/ab/<sha256>.jpg): una imagen repetida, en la misma
+# subida o en otro producto, se guarda una sola vez. Las filas se insertan con un
+# bulk_create y las variantes se generan después, fuera de la petición.
+
+DIRECTORIO_GALERIA = 'productos/galeria'
+HILOS_SUBIDA = 4
+
+
+class SubidaConHash(TemporaryFileUploadHandler):
+    """Como TemporaryFileUploadHandler, pero deja el sha256 en archivo.sha256."""
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.hash = hashlib.sha256()
+
+    def receive_data_chunk(self, raw_data, start):
+        self.hash.update(raw_data)
+        return super().receive_data_chunk(raw_data, start)
+
+    def file_complete(self, file_size):
+        archivo = super().file_complete(file_size)
+        archivo.sha256 = self.hash.hexdigest()
+        return archivo
+
+
+def _sha256(archivo):
+    # Por si el archivo no pasó por SubidaConHash (tests, admin, otro handler)
+    hash = hashlib.sha256()
+    for trozo in archivo.chunks():
+        hash.update(trozo)
+    archivo.seek(0)
+    return hash.hexdigest()
+
+def ruta_galeria(digest, nombre):
+    extension = os.path.splitext(nombre)[1].lower() or '.jpg'
+    return f"{DIRECTORIO_GALERIA}/{digest[:2]}/{digest}{extension}"
+
+def _guardar(ruta, archivo):
+    # En FileSystemStorage guardar un temporal es un rename; en storages remotos
+    # es una subida, por eso se hacen en paralelo
+    if default_storage.exists(ruta):
+        return ruta
+    return default_storage.save(ruta, archivo)
+
+def agregar_galeria(producto, archivos):
+    """
+    Agrega las imágenes a la galería del producto omitiendo las que ya tiene (mismo
+    contenido). Reutiliza el archivo y sus variantes si otro producto ya subió esa
+    imagen. Devuelve las filas creadas.
+    """
+    por_hash = {}
+    for archivo in archivos:
+        por_hash.setdefault(getattr(archivo, 'sha256', None) or _sha256(archivo), archivo)
+    ya_tiene = set(
+        ProductoImagen.objects.filter(producto=producto, sha256__in=por_hash).values_list('sha256', flat=True)
+    )
+    nuevos = {digest: archivo for digest, archivo in por_hash.items() if digest not in ya_tiene}
+    if not nuevos:
+        return []
+
+    rutas = {digest: ruta_galeria(digest, archivo.name) for digest, archivo in nuevos.items()}
+    with ThreadPoolExecutor(max_workers=min(len(nuevos), HILOS_SUBIDA)) as pool:
+        guardadas = dict(zip(nuevos, pool.map(lambda d: _guardar(rutas[d], nuevos[d]), nuevos)))
+
+    previas = {
+        nombre: variantes for nombre, variantes in
+        ProductoImagen.objects.filter(imagen__in=guardadas.values()).exclude(imagen_variantes={})
+        .values_list('imagen', 'imagen_variantes')
+    }
+    imagenes = ProductoImagen.objects.bulk_create([
+        ProductoImagen(
+            producto=producto, imagen=ruta, sha256=digest, imagen_variantes=previas.get(ruta, {}),
+        )
+        for digest, ruta in guardadas.items()
+    ])
+    # bulk_create no dispara señales: variantes y cache se manejan aquí
+    for imagen in imagenes:
+        encolar_variantes(imagen, 'imagen')
+    incrementar_version(ProductoImagen)
+    return imagenes
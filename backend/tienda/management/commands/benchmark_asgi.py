@@ -0,0 +1,159 @@
+import asyncio
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.asgi import get_asgi_application
+from django.core.management.base import BaseCommand, CommandError
+from django.core.wsgi import get_wsgi_application
+from django.test.utils import override_settings
+from django.urls import reverse
+from rest_framework_simplejwt.tokens import AccessToken
+
+try:
+    import httpx
+except ImportError:
+    httpx = None
+
+USUARIO = 'benchmark_asgi'
+HOST = 'http://127.0.0.1'
+
+
+class Command(BaseCommand):
+    help = (
+        "Compara WSGI y ASGI en POST /api/webpay/create/ con un gateway Transbank simulado "
+        "(transbank_stub en otro proceso, --latencia ms por llamada). Las dos pilas corren en este "
+        "proceso con todo el middleware: WSGI atiende con un pool de --hilos hilos (como "
+        "gunicorn --threads) y ASGI con un solo event loop. --concurrentes clientes mandan "
+        "--peticiones en total; la latencia incluye la espera en cola. Reporta peticiones por "
+        "segundo, p50 y p99. Solo crea un usuario temporal que se borra al final."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--peticiones', type=int, default=400)
+        parser.add_argument('--concurrentes', type=int, default=100)
+        parser.add_argument('--hilos', type=int, default=8, help="hilos del servidor WSGI")
+        parser.add_argument('--latencia', type=float, default=500, help="milisegundos del gateway")
+        parser.add_argument('--pool', type=int, help="conexiones a Transbank por proceso (por defecto TRANSBANK_POOL)")
+
+    def handle(self, *args, **options):
+        if httpx is None:
+            raise CommandError("benchmark_asgi necesita httpx (pip install httpx).")
+
+        gateway, base = self._levantar_gateway(options['latencia'])
+        User.objects.filter(username=USUARIO).delete()
+        try:
+            user = User.objects.create(username=USUARIO, password='!')
+            headers = {'Authorization': f'Bearer {AccessToken.for_user(user)}'}
+            url = reverse('webpay_create')
+
+            def cuerpo(n):
+                return {'amount': 1000, 'buy_order': f'P1U{user.id}T{n}', 'session_id': f'BENCH-{n}'}
+
+            # Con ASGI el pool de conexiones a Transbank pasa a ser el límite de pagos en curso
+            pool = options['pool'] or settings.TRANSBANK_POOL
+            self.stdout.write(
+                f"Gateway simulado: {options['latencia']:.0f} ms por llamada, pool de {pool} conexiones. "
+                f"{options['peticiones']} peticiones, {options['concurrentes']} clientes concurrentes."
+            )
+            with override_settings(TRANSBANK_BASE_URL=base, TRANSBANK_POOL=pool):
+                wsgi = asyncio.run(self._wsgi(url, headers, cuerpo, options))
+                asgi = asyncio.run(self._asgi(url, headers, cuerpo, options))
+        finally:
+            gateway.terminate()
+            gateway.wait()
+            User.objects.filter(username=USUARIO).delete()
+
+        self._reportar(f"WSGI ({options['hilos']} hilos)", *wsgi)
+        self._reportar("ASGI (1 event loop)", *asgi)
+        errores = wsgi[1] + asgi[1]
+        if errores:
+            for error in sorted(set(errores)):
+                self.stdout.write(f"  {errores.count(error)} x {error}")
+            raise CommandError("Hubo peticiones con error.")
+        if wsgi[0] and asgi[0]:
+            self.stdout.write(self.style.SUCCESS(
+                f"ASGI: x{len(asgi[0]) / asgi[2] / (len(wsgi[0]) / wsgi[2]):.1f} peticiones por segundo, "
+                f"p99 {self._p99(asgi[0]) * 1000:.0f} ms contra {self._p99(wsgi[0]) * 1000:.0f} ms."
+            ))
+
+    def _levantar_gateway(self, latencia):
+        """En un proceso aparte para que sus hilos no compitan por el GIL con lo medido."""
+        with socket.socket() as libre:
+            libre.bind(('127.0.0.1', 0))
+            puerto = libre.getsockname()[1]
+        gateway = subprocess.Popen(
+            [sys.executable, os.path.join(settings.BASE_DIR, 'manage.py'), 'transbank_stub',
+             '--puerto', str(puerto), '--latencia', str(latencia)],
+            stdout=subprocess.DEVNULL,
+        )
+        limite = time.monotonic() + 15
+        while time.monotonic() < limite:
+            try:
+                socket.create_connection(('127.0.0.1', puerto), timeout=1).close()
+                return gateway, f'http://127.0.0.1:{puerto}'
+            except OSError:
+                if gateway.poll() is not None:
+                    break
+                time.sleep(0.1)
+        gateway.kill()
+        raise CommandError("No se pudo levantar transbank_stub.")
+
+    async def _wsgi(self, url, headers, cuerpo, options):
+        cliente = httpx.Client(transport=httpx.WSGITransport(app=get_wsgi_application()), base_url=HOST)
+        loop = asyncio.get_running_loop()
+        with cliente, ThreadPoolExecutor(max_workers=options['hilos']) as hilos:
+            async def enviar(n):
+                peticion = partial(cliente.post, url, json=cuerpo(n), headers=headers)
+                return (await loop.run_in_executor(hilos, peticion)).status_code
+            return await self._carga(enviar, options)
+
+    async def _asgi(self, url, headers, cuerpo, options):
+        transporte = httpx.ASGITransport(app=get_asgi_application())
+        async with httpx.AsyncClient(transport=transporte, base_url=HOST) as cliente:
+            async def enviar(n):
+                return (await cliente.post(url, json=cuerpo(n), headers=headers)).status_code
+            return await self._carga(enviar, options)
+
+    async def _carga(self, enviar, options):
+        """Cada cliente manda su siguiente petición al recibir la respuesta de la anterior."""
+        pendientes = iter(range(options['peticiones']))
+        latencias, errores = [], []
+
+        async def cliente():
+            for n in pendientes:
+                inicio = time.perf_counter()
+                try:
+                    estado = await enviar(n)
+                except Exception as e:
+                    errores.append(f'{type(e).__name__}: {e}')
+                    continue
+                if estado != 200:
+                    errores.append(f'HTTP {estado}')
+                    continue
+                latencias.append(time.perf_counter() - inicio)
+
+        inicio = time.perf_counter()
+        await asyncio.gather(*(cliente() for _ in range(options['concurrentes'])))
+        return sorted(latencias), errores, time.perf_counter() - inicio
+
+    @staticmethod
+    def _p99(latencias):
+        return latencias[min(len(latencias) - 1, int(len(latencias) * 0.99))]
+
+    def _reportar(self, nombre, latencias, errores, duracion):
+        if not latencias:
+            self.stdout.write(f"{nombre:<22} sin respuestas, {len(errores)} errores")
+            return
+        self.stdout.write(
+            f"{nombre:<22} {len(latencias) / duracion:7.1f} req/s   "
+            f"p50 {statistics.median(latencias) * 1000:6.0f} ms   p99 {self._p99(latencias) * 1000:6.0f} ms   "
+            f"{len(errores)} errores"
+        )
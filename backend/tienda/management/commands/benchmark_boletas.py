@@ -0,0 +1,65 @@
+import os
+import statistics
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import override_settings
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from tienda.boletas import cargar_pedido, digest_de, html_boleta, ruta_boleta
+from tienda.models import Pedido
+from tienda.views import descargar_boleta
+
+
+class Command(BaseCommand):
+    help = (
+        "Mide latencia y CPU del worker al descargar una boleta: en frío generando en el "
+        "mismo hilo (como antes), en frío con el pool de procesos y en caliente desde disco."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--pedido', type=int, help="ID del pedido (por defecto el primero con ítems)")
+        parser.add_argument('--repeticiones', type=int, default=5)
+
+    def handle(self, *args, **options):
+        if options['pedido']:
+            pedido_id = options['pedido']
+        else:
+            pedido_id = Pedido.objects.filter(items__isnull=False).values_list('id', flat=True).first()
+        if not pedido_id:
+            raise CommandError("No hay pedidos con ítems para medir.")
+
+        pedido = cargar_pedido(pedido_id)
+        ruta = ruta_boleta(digest_de(html_boleta(pedido)))
+        factory = APIRequestFactory()
+
+        def descargar():
+            request = factory.get(f'/api/pedido/{pedido_id}/boleta/')
+            force_authenticate(request, user=pedido.user)
+            inicio, cpu = time.perf_counter(), time.process_time()
+            response = descargar_boleta(request, pedido_id=pedido_id)
+            tamano = sum(len(trozo) for trozo in response.streaming_content)
+            if response.status_code != 200:
+                raise CommandError(f"La descarga respondió {response.status_code}")
+            return time.perf_counter() - inicio, time.process_time() - cpu, tamano
+
+        def medir(nombre, frio, workers=None):
+            muestras = []
+            for _ in range(options['repeticiones']):
+                if frio and os.path.exists(ruta):
+                    os.remove(ruta)
+                if workers is None:
+                    muestras.append(descargar())
+                else:
+                    with override_settings(BOLETAS_WORKERS=workers):
+                        muestras.append(descargar())
+            latencia = statistics.median(m[0] for m in muestras) * 1000
+            cpu = statistics.median(m[1] for m in muestras) * 1000
+            self.stdout.write(
+                f"{nombre:<22} latencia {latencia:8.1f} ms   CPU worker {cpu:8.1f} ms   {muestras[0][2]} bytes"
+            )
+
+        self.stdout.write(f"Pedido {pedido_id}, mediana de {options['repeticiones']} descargas")
+        medir("frío (mismo hilo)", frio=True, workers=0)
+        medir("frío (pool procesos)", frio=True)
+        medir("caliente (disco)", frio=False)
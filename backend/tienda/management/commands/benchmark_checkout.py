@@ -0,0 +1,71 @@
+import statistics
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+
+from tienda.models import Carrito, CarritoItem, Producto
+from tienda.reservas import reservar_carrito
+from tienda.views_webpay import _finalizar_pedido_carrito
+
+USUARIO = 'benchmark_checkout'
+
+
+class Command(BaseCommand):
+    help = (
+        "Mide `_finalizar_pedido_carrito` (lo que hace webpay_return con un pago de carrito "
+        "aprobado) sobre carritos de --items productos: latencia p50/p95 y consultas por "
+        "checkout. Compara con un carrito de 1 ítem: el número de consultas no debe crecer con "
+        "el carrito (en SQLite, sobre ~300 ítems Django parte los IN y bulk_create en lotes de "
+        "999 parámetros). Cada checkout corre en una transacción que se revierte: no deja datos."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--items', type=int, default=200)
+        parser.add_argument('--repeticiones', type=int, default=20)
+
+    def handle(self, *args, **options):
+        consultas_uno, _ = self._medir(1, 1)
+        consultas, latencias = self._medir(options['items'], options['repeticiones'])
+
+        latencias.sort()
+        p95 = latencias[min(len(latencias) - 1, int(len(latencias) * 0.95))]
+        self.stdout.write(
+            f"Carrito de {options['items']} ítems, {options['repeticiones']} checkouts: "
+            f"p50 {statistics.median(latencias) * 1000:.1f} ms   p95 {p95 * 1000:.1f} ms   "
+            f"{consultas} consultas (1 ítem: {consultas_uno})"
+        )
+        if consultas != consultas_uno:
+            raise CommandError("El número de consultas crece con el tamaño del carrito.")
+        self.stdout.write(self.style.SUCCESS("Consultas constantes."))
+
+    def _medir(self, items, repeticiones):
+        consultas, latencias = set(), []
+        for n in range(repeticiones):
+            with transaction.atomic():
+                user, buy_order = self._preparar(items, n)
+                with CaptureQueriesContext(connection) as capturadas:
+                    inicio = time.perf_counter()
+                    _finalizar_pedido_carrito(user, buy_order, 1000 * items)
+                    latencias.append(time.perf_counter() - inicio)
+                consultas.add(len(capturadas))
+                transaction.set_rollback(True)
+        if len(consultas) > 1:
+            raise CommandError(f"Consultas distintas entre repeticiones: {sorted(consultas)}")
+        return consultas.pop(), latencias
+
+    def _preparar(self, items, n):
+        """Carrito de `items` productos con su reserva, como queda tras webpay_create."""
+        user = User.objects.create(username=USUARIO, password='!')
+        productos = Producto.objects.bulk_create(
+            Producto(nombre=f'Benchmark {n}-{i}', precio=1000, stock=10) for i in range(items)
+        )
+        carrito = Carrito.objects.create(user=user)
+        CarritoItem.objects.bulk_create(
+            CarritoItem(carrito=carrito, producto=producto, cantidad=2) for producto in productos
+        )
+        buy_order = f'C{user.id}T{n}'
+        reservar_carrito(user, carrito, buy_order)
+        return user, buy_order
@@ -0,0 +1,57 @@
+import json
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.test import APIRequestFactory
+
+from tienda.imagenes import vigentes
+from tienda.models import Producto
+from tienda.views import ProductoViewSet
+
+
+class Command(BaseCommand):
+    help = (
+        "Compara los bytes que baja un navegador para una página del catálogo: JSON más "
+        "imágenes originales contra JSON más la variante WebP que elegiría el srcset."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--ancho', type=int, default=480, help="Ancho en px con que se muestra la tarjeta")
+        parser.add_argument('--fields', default='id,nombre,precio,imagen,imagen_variantes,stock,rating_promedio,total_vendidos')
+
+    def handle(self, *args, **options):
+        host = settings.ALLOWED_HOSTS[0] if settings.ALLOWED_HOSTS else 'localhost'
+        request = APIRequestFactory().get('/api/productos/', {'fields': options['fields']}, HTTP_HOST=host)
+        response = ProductoViewSet.as_view({'get': 'list'})(request)
+        response.render()
+        if response.status_code != 200:
+            raise CommandError(f"El catálogo respondió {response.status_code}")
+        pagina = json.loads(response.content)
+        ids = [p['id'] for p in pagina['results']]
+        productos = Producto.objects.in_bulk(ids)
+
+        originales = variantes = sin_variantes = 0
+        for producto in productos.values():
+            if not producto.imagen or not default_storage.exists(producto.imagen.name):
+                continue
+            tamano_original = default_storage.size(producto.imagen.name)
+            originales += tamano_original
+            anchos = vigentes(producto.imagen, producto.imagen_variantes)
+            if not anchos:
+                sin_variantes += 1
+                variantes += tamano_original
+                continue
+            # Lo que elige el navegador: la menor variante que cubra el ancho mostrado
+            cubren = [int(a) for a in anchos if int(a) >= options['ancho']]
+            elegido = str(min(cubren) if cubren else max(int(a) for a in anchos))
+            variantes += default_storage.size(anchos[elegido])
+
+        json_bytes = len(response.content)
+        self.stdout.write(f"{len(ids)} productos en la página, JSON {json_bytes / 1024:.1f} KB")
+        self.stdout.write(f"antes  (originales):   {(json_bytes + originales) / 1024:10.1f} KB")
+        self.stdout.write(f"después (WebP {options['ancho']}px): {(json_bytes + variantes) / 1024:10.1f} KB")
+        if sin_variantes:
+            self.stdout.write(self.style.WARNING(
+                f"{sin_variantes} productos aún sin variantes (cuentan con el original): correr generar_variantes"
+            ))
@@ -0,0 +1,140 @@
+import asyncio
+import resource
+import statistics
+import threading
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.urls import reverse
+from rest_framework_simplejwt.tokens import AccessToken
+
+from backend.asgi import application
+from tienda.eventos import fanout_notificaciones, receptor_notificaciones
+
+USUARIO = 'benchmark_sse'
+
+
+def _rss_mb():
+    """Memoria residente actual (Linux); si no hay /proc, el máximo del proceso."""
+    try:
+        with open('/proc/self/statm') as statm:
+            return int(statm.read().split()[1]) * resource.getpagesize() / 2**20
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def scope_stream(access_token):
+    """Scope ASGI de un GET al stream autenticado con el header Authorization."""
+    return {
+        'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'GET',
+        'scheme': 'http', 'path': reverse('notificaciones_stream'), 'query_string': b'',
+        'headers': [(b'authorization', f'Bearer {access_token}'.encode())],
+        'client': ('127.0.0.1', 0), 'server': ('127.0.0.1', 80),
+    }
+
+
+class ConexionAsgi:
+    """Un cliente SSE hablando ASGI directo con la aplicación, sin sockets."""
+
+    def __init__(self):
+        self.status = None
+        self.abierta = asyncio.Event()
+        self.cerrar = asyncio.Event()
+        self.pedido = False
+        self.eventos = []
+
+    async def receive(self):
+        if not self.pedido:
+            self.pedido = True
+            return {'type': 'http.request', 'body': b'', 'more_body': False}
+        await self.cerrar.wait()
+        return {'type': 'http.disconnect'}
+
+    async def send(self, mensaje):
+        if mensaje['type'] == 'http.response.start':
+            self.status = mensaje['status']
+        elif mensaje['type'] == 'http.response.body':
+            # El primer trozo ("retry: ...") indica que el stream ya está suscrito
+            self.abierta.set()
+            if b'event: ' in mensaje.get('body', b''):
+                self.eventos.append(time.perf_counter())
+
+
+class Command(BaseCommand):
+    help = (
+        "Abre --conexiones streams SSE inactivos contra /api/notificaciones/stream/ en un solo "
+        "proceso con la aplicación de backend/asgi.py (un event loop, todo el middleware, sin "
+        "sockets), los deja --espera segundos (al menos un heartbeat) y publica un evento a "
+        "todos. Reporta memoria por conexión, hilos, CPU en reposo y latencia de entrega "
+        "p50/p99. Solo crea un usuario temporal que se borra al final."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--conexiones', type=int, default=5000)
+        parser.add_argument('--espera', type=float, default=30, help="segundos con los streams inactivos")
+
+    def handle(self, *args, **options):
+        User.objects.filter(username=USUARIO).delete()
+        user = User.objects.create(username=USUARIO, password='!')
+        try:
+            resultado = asyncio.run(self._medir(str(AccessToken.for_user(user)), options))
+        finally:
+            receptor_notificaciones.detener()
+            User.objects.filter(username=USUARIO).delete()
+
+        n = options['conexiones']
+        self.stdout.write(
+            f"{n} streams abiertos en {resultado['apertura']:.1f} s   "
+            f"memoria +{resultado['memoria']:.0f} MB ({resultado['memoria'] * 1024 / n:.1f} KB por conexión)   "
+            f"{resultado['hilos']} hilos"
+        )
+        self.stdout.write(
+            f"En reposo {options['espera']:.0f} s: {resultado['cpu'] / options['espera'] * 100:.1f}% de CPU   "
+            f"evento a todos: p50 {resultado['p50'] * 1000:.0f} ms   p99 {resultado['p99'] * 1000:.0f} ms"
+        )
+        if resultado['fallas']:
+            raise CommandError("Falló: " + ", ".join(resultado['fallas']))
+        self.stdout.write(self.style.SUCCESS("Todos los streams recibieron el evento."))
+
+    async def _medir(self, token, options):
+        n = options['conexiones']
+        conexiones = [ConexionAsgi() for _ in range(n)]
+        memoria_antes = _rss_mb()
+
+        inicio = time.perf_counter()
+        tareas = [asyncio.create_task(application(scope_stream(token), c.receive, c.send)) for c in conexiones]
+        await asyncio.gather(*(c.abierta.wait() for c in conexiones))
+        apertura = time.perf_counter() - inicio
+        memoria = _rss_mb() - memoria_antes
+        hilos = threading.active_count()
+
+        cpu = time.process_time()
+        await asyncio.sleep(options['espera'])
+        cpu = time.process_time() - cpu
+
+        # Como una señal de Django: se publica desde otro hilo
+        publicado = time.perf_counter()
+        await asyncio.to_thread(fanout_notificaciones.publicar, 'noticia', {'titulo': 'benchmark'})
+        limite = time.monotonic() + 30
+        while sum(1 for c in conexiones if c.eventos) < n and time.monotonic() < limite:
+            await asyncio.sleep(0.05)
+        latencias = sorted(c.eventos[0] - publicado for c in conexiones if c.eventos)
+
+        for conexion in conexiones:
+            conexion.cerrar.set()
+        await asyncio.gather(*tareas, return_exceptions=True)
+
+        fallas = []
+        rechazadas = sum(1 for c in conexiones if c.status != 200)
+        if rechazadas:
+            fallas.append(f"{rechazadas} streams sin HTTP 200")
+        if len(latencias) < n:
+            fallas.append(f"{n - len(latencias)} streams no recibieron el evento")
+        if fanout_notificaciones.conectados():
+            fallas.append(f"{fanout_notificaciones.conectados()} suscriptores quedaron registrados")
+        return {
+            'apertura': apertura, 'memoria': memoria, 'hilos': hilos, 'cpu': cpu, 'fallas': fallas,
+            'p50': statistics.median(latencias) if latencias else 0,
+            'p99': latencias[min(len(latencias) - 1, int(len(latencias) * 0.99))] if latencias else 0,
+        }
@@ -0,0 +1,89 @@
+import time
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+
+from tienda.models import Notificacion, Plan, Profile, Suscripcion
+from tienda.suscripciones import avisar_por_vencer, por_vencer, vencer_suscripciones, vencidas
+
+LOTE_CARGA = 10000
+
+
+class Command(BaseCommand):
+    help = (
+        "Carga N suscripciones sintéticas (la mitad vencidas y una de cada diez por vencer), "
+        "mide `vencer_suscripciones` y verifica estados, punteros y avisos. Todo corre en una "
+        "transacción que se revierte al final: no deja datos."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--cantidad', type=int, default=1000000)
+        parser.add_argument('--presupuesto', type=float, default=120.0, help="segundos máximos para vencer y avisar")
+
+    def handle(self, *args, **options):
+        n = options['cantidad']
+        ahora = timezone.now()
+        with transaction.atomic():
+            esperado_vencidas = vencidas(ahora).count()
+            esperado_avisos = por_vencer(ahora).count()
+            notificaciones_antes = Notificacion.objects.count()
+            plan = Plan.objects.first() or Plan.objects.create(nombre="Benchmark", precio=1000)
+
+            inicio = time.perf_counter()
+            for desde in range(0, n, LOTE_CARGA):
+                indices = range(desde, min(desde + LOTE_CARGA, n))
+                usuarios = User.objects.bulk_create([
+                    User(username=f'bench_susc_{i}', password='!') for i in indices
+                ])
+                suscripciones = Suscripcion.objects.bulk_create([
+                    Suscripcion(user=usuario, plan=plan, fecha_vencimiento=self._vencimiento(i, ahora))
+                    for i, usuario in zip(indices, usuarios)
+                ])
+                Profile.objects.bulk_create([
+                    Profile(user=usuario, rut=f'B{i}', suscripcion_actual=suscripcion)
+                    for i, usuario, suscripcion in zip(indices, usuarios, suscripciones)
+                ])
+            esperado_vencidas += sum(1 for i in range(n) if i % 2 == 0)
+            esperado_avisos += sum(1 for i in range(n) if i % 10 == 1)
+            self.stdout.write(f"Carga de {n} suscripciones: {time.perf_counter() - inicio:.1f} s")
+
+            inicio = time.perf_counter()
+            total_vencidas = vencer_suscripciones(ahora=ahora)
+            t_vencer = time.perf_counter() - inicio
+            inicio = time.perf_counter()
+            total_avisos = avisar_por_vencer(ahora=ahora)
+            t_avisar = time.perf_counter() - inicio
+            self.stdout.write(
+                f"vencer: {total_vencidas} en {t_vencer:.2f} s   avisar: {total_avisos} en {t_avisar:.2f} s"
+            )
+
+            fallas = []
+            if total_vencidas != esperado_vencidas:
+                fallas.append(f"vencidas {total_vencidas}, se esperaban {esperado_vencidas}")
+            if total_avisos != esperado_avisos:
+                fallas.append(f"avisos {total_avisos}, se esperaban {esperado_avisos}")
+            if vencidas(ahora).exists():
+                fallas.append("quedaron suscripciones vencidas activas")
+            if Profile.objects.filter(suscripcion_actual__fecha_vencimiento__lte=ahora).exists():
+                fallas.append("quedaron perfiles apuntando a suscripciones vencidas")
+            creadas = Notificacion.objects.count() - notificaciones_antes
+            if creadas != total_vencidas + total_avisos:
+                fallas.append(f"{creadas} notificaciones, se esperaban {total_vencidas + total_avisos}")
+            if t_vencer + t_avisar > options['presupuesto']:
+                fallas.append(f"superó el presupuesto de {options['presupuesto']:.0f} s")
+            transaction.set_rollback(True)
+
+        if fallas:
+            raise CommandError("Falló: " + ", ".join(fallas))
+        self.stdout.write(self.style.SUCCESS("Vencimiento y avisos correctos dentro del presupuesto."))
+
+    @staticmethod
+    def _vencimiento(i, ahora):
+        if i % 2 == 0:
+            return ahora - timedelta(days=1 + i % 30)
+        if i % 10 == 1:
+            return ahora + timedelta(days=1)
+        return ahora + timedelta(days=60)
@@ -0,0 +1,84 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from tienda.carrito import sumar_al_carrito
+from tienda.models import CarritoItem, Producto
+from tienda.reservas import StockInsuficiente
+
+
+class Command(BaseCommand):
+    help = (
+        "Lanza N sumas simultáneas de 1 unidad del mismo producto al carrito de un usuario "
+        "y verifica que no se pierdan incrementos, que quede una sola línea y que no se "
+        "supere el stock. Borra esa línea del carrito antes y después de la prueba."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('usuario', help="username dueño del carrito")
+        parser.add_argument('--producto', type=int, help="ID del producto (por defecto el de más stock)")
+        parser.add_argument('--concurrentes', type=int, default=100)
+
+    def handle(self, *args, **options):
+        try:
+            user = User.objects.get(username=options['usuario'])
+        except User.DoesNotExist:
+            raise CommandError(f"No existe el usuario {options['usuario']}")
+        if options['producto']:
+            producto = Producto.objects.filter(id=options['producto']).first()
+        else:
+            producto = Producto.objects.order_by('-stock').first()
+        if producto is None:
+            raise CommandError("Producto no encontrado.")
+
+        n = options['concurrentes']
+        lineas = CarritoItem.objects.filter(carrito__user=user, producto=producto)
+        lineas.delete()
+        barrera = threading.Barrier(n)
+
+        def sumar(_):
+            try:
+                barrera.wait()
+                sumar_al_carrito(user, producto.id, 1)
+                return 'ok'
+            except StockInsuficiente:
+                return 'sin_stock'
+            except Exception as e:
+                return f'{type(e).__name__}: {e}'
+            finally:
+                connection.close()
+
+        inicio = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=n) as pool:
+            resultados = list(pool.map(sumar, range(n)))
+        duracion = time.perf_counter() - inicio
+
+        exitos = resultados.count('ok')
+        sin_stock = resultados.count('sin_stock')
+        errores = [r for r in resultados if r not in ('ok', 'sin_stock')]
+        cantidades = list(lineas.values_list('cantidad', flat=True))
+        lineas.delete()
+
+        self.stdout.write(
+            f"{n} sumas en {duracion * 1000:.0f} ms: {exitos} aplicadas, {sin_stock} sin stock, "
+            f"{len(errores)} errores. Stock {producto.stock}, líneas {len(cantidades)}, cantidad {sum(cantidades)}"
+        )
+        for error in sorted(set(errores)):
+            self.stdout.write(f"  {errores.count(error)} x {error}")
+
+        fallas = []
+        if len(cantidades) > 1:
+            fallas.append(f"líneas duplicadas ({len(cantidades)})")
+        if sum(cantidades) != exitos:
+            fallas.append(f"incrementos perdidos ({exitos - sum(cantidades)})")
+        if sum(cantidades) > producto.stock:
+            fallas.append("se superó el stock")
+        if errores:
+            fallas.append("sumas con error")
+        if fallas:
+            raise CommandError("Falló: " + ", ".join(fallas))
+        self.stdout.write(self.style.SUCCESS("Sin incrementos perdidos ni líneas duplicadas."))
@@ -0,0 +1,98 @@
+import statistics
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from tienda.models import Carrito, CarritoItem, Producto
+from tienda.views_webpay import _finalizar_pedido_carrito
+
+PREFIJO = 'estres_checkout_'
+
+
+class Command(BaseCommand):
+    help = (
+        "Mide el rendimiento de checkouts simultáneos contra la base configurada (DB_ENGINE). "
+        "Cada checkout corre el cierre completo del pedido (locks, stock, ítems, resúmenes) "
+        "dentro de una transacción que se revierte, así que no deja pedidos ni mueve stock. "
+        "Usa usuarios temporales que se borran al final."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--checkouts', type=int, default=500)
+        parser.add_argument('--concurrentes', type=int, default=20)
+        parser.add_argument('--usuarios', type=int, default=20)
+        parser.add_argument('--productos', type=int, default=3, help="productos por carrito")
+
+    def handle(self, *args, **options):
+        productos = list(
+            Producto.objects.filter(stock__gt=0).order_by('-stock').values_list('id', flat=True)[:options['productos']]
+        )
+        if not productos:
+            raise CommandError("No hay productos con stock.")
+        monto = sum(Producto.objects.filter(id__in=productos).values_list('precio', flat=True))
+
+        User.objects.filter(username__startswith=PREFIJO).delete()
+        usuarios = User.objects.bulk_create([
+            User(username=f'{PREFIJO}{i}', password='!') for i in range(options['usuarios'])
+        ])
+        carritos = Carrito.objects.bulk_create([Carrito(user=usuario) for usuario in usuarios])
+        CarritoItem.objects.bulk_create([
+            CarritoItem(carrito=carrito, producto_id=producto_id, cantidad=1)
+            for carrito in carritos for producto_id in productos
+        ])
+
+        siguiente = iter(range(options['checkouts']))
+        lock = threading.Lock()
+
+        def trabajador(_):
+            latencias, errores = [], []
+            try:
+                while True:
+                    with lock:
+                        n = next(siguiente, None)
+                    if n is None:
+                        return latencias, errores
+                    usuario = usuarios[n % len(usuarios)]
+                    inicio = time.perf_counter()
+                    try:
+                        with transaction.atomic():
+                            _finalizar_pedido_carrito(usuario, f'estres-{uuid.uuid4().hex[:20]}', monto)
+                            transaction.set_rollback(True)
+                        latencias.append(time.perf_counter() - inicio)
+                    except Exception as e:
+                        errores.append(f'{type(e).__name__}: {e}')
+            finally:
+                connection.close()
+
+        try:
+            inicio = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=options['concurrentes']) as pool:
+                resultados = list(pool.map(trabajador, range(options['concurrentes'])))
+            duracion = time.perf_counter() - inicio
+        finally:
+            User.objects.filter(username__startswith=PREFIJO).delete()
+
+        latencias = sorted(l for r in resultados for l in r[0])
+        errores = [e for r in resultados for e in r[1]]
+        base = connection.settings_dict
+        modo = base['OPTIONS'].get('transaction_mode', 'DEFERRED') if connection.vendor == 'sqlite' else (
+            'pool' if base['OPTIONS'].get('pool') else f"CONN_MAX_AGE={base['CONN_MAX_AGE']}"
+        )
+        self.stdout.write(f"{connection.vendor} ({modo}), {options['concurrentes']} hilos")
+        if latencias:
+            p95 = latencias[min(len(latencias) - 1, int(len(latencias) * 0.95))]
+            self.stdout.write(
+                f"{len(latencias)} checkouts en {duracion:.2f} s: {len(latencias) / duracion:.1f} por segundo, "
+                f"p50 {statistics.median(latencias) * 1000:.1f} ms, p95 {p95 * 1000:.1f} ms"
+            )
+        self.stdout.write(f"{len(errores)} errores")
+        for error in sorted(set(errores)):
+            self.stdout.write(f"  {errores.count(error)} x {error}")
+        if errores:
+            raise CommandError("Hubo checkouts con error.")
+        self.stdout.write(self.style.SUCCESS("Checkouts sin errores."))
@@ -0,0 +1,33 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from tienda.imagenes import procesar, vigentes
+from tienda.models import Producto, ProductoImagen, Profile
+
+
+class Command(BaseCommand):
+    help = (
+        "Genera las variantes WebP de las imágenes que aún no las tienen (productos, galería "
+        "y avatares). Sirve para las imágenes subidas antes de existir el pipeline."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--forzar', action='store_true', help="Regenera también las que ya tienen variantes")
+
+    def handle(self, *args, **options):
+        pendientes = []
+        for modelo, campo in ((Producto, 'imagen'), (ProductoImagen, 'imagen'), (Profile, 'avatar')):
+            filas = modelo.objects.exclude(**{campo: ''}).exclude(**{f'{campo}__isnull': True})
+            for pk, nombre, variantes in filas.values_list('pk', campo, f'{campo}_variantes').iterator():
+                archivo = getattr(modelo(**{campo: nombre}), campo)
+                if options['forzar'] or not vigentes(archivo, variantes):
+                    pendientes.append((modelo, pk, campo, nombre))
+
+        with ThreadPoolExecutor(max_workers=max(settings.IMAGENES_WORKERS, 1)) as pool:
+            resultados = list(pool.map(lambda trabajo: procesar(*trabajo), pendientes))
+        fallidas = resultados.count(None)
+        self.stdout.write(self.style.SUCCESS(
+            f"{len(pendientes) - fallidas} imágenes procesadas, {fallidas} con error u omitidas."
+        ))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from tienda.reservas import purgar_reservas_vencidas
+
+
+class Command(BaseCommand):
+    help = "Purga en lotes las reservas de stock vencidas (pensado para cron cada pocos minutos)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lote', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        borradas = purgar_reservas_vencidas(lote=options['lote'])
+        self.stdout.write(self.style.SUCCESS(f"{borradas} reservas vencidas eliminadas."))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from tienda.carrito import purgar_invitados_vencidos
+
+
+class Command(BaseCommand):
+    help = "Purga en lotes los carritos de invitado vencidos (pensado para cron diario)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lote', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        borrados = purgar_invitados_vencidos(lote=options['lote'])
+        self.stdout.write(self.style.SUCCESS(f"{borrados} carritos de invitado vencidos eliminados."))
@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, IntegerField, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+from tienda.models import Producto, Review, PedidoItem
+
+
+class Command(BaseCommand):
+    help = "Reconstruye desde cero los agregados de reseñas y ventas de cada Producto."
+
+    def handle(self, *args, **options):
+        reviews = Review.objects.filter(producto=OuterRef('pk')).values('producto')
+        vendidos = (
+            PedidoItem.objects
+            .filter(producto=OuterRef('pk'), pedido__estado='PAGADO')
+            .values('producto')
+        )
+
+        with transaction.atomic():
+            actualizados = Producto.objects.update(
+                total_reviews=Coalesce(
+                    Subquery(reviews.annotate(c=Count('id')).values('c')),
+                    Value(0), output_field=IntegerField(),
+                ),
+                suma_ratings=Coalesce(
+                    Subquery(reviews.annotate(s=Sum('rating')).values('s')),
+                    Value(0), output_field=IntegerField(),
+                ),
+                total_vendidos=Coalesce(
+                    Subquery(vendidos.annotate(s=Sum('cantidad')).values('s')),
+                    Value(0), output_field=IntegerField(),
+                ),
+            )
+
+        self.stdout.write(self.style.SUCCESS(f"Agregados recalculados para {actualizados} productos."))
@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+
+from tienda.reportes import reconstruir
+
+
+class Command(BaseCommand):
+    help = (
+        "Reconstruye los resúmenes diarios de ventas, productos y planes desde los pedidos "
+        "y suscripciones. Sin --desde/--hasta recorre todo el historial."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--desde', help="AAAA-MM-DD")
+        parser.add_argument('--hasta', help="AAAA-MM-DD")
+
+    def handle(self, *args, **options):
+        fechas = {}
+        for nombre in ('desde', 'hasta'):
+            valor = options[nombre]
+            if valor:
+                try:
+                    fechas[nombre] = parse_date(valor)
+                except ValueError:
+                    fechas[nombre] = None
+                if fechas[nombre] is None:
+                    raise CommandError(f"--{nombre} debe tener formato AAAA-MM-DD")
+
+        dias = reconstruir(**fechas)
+        self.stdout.write(self.style.SUCCESS(f"Resúmenes recalculados: {dias} días con movimiento."))
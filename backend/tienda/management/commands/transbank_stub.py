@@ -0,0 +1,149 @@
+import json
+import random
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlencode
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from tienda.transbank import RUTA_TRANSACCIONES
+
+
+class _Servidor(ThreadingHTTPServer):
+    daemon_threads = True
+    # La cola por defecto (5) deja esperando conexiones cuando hay muchos clientes a la vez
+    request_queue_size = 128
+
+
+class Command(BaseCommand):
+    help = (
+        "Levanta un stub local de la API Webpay Plus (crear/confirmar/estado) con latencia "
+        "configurable. Apunta TRANSBANK_BASE_URL a http://HOST:PUERTO para usarlo."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='127.0.0.1')
+        parser.add_argument('--puerto', type=int, default=9000)
+        parser.add_argument('--latencia', type=float, default=0, help="Milisegundos por respuesta")
+        parser.add_argument('--jitter', type=float, default=0, help="Milisegundos extra aleatorios")
+        parser.add_argument('--tasa-error', type=float, default=0, help="Fracción de respuestas 503 (0-1)")
+
+    def handle(self, *args, **options):
+        host, puerto = options['host'], options['puerto']
+        transacciones = {}
+        lock = threading.Lock()
+        base = f"http://{host}:{puerto}"
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'  # keep-alive, como el gateway real
+            disable_nagle_algorithm = True
+
+            def log_message(self, *args):
+                pass
+
+            def _responder(self, status, data=None, headers=None):
+                cuerpo = json.dumps(data).encode() if data is not None else b''
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(cuerpo)))
+                for nombre, valor in (headers or {}).items():
+                    self.send_header(nombre, valor)
+                self.end_headers()
+                self.wfile.write(cuerpo)
+
+            def _leer(self):
+                largo = int(self.headers.get('Content-Length') or 0)
+                return self.rfile.read(largo) if largo else b''
+
+            def _simular_red(self):
+                espera = options['latencia'] + random.uniform(0, options['jitter'])
+                if espera:
+                    time.sleep(espera / 1000)
+                if random.random() < options['tasa_error']:
+                    self._responder(503, {"error_message": "Servicio no disponible (stub)"})
+                    return False
+                return True
+
+            def _token(self):
+                if not self.path.startswith(RUTA_TRANSACCIONES + '/'):
+                    return None
+                return self.path[len(RUTA_TRANSACCIONES) + 1:]
+
+            def do_POST(self):
+                cuerpo = self._leer()
+                if self.path == '/webpayserver/initTransaction':
+                    # Simula al tarjetahabiente pagando: vuelve al comercio con el token
+                    token = parse_qs(cuerpo.decode()).get('token_ws', [''])[0]
+                    with lock:
+                        transaccion = transacciones.get(token)
+                    if transaccion is None:
+                        return self._responder(404, {"error_message": "Token desconocido"})
+                    destino = f"{transaccion['return_url']}?{urlencode({'token_ws': token})}"
+                    return self._responder(303, headers={'Location': destino})
+
+                if self.path != RUTA_TRANSACCIONES:
+                    return self._responder(404, {"error_message": "Ruta no encontrada"})
+                if not self._simular_red():
+                    return
+                datos = json.loads(cuerpo or b'{}')
+                token = uuid.uuid4().hex
+                with lock:
+                    transacciones[token] = {
+                        "buy_order": datos.get('buy_order'),
+                        "session_id": datos.get('session_id'),
+                        "amount": datos.get('amount'),
+                        "return_url": datos.get('return_url'),
+                        "status": "INITIALIZED",
+                    }
+                self._responder(200, {"token": token, "url": f"{base}/webpayserver/initTransaction"})
+
+            def do_PUT(self):
+                self._leer()
+                token = self._token()
+                if not self._simular_red():
+                    return
+                with lock:
+                    transaccion = transacciones.get(token)
+                    if transaccion is None:
+                        return self._responder(422, {"error_message": "Invalid value for parameter: token"})
+                    if transaccion['status'] != 'INITIALIZED':
+                        return self._responder(422, {"error_message": "Transaction already locked by another process"})
+                    transaccion.update({
+                        "status": "AUTHORIZED",
+                        "vci": "TSY",
+                        "response_code": 0,
+                        "authorization_code": "1213",
+                        "payment_type_code": "VN",
+                        "installments_number": 0,
+                        "card_detail": {"card_number": "6623"},
+                        "accounting_date": timezone.now().strftime('%m%d'),
+                        "transaction_date": timezone.now().isoformat(),
+                    })
+                    respuesta = {k: v for k, v in transaccion.items() if k != 'return_url'}
+                self._responder(200, respuesta)
+
+            def do_GET(self):
+                token = self._token()
+                if not self._simular_red():
+                    return
+                with lock:
+                    transaccion = transacciones.get(token)
+                    respuesta = transaccion and {k: v for k, v in transaccion.items() if k != 'return_url'}
+                if respuesta is None:
+                    return self._responder(422, {"error_message": "Invalid value for parameter: token"})
+                self._responder(200, respuesta)
+
+        servidor = _Servidor((host, puerto), Handler)
+        self.stdout.write(self.style.SUCCESS(
+            f"Stub Transbank en {base} (latencia {options['latencia']}ms, "
+            f"jitter {options['jitter']}ms, error {options['tasa_error']:.0%}). Ctrl+C para salir."
+        ))
+        try:
+            servidor.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            servidor.server_close()
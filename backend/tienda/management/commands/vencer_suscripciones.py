@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from tienda.suscripciones import LOTE, avisar_por_vencer, vencer_suscripciones
+
+
+class Command(BaseCommand):
+    help = (
+        "Vence las suscripciones cuya fecha ya pasó y avisa a quienes vencen pronto "
+        "(pensado para cron, por ejemplo cada hora)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dias', type=int, help="anticipación del aviso (por defecto SUSCRIPCION_AVISO_DIAS)")
+        parser.add_argument('--lote', type=int, default=LOTE)
+
+    def handle(self, *args, **options):
+        vencidas = vencer_suscripciones(lote=options['lote'])
+        avisos = avisar_por_vencer(dias=options['dias'], lote=options['lote'])
+        self.stdout.write(self.style.SUCCESS(
+            f"{vencidas} suscripciones vencidas, {avisos} avisos de vencimiento próximo."
+        ))
@@ -0,0 +1,89 @@
+import re
+from datetime import datetime, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+
+from tienda.models import (
+    Carrito, CarritoItem, Pedido, PedidoItem, Producto, Profile, Review, Suscripcion,
+)
+from tienda.suscripciones import vencidas
+from tienda.views import _notificaciones_con_lectura
+
+# "SCAN tabla" sin índice en SQLite, "Seq Scan on tabla" en PostgreSQL
+RECORRIDO_SQLITE = re.compile(r'\bSCAN (\w+)\b(?! USING)')
+RECORRIDO_INDICE_SQLITE = re.compile(r'\bSCAN (\w+) USING (?:COVERING )?INDEX')
+RECORRIDO_POSTGRES = re.compile(r'Seq Scan on (\w+)')
+
+
+class Command(BaseCommand):
+    help = (
+        "Corre EXPLAIN sobre las consultas frecuentes de views.py y views_webpay.py y falla "
+        "si alguna recorre una tabla completa (regresión de índices). En PostgreSQL se "
+        "desactiva el Seq Scan para que el resultado no dependa del tamaño de las tablas."
+    )
+
+    def consultas(self):
+        """(nombre, queryset, admite recorrer un índice completo). Los ids no necesitan existir."""
+        user_id = Profile.objects.values_list('user_id', flat=True).first() or 1
+        producto_id = Producto.objects.values_list('id', flat=True).first() or 1
+        hoy = timezone.make_aware(datetime.combine(timezone.localdate(), datetime.min.time()))
+        return [
+            # views.py
+            ('mi_plan', Profile.objects.select_related('suscripcion_actual__plan').filter(user_id=user_id), False),
+            ('mi_plan_sin_perfil', Suscripcion.objects.filter(
+                user_id=user_id, activa=True).order_by('-fecha_vencimiento')[:1], False),
+            ('historial_planes', Suscripcion.objects.filter(user_id=user_id).order_by('-fecha_inicio'), False),
+            ('mis_pedidos', Pedido.objects.filter(user_id=user_id).order_by('-creado_en'), False),
+            ('carrito', CarritoItem.objects.filter(carrito__user_id=user_id).select_related('producto'), False),
+            # Recorre el índice parcial en orden y corta en el LIMIT de la página
+            ('catalogo', Producto.objects.filter(activo=True).order_by('-creado_en', '-id')[:20], True),
+            ('resenas_publicas', Review.objects.filter(
+                producto_id=producto_id, is_visible=True).order_by('-creado_en'), False),
+            ('resena_existente', Review.objects.filter(producto_id=producto_id, user_id=user_id), False),
+            ('exportar_boletas', Pedido.objects.filter(
+                estado='PAGADO', creado_en__gte=hoy - timedelta(days=30), creado_en__lt=hoy,
+            ).order_by('creado_en', 'id'), False),
+            ('notificaciones_pendientes', _notificaciones_con_lectura(
+                user_id, None).filter(id__gt=0).order_by('id'), False),
+            # views_webpay.py
+            ('webpay_carrito', Carrito.objects.filter(user_id=user_id), False),
+            ('webpay_suscripcion_orden', Suscripcion.objects.filter(orden_compra='orden'), False),
+            ('webpay_pedido_orden', Pedido.objects.filter(orden_compra='orden'), False),
+            ('webpay_renovada', Suscripcion.objects.filter(user_id=user_id), False),
+            ('webpay_stock', Producto.objects.filter(id__in=[producto_id], stock__lt=0), False),
+            # Procesos por lote
+            ('vencer_suscripciones', vencidas(), False),
+            ('ventas_producto', PedidoItem.objects.filter(producto_id=producto_id, pedido__estado='PAGADO'), False),
+        ]
+
+    def recorridos(self, plan, admite_indice):
+        if connection.vendor == 'postgresql':
+            return RECORRIDO_POSTGRES.findall(plan)
+        tablas = RECORRIDO_SQLITE.findall(plan)
+        if not admite_indice:
+            tablas += RECORRIDO_INDICE_SQLITE.findall(plan)
+        return tablas
+
+    def handle(self, *args, **options):
+        if connection.vendor not in ('sqlite', 'postgresql'):
+            raise CommandError(f"Sin soporte para leer planes de {connection.vendor}.")
+        fallas = []
+        with transaction.atomic():
+            if connection.vendor == 'postgresql':
+                with connection.cursor() as cursor:
+                    cursor.execute("SET LOCAL enable_seqscan = off")
+            for nombre, queryset, admite_indice in self.consultas():
+                plan = queryset.explain()
+                tablas = self.recorridos(plan, admite_indice)
+                if tablas:
+                    fallas.append(nombre)
+                    self.stdout.write(self.style.ERROR(f"{nombre:<28} recorre {', '.join(tablas)}"))
+                    self.stdout.write("    " + plan.replace("\n", "\n    "))
+                else:
+                    self.stdout.write(f"{nombre:<28} ok")
+
+        if fallas:
+            raise CommandError(f"{len(fallas)} consultas sin índice: {', '.join(fallas)}")
+        self.stdout.write(self.style.SUCCESS("Todas las consultas frecuentes usan índices."))
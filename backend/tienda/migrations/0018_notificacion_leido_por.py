@@ -0,0 +1,36 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:10
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tienda', '0015_review_is_visible'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Noticia',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('titulo', models.CharField(max_length=200)),
+                ('contenido', models.TextField()),
+                ('imagen', models.ImageField(blank=True, null=True, upload_to='noticias/')),
+                ('creado_en', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Notificacion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('titulo', models.CharField(max_length=100)),
+                ('mensaje', models.TextField()),
+                ('tipo', models.CharField(choices=[('info', 'Información (Azul)'), ('alerta', 'Alerta/Problema (Rojo)'), ('exito', 'Aviso/Evento (Verde)')], default='info', max_length=20)),
+                ('creado_en', models.DateTimeField(auto_now_add=True)),
+                ('leido_por', models.ManyToManyField(blank=True, related_name='notificaciones_leidas', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+    ]
@@ -0,0 +1,55 @@
+from django.db import migrations, models
+from django.db.models import Count, IntegerField, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+
+def poblar_agregados(apps, schema_editor):
+    Producto = apps.get_model('tienda', 'Producto')
+    Review = apps.get_model('tienda', 'Review')
+    PedidoItem = apps.get_model('tienda', 'PedidoItem')
+
+    reviews = Review.objects.filter(producto=OuterRef('pk')).values('producto')
+    vendidos = PedidoItem.objects.filter(
+        producto=OuterRef('pk'), pedido__estado='PAGADO'
+    ).values('producto')
+
+    Producto.objects.update(
+        total_reviews=Coalesce(
+            Subquery(reviews.annotate(c=Count('id')).values('c')),
+            Value(0), output_field=IntegerField(),
+        ),
+        suma_ratings=Coalesce(
+            Subquery(reviews.annotate(s=Sum('rating')).values('s')),
+            Value(0), output_field=IntegerField(),
+        ),
+        total_vendidos=Coalesce(
+            Subquery(vendidos.annotate(s=Sum('cantidad')).values('s')),
+            Value(0), output_field=IntegerField(),
+        ),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tienda', '0020_producto_activo'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='producto',
+            name='total_reviews',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='producto',
+            name='suma_ratings',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='producto',
+            name='total_vendidos',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(poblar_agregados, migrations.RunPython.noop),
+    ]
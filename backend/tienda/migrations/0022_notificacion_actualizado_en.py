@@ -0,0 +1,16 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tienda', '0021_producto_agregados'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='notificacion',
+            name='actualizado_en',
+            field=models.DateTimeField(auto_now=True),
+        ),
+    ]
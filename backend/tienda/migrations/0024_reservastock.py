@@ -0,0 +1,33 @@
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tienda', '0023_estadonotificaciones'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReservaStock',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('orden_compra', models.CharField(max_length=100)),
+                ('cantidad', models.PositiveIntegerField()),
+                ('creada_en', models.DateTimeField(auto_now_add=True)),
+                ('expira_en', models.DateTimeField()),
+                ('producto', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='reservas', to='tienda.producto')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='reservas_stock', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [
+                    models.Index(fields=['producto', 'expira_en'], name='tienda_rese_product_e80f74_idx'),
+                    models.Index(fields=['orden_compra'], name='tienda_rese_orden_c_54388a_idx'),
+                    models.Index(fields=['expira_en'], name='tienda_rese_expira__539c8c_idx'),
+                ],
+            },
+        ),
+    ]
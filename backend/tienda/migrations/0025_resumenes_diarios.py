@@ -0,0 +1,55 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:39
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tienda', '0024_reservastock'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ResumenVentasDiario',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateField(unique=True)),
+                ('pedidos', models.PositiveIntegerField(default=0)),
+                ('unidades', models.PositiveIntegerField(default=0)),
+                ('ingresos_pedidos', models.BigIntegerField(default=0)),
+                ('suscripciones_nuevas', models.PositiveIntegerField(default=0)),
+                ('suscripciones_renovadas', models.PositiveIntegerField(default=0)),
+                ('ingresos_suscripciones', models.BigIntegerField(default=0)),
+                ('pagos_fallidos', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ResumenPlanDiario',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateField()),
+                ('nuevas', models.PositiveIntegerField(default=0)),
+                ('renovadas', models.PositiveIntegerField(default=0)),
+                ('ingresos', models.BigIntegerField(default=0)),
+                ('plan', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='resumenes_diarios', to='tienda.plan')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('fecha', 'plan'), name='unico_resumen_plan_fecha')],
+            },
+        ),
+        migrations.CreateModel(
+            name='ResumenProductoDiario',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateField()),
+                ('unidades', models.PositiveIntegerField(default=0)),
+                ('ingresos', models.BigIntegerField(default=0)),
+                ('producto', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='resumenes_diarios', to='tienda.producto')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('fecha', 'producto'), name='unico_resumen_producto_fecha')],
+            },
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:47
+
+from django.db import migrations, models
+from django.db.models import Count, Min, Sum
+
+
+def consolidar_lineas(apps, schema_editor):
+    # Antes de la restricción: las líneas repetidas de un producto se suman en la más antigua
+    CarritoItem = apps.get_model('tienda', 'CarritoItem')
+    repetidas = (
+        CarritoItem.objects.values('carrito_id', 'producto_id')
+        .annotate(n=Count('id'), primera=Min('id'), total=Sum('cantidad'))
+        .filter(n__gt=1)
+    )
+    for grupo in repetidas:
+        CarritoItem.objects.filter(id=grupo['primera']).update(cantidad=grupo['total'])
+        CarritoItem.objects.filter(
+            carrito_id=grupo['carrito_id'], producto_id=grupo['producto_id'],
+        ).exclude(id=grupo['primera']).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tienda', '0025_resumenes_diarios'),
+    ]
+
+    operations = [
+        migrations.RunPython(consolidar_lineas, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='carritoitem',
+            constraint=models.UniqueConstraint(fields=('carrito', 'producto'), name='unico_item_carrito_producto'),
+        ),
+    ]
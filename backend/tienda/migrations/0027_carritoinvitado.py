@@ -0,0 +1,22 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:49
+
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tienda', '0026_carritoitem_unico'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CarritoInvitado',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('items', models.JSONField(default=dict)),
+                ('expira_en', models.DateTimeField(db_index=True)),
+            ],
+        ),
+    ]
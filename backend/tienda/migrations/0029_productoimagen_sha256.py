@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tienda', '0028_variantes_imagenes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='productoimagen',
+            name='sha256',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=64),
+        ),
+    ]
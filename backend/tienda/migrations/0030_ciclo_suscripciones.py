@@ -0,0 +1,48 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:59
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def apuntar_suscripcion_actual(apps, schema_editor):
+    # Cada perfil apunta a la suscripción activa más reciente de su usuario (un UPDATE)
+    Profile = apps.get_model('tienda', 'Profile')
+    Suscripcion = apps.get_model('tienda', 'Suscripcion')
+    actual = (
+        Suscripcion.objects.filter(user_id=OuterRef('user_id'), activa=True)
+        .order_by('-fecha_vencimiento').values('id')[:1]
+    )
+    Profile.objects.update(suscripcion_actual=Subquery(actual))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tienda', '0029_productoimagen_sha256'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='notificacion',
+            name='destinatario',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='notificaciones_personales', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='profile',
+            name='suscripcion_actual',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='tienda.suscripcion'),
+        ),
+        migrations.AddField(
+            model_name='suscripcion',
+            name='aviso_enviado',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddIndex(
+            model_name='suscripcion',
+            index=models.Index(condition=models.Q(('activa', True)), fields=['fecha_vencimiento'], name='suscripcion_activa_vence'),
+        ),
+        migrations.RunPython(apuntar_suscripcion_actual, migrations.RunPython.noop),
+    ]
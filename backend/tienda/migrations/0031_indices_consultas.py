@@ -0,0 +1,43 @@
+# Generated by Django 5.2.18 on 2026-10-18 20:12
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tienda', '0030_ciclo_suscripciones'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='pedido',
+            index=models.Index(fields=['user', '-creado_en'], name='pedido_user_reciente'),
+        ),
+        migrations.AddIndex(
+            model_name='pedido',
+            index=models.Index(condition=models.Q(('estado', 'PAGADO')), fields=['creado_en', 'id'], name='pedido_pagado_fecha'),
+        ),
+        migrations.AddIndex(
+            model_name='pedidoitem',
+            index=models.Index(fields=['producto', 'pedido'], name='pedidoitem_producto_pedido'),
+        ),
+        migrations.AddIndex(
+            model_name='producto',
+            index=models.Index(condition=models.Q(('activo', True)), fields=['-creado_en', '-id'], name='producto_activo_reciente'),
+        ),
+        migrations.AddIndex(
+            model_name='review',
+            index=models.Index(condition=models.Q(('is_visible', True)), fields=['producto', '-creado_en'], name='review_visible_reciente'),
+        ),
+        migrations.AddIndex(
+            model_name='suscripcion',
+            index=models.Index(fields=['user', '-fecha_inicio'], name='suscripcion_user_inicio'),
+        ),
+        migrations.AddIndex(
+            model_name='suscripcion',
+            index=models.Index(condition=models.Q(('activa', True)), fields=['user', '-fecha_vencimiento'], name='suscripcion_user_activa'),
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 5.2.18 on 2026-10-18 20:46
+
+import django.core.serializers.json
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tienda', '0031_indices_consultas'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EventoNotificacion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('evento', models.CharField(max_length=20)),
+                ('data', models.JSONField(encoder=django.core.serializers.json.DjangoJSONEncoder)),
+                ('event_id', models.BigIntegerField(blank=True, null=True)),
+                ('user_ids', models.JSONField(blank=True, null=True)),
+                ('origen', models.CharField(max_length=32)),
+                ('creado_en', models.DateTimeField(auto_now_add=True, db_index=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.18 on 2026-10-18 21:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tienda', '0033_ticketstream'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EscrituraReciente',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('clave', models.CharField(max_length=64, unique=True)),
+                ('hasta', models.DateTimeField(db_index=True)),
+            ],
+        ),
+    ]
@@ -1,3 +1,6 @@
+import uuid
+
+from django.core.serializers.json import DjangoJSONEncoder
 from django.db import models
 from django.contrib.auth.models import User
 from django.utils import timezone
@@ -13,6 +16,11 @@ class Profile(models.Model):
 
     user = models.OneToOneField(User, on_delete=models.CASCADE)
     avatar = models.ImageField(upload_to='avatars/', null=True, blank=True)
+    avatar_variantes = models.JSONField(default=dict, blank=True, editable=False)  # ver tienda/imagenes.py
+    # Plan vigente del usuario: lo fija Suscripcion.save y lo limpia `vencer_suscripciones`
+    suscripcion_actual = models.ForeignKey(
+        'Suscripcion', null=True, blank=True, on_delete=models.SET_NULL, related_name='+',
+    )
     nombre = models.CharField(max_length=50, null=True, blank=True)
     apellidos = models.CharField(max_length=50, null=True, blank=True)
     rut = models.CharField(max_length=12, unique=True)
@@ -30,6 +38,7 @@ class Producto(models.Model):
     precio = models.IntegerField()
     stock = models.IntegerField(default=0)
     imagen = models.ImageField(upload_to='productos/', null=True, blank=True)
+    imagen_variantes = models.JSONField(default=dict, blank=True, editable=False)  # ver tienda/imagenes.py
     activo = models.BooleanField(default=True) 
 
     # --- AÑADIDO: Campo para borrado lógico ---
@@ -41,16 +50,38 @@ class Producto(models.Model):
     # --- FIN AÑADIDO ---
 
 
+    # --- Agregados desnormalizados (los mantienen las señales de Review/PedidoItem) ---
+    total_reviews = models.PositiveIntegerField(default=0)
+    suma_ratings = models.PositiveIntegerField(default=0)
+    total_vendidos = models.PositiveIntegerField(default=0)
+
     creado_en = models.DateTimeField(auto_now_add=True)
     actualizado_en = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            # Catálogo público: activos en el orden del cursor de paginación
+            models.Index(
+                fields=['-creado_en', '-id'], condition=models.Q(activo=True),
+                name='producto_activo_reciente',
+            ),
+        ]
+
     def __str__(self):
         return self.nombre
+
+    @property
+    def rating_promedio(self):
+        if not self.total_reviews:
+            return 0
+        return round(self.suma_ratings / self.total_reviews, 1)
     
 # --- Modelo de Imágenes Adicionales (Galería) ---
 class ProductoImagen(models.Model):
     producto = models.ForeignKey(Producto, on_delete=models.CASCADE, related_name='imagenes')
     imagen = models.ImageField(upload_to='productos/galeria/')
+    imagen_variantes = models.JSONField(default=dict, blank=True, editable=False)
+    sha256 = models.CharField(max_length=64, blank=True, db_index=True, editable=False)
 
     def __str__(self):
         return f"Imagen de {self.producto.nombre}"
@@ -74,15 +105,35 @@ class Suscripcion(models.Model):
     fecha_vencimiento = models.DateTimeField()
     activa = models.BooleanField(default=True)
     orden_compra = models.CharField(max_length=100, unique=True, null=True, blank=True)
+    # Lo marca `vencer_suscripciones` al avisar que el plan está por vencer
+    aviso_enviado = models.BooleanField(default=False)
+
+    class Meta:
+        indexes = [
+            # Índice parcial: solo las activas, que son las que recorre el vencimiento
+            models.Index(
+                fields=['fecha_vencimiento'], condition=models.Q(activa=True),
+                name='suscripcion_activa_vence',
+            ),
+            # Historial de planes y la activa más reciente del usuario, ya ordenados
+            models.Index(fields=['user', '-fecha_inicio'], name='suscripcion_user_inicio'),
+            models.Index(
+                fields=['user', '-fecha_vencimiento'], condition=models.Q(activa=True),
+                name='suscripcion_user_activa',
+            ),
+        ]
 
     def __str__(self):
         return f"{self.user.username} - {self.plan.nombre} ({'Activa' if self.activa else 'Inactiva'})"
 
     def save(self, *args, **kwargs):
-        if not self.pk:
+        nueva = not self.pk
+        if nueva:
             Suscripcion.objects.filter(user=self.user, activa=True).update(activa=False)
             self.fecha_vencimiento = timezone.now() + relativedelta(months=self.plan.duracion_meses)
         super().save(*args, **kwargs)
+        if nueva:
+            Profile.objects.filter(user_id=self.user_id).update(suscripcion_actual=self)
 
 
 # --- Modelos de Carrito ---
@@ -98,6 +149,11 @@ class CarritoItem(models.Model):
     producto = models.ForeignKey(Producto, on_delete=models.CASCADE)
     cantidad = models.PositiveIntegerField(default=1)
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['carrito', 'producto'], name='unico_item_carrito_producto'),
+        ]
+
     @property
     def subtotal(self):
         return self.producto.precio * self.cantidad
@@ -105,6 +161,16 @@ class CarritoItem(models.Model):
     def __str__(self):
         return f"{self.producto.nombre} x {self.cantidad}"
     
+class CarritoInvitado(models.Model):
+    # Carrito de un visitante sin cuenta: una fila con {producto_id: cantidad}.
+    # El cliente guarda el id firmado (ver tienda/carrito.py); vence sin actividad.
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    items = models.JSONField(default=dict)
+    expira_en = models.DateTimeField(db_index=True)
+
+    def __str__(self):
+        return f"Carrito invitado {self.id}"
+
 class Pedido(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="pedidos")
     orden_compra = models.CharField(max_length=100, unique=True)
@@ -118,15 +184,54 @@ class Pedido(models.Model):
     )
     estado = models.CharField(max_length=20, choices=ESTADO_CHOICES, default='PAGADO')
 
+    class Meta:
+        indexes = [
+            # Mis pedidos, del más nuevo al más viejo
+            models.Index(fields=['user', '-creado_en'], name='pedido_user_reciente'),
+            # Boletas y reportes: solo pagados, por rango de fecha
+            models.Index(
+                fields=['creado_en', 'id'], condition=models.Q(estado='PAGADO'),
+                name='pedido_pagado_fecha',
+            ),
+        ]
+
     def __str__(self):
         return f"Pedido {self.id} de {self.user.username}"
 
+# --- Reservas temporales de stock (checkout en curso) ---
+# Stock disponible = stock - reservas vigentes. webpay_create las crea y
+# webpay_return las convierte en descuento real; las vencidas se ignoran y luego
+# se purgan con `liberar_reservas`.
+class ReservaStock(models.Model):
+    producto = models.ForeignKey(Producto, on_delete=models.CASCADE, related_name='reservas')
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='reservas_stock')
+    orden_compra = models.CharField(max_length=100)
+    cantidad = models.PositiveIntegerField()
+    creada_en = models.DateTimeField(auto_now_add=True)
+    expira_en = models.DateTimeField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['producto', 'expira_en']),
+            models.Index(fields=['orden_compra']),
+            models.Index(fields=['expira_en']),
+        ]
+
+    def __str__(self):
+        return f"Reserva {self.orden_compra}: {self.producto.nombre} x {self.cantidad}"
+
 class PedidoItem(models.Model):
     pedido = models.ForeignKey(Pedido, on_delete=models.CASCADE, related_name="items")
     producto = models.ForeignKey(Producto, on_delete=models.PROTECT) 
     cantidad = models.PositiveIntegerField(default=1)
     precio_al_momento_compra = models.IntegerField() 
 
+    class Meta:
+        indexes = [
+            # Ventas por producto: del producto se llega a sus pedidos sin leer los ítems
+            models.Index(fields=['producto', 'pedido'], name='pedidoitem_producto_pedido'),
+        ]
+
     def __str__(self):
         return f"{self.producto.nombre} x {self.cantidad}"
 
@@ -142,11 +247,15 @@ class Review(models.Model):
     class Meta:
         unique_together = ('producto', 'user')
         ordering = ['-creado_en']
+        indexes = [
+            # Reseñas públicas de un producto, ya ordenadas
+            models.Index(
+                fields=['producto', '-creado_en'], condition=models.Q(is_visible=True),
+                name='review_visible_reciente',
+            ),
+        ]
 
     def __str__(self):
-<<<<<<< HEAD
-<<<<<<< HEAD
-<<<<<<< HEAD
         return f'Review de {self.user.username} para {self.producto.nombre}'
 
 # --- Modelo de Blog/Noticias ---
@@ -171,24 +280,109 @@ class Notificacion(models.Model):
     mensaje = models.TextField()
     tipo = models.CharField(max_length=20, choices=TIPO_CHOICES, default='info')
     creado_en = models.DateTimeField(auto_now_add=True)
+    actualizado_en = models.DateTimeField(auto_now=True)
+    # Vacío = para todos; con usuario solo la ve él (avisos de su suscripción)
+    destinatario = models.ForeignKey(
+        User, null=True, blank=True, on_delete=models.CASCADE, related_name='notificaciones_personales',
+    )
 
     leido_por = models.ManyToManyField(User, related_name='notificaciones_leidas', blank=True)
 
     def __str__(self):
         return f"{self.titulo} ({self.tipo})"
 
-class ProductoImagen(models.Model):
-    producto = models.ForeignKey(Producto, on_delete=models.CASCADE, related_name='imagenes')
-    imagen = models.ImageField(upload_to='productos/galeria/')
+# --- Marca de lectura por usuario ---
+# Todo id <= ultima_leida_id cuenta como leído, así "marcar todas" y el contador de
+# no leídas no necesitan recorrer la tabla M2M completa.
+class EstadoNotificaciones(models.Model):
+    user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='estado_notificaciones')
+    ultima_leida_id = models.PositiveBigIntegerField(default=0)
 
     def __str__(self):
-        return f"Imagen de {self.producto.nombre}"
-=======
-        return f'Review de {self.user.username} para {self.producto.nombre}'
->>>>>>> parent of 281861c (se añadió el blog y sus respectivas funciones)
-=======
-        return f'Review de {self.user.username} para {self.producto.nombre}'
->>>>>>> parent of 281861c (se añadió el blog y sus respectivas funciones)
-=======
-        return f'Review de {self.user.username} para {self.producto.nombre}'
->>>>>>> parent of 281861c (se añadió el blog y sus respectivas funciones)
+        return f"{self.user.username} leyó hasta #{self.ultima_leida_id}"
+
+# --- Eventos del stream entre procesos ---
+# Cola corta de lo publicado al stream SSE para que llegue a los conectados en
+# otros workers y a lo que publica el cron (ver tienda/eventos.py). Se purga sola.
+class EventoNotificacion(models.Model):
+    evento = models.CharField(max_length=20)
+    data = models.JSONField(encoder=DjangoJSONEncoder)
+    event_id = models.BigIntegerField(null=True, blank=True)
+    # None = todos los conectados
+    user_ids = models.JSONField(null=True, blank=True)
+    origen = models.CharField(max_length=32)
+    creado_en = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    def __str__(self):
+        return f"{self.evento} #{self.id}"
+
+# --- Tickets del stream ---
+# De un solo uso y de vida corta (ver ticket_stream_notificaciones). En la BD y no
+# en la cache: con LocMemCache el ticket emitido por un worker no existiría en otro.
+class TicketStream(models.Model):
+    # sha256 del ticket: la tabla no guarda nada con qué conectarse
+    clave = models.CharField(max_length=64, unique=True)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='tickets_stream')
+    expira_en = models.DateTimeField(db_index=True)
+
+    def __str__(self):
+        return f"Ticket de {self.user_id} hasta {self.expira_en:%H:%M:%S}"
+
+# --- Clientes que acaban de escribir ---
+# Sus lecturas van a la primaria hasta `hasta` (ver tienda/routers.py). En la BD
+# para que la marca valga en todos los workers, no solo en el que atendió la escritura.
+class EscrituraReciente(models.Model):
+    # "u:<user_id>" o "i:<sha1 del carrito invitado>"
+    clave = models.CharField(max_length=64, unique=True)
+    hasta = models.DateTimeField(db_index=True)
+
+    def __str__(self):
+        return f"{self.clave} en primaria hasta {self.hasta:%H:%M:%S}"
+
+
+# --- Resúmenes diarios para reportes ---
+# Los reportes leen solo estas tablas (una fila por día, o por día y producto/plan),
+# así su costo depende del rango consultado y no del historial de pedidos. Las
+# mantiene webpay_return al confirmar pagos (tienda/reportes.py) y se reconstruyen
+# con `manage.py recalcular_reportes`.
+class ResumenVentasDiario(models.Model):
+    fecha = models.DateField(unique=True)
+    pedidos = models.PositiveIntegerField(default=0)
+    unidades = models.PositiveIntegerField(default=0)
+    ingresos_pedidos = models.BigIntegerField(default=0)
+    suscripciones_nuevas = models.PositiveIntegerField(default=0)
+    suscripciones_renovadas = models.PositiveIntegerField(default=0)
+    ingresos_suscripciones = models.BigIntegerField(default=0)
+    pagos_fallidos = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f"Ventas del {self.fecha}"
+
+class ResumenProductoDiario(models.Model):
+    fecha = models.DateField()
+    producto = models.ForeignKey(Producto, on_delete=models.CASCADE, related_name='resumenes_diarios')
+    unidades = models.PositiveIntegerField(default=0)
+    ingresos = models.BigIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['fecha', 'producto'], name='unico_resumen_producto_fecha'),
+        ]
+
+    def __str__(self):
+        return f"{self.producto.nombre} el {self.fecha}: {self.unidades}"
+
+class ResumenPlanDiario(models.Model):
+    fecha = models.DateField()
+    plan = models.ForeignKey(Plan, on_delete=models.CASCADE, related_name='resumenes_diarios')
+    nuevas = models.PositiveIntegerField(default=0)
+    renovadas = models.PositiveIntegerField(default=0)
+    ingresos = models.BigIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['fecha', 'plan'], name='unico_resumen_plan_fecha'),
+        ]
+
+    def __str__(self):
+        return f"{self.plan.nombre} el {self.fecha}"
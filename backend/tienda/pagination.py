@@ -0,0 +1,29 @@
+from rest_framework.pagination import CursorPagination
+
+
+# --- PAGINACIÓN DEL CATÁLOGO ---
+class ProductoCursorPagination(CursorPagination):
+    """
+    Paginación por cursor (keyset) sobre (creado_en, id): cada página es una
+    consulta indexada con LIMIT, sin OFFSET que crezca con el catálogo.
+    """
+    ordering = ('-creado_en', '-id')
+    page_size = 24
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+
+    def get_ordering(self, request, queryset, view):
+        ordering = super().get_ordering(request, queryset, view)
+        # Desempate por id en el mismo sentido para que el orden sea estable
+        if not any(campo.lstrip('-') in ('id', 'pk') for campo in ordering):
+            ordering = ordering + ('-id' if ordering[0].startswith('-') else 'id',)
+        return ordering
+
+
+# --- PAGINACIÓN DE LA ADMINISTRACIÓN DE USUARIOS ---
+class UsuarioCursorPagination(CursorPagination):
+    """Mismo esquema keyset sobre el id del perfil (orden de registro)."""
+    ordering = ('id',)
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 200
@@ -0,0 +1,144 @@
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import Case, Count, Exists, F, IntegerField, OuterRef, Sum, When
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import (
+    Pedido, PedidoItem, ResumenPlanDiario, ResumenProductoDiario, ResumenVentasDiario,
+    Suscripcion,
+)
+
+
+# --- MANTENCIÓN INCREMENTAL DE LOS RESÚMENES DIARIOS ---
+# Cada pago confirmado suma sobre la fila de su día con UPDATE ... F(): dos pagos
+# simultáneos nunca se pisan. La fila se crea en cero con ignore_conflicts, así no
+# hace falta leerla antes (ni reintentar si otro la creó primero).
+
+CAMPOS_VENTAS = (
+    'pedidos', 'unidades', 'ingresos_pedidos',
+    'suscripciones_nuevas', 'suscripciones_renovadas', 'ingresos_suscripciones',
+)
+
+
+def _sumar(modelo, claves, **incrementos):
+    modelo.objects.bulk_create([modelo(**claves)], ignore_conflicts=True)
+    modelo.objects.filter(**claves).update(**{
+        campo: F(campo) + valor for campo, valor in incrementos.items()
+    })
+
+def registrar_pedido(pedido, cantidades, precios):
+    """`cantidades` y `precios` son {producto_id: valor} del pedido recién pagado."""
+    fecha = timezone.localdate(pedido.creado_en)
+    _sumar(
+        ResumenVentasDiario, {'fecha': fecha},
+        pedidos=1, unidades=sum(cantidades.values()), ingresos_pedidos=pedido.monto_total,
+    )
+    ResumenProductoDiario.objects.bulk_create(
+        [ResumenProductoDiario(fecha=fecha, producto_id=producto_id) for producto_id in cantidades],
+        ignore_conflicts=True,
+    )
+    ResumenProductoDiario.objects.filter(fecha=fecha, producto_id__in=cantidades).update(
+        unidades=Case(
+            *[When(producto_id=pid, then=F('unidades') + cant) for pid, cant in cantidades.items()],
+            default=F('unidades'), output_field=IntegerField(),
+        ),
+        ingresos=Case(
+            *[When(producto_id=pid, then=F('ingresos') + cant * precios[pid]) for pid, cant in cantidades.items()],
+            default=F('ingresos'), output_field=IntegerField(),
+        ),
+    )
+
+def registrar_suscripcion(suscripcion, monto, renovada):
+    fecha = timezone.localdate(suscripcion.fecha_inicio)
+    tipo = 'renovadas' if renovada else 'nuevas'
+    _sumar(
+        ResumenVentasDiario, {'fecha': fecha},
+        **{f'suscripciones_{tipo}': 1, 'ingresos_suscripciones': monto},
+    )
+    _sumar(ResumenPlanDiario, {'fecha': fecha, 'plan_id': suscripcion.plan_id}, **{tipo: 1, 'ingresos': monto})
+
+def registrar_pago_fallido(momento=None):
+    _sumar(ResumenVentasDiario, {'fecha': timezone.localdate(momento)}, pagos_fallidos=1)
+
+
+# --- RECONSTRUCCIÓN (BACKFILL) ---
+
+def _en_rango(queryset, campo, desde, hasta):
+    if desde:
+        queryset = queryset.filter(**{f'{campo}__date__gte': desde})
+    if hasta:
+        queryset = queryset.filter(**{f'{campo}__date__lte': hasta})
+    return queryset
+
+def _fechas_en_rango(queryset, desde, hasta):
+    if desde:
+        queryset = queryset.filter(fecha__gte=desde)
+    if hasta:
+        queryset = queryset.filter(fecha__lte=hasta)
+    return queryset
+
+def reconstruir(desde=None, hasta=None):
+    """
+    Recalcula los resúmenes del rango (todo el historial si no se indica) desde
+    Pedido/PedidoItem/Suscripcion. Los pagos fallidos no quedan guardados en
+    otra parte, así que ese contador se conserva. El ingreso de suscripciones
+    se toma del precio actual del plan (Suscripcion no guarda el monto).
+    Devuelve la cantidad de días con movimiento.
+    """
+    pedidos = _en_rango(Pedido.objects.filter(estado='PAGADO'), 'creado_en', desde, hasta)
+    items = _en_rango(PedidoItem.objects.filter(pedido__estado='PAGADO'), 'pedido__creado_en', desde, hasta)
+    suscripciones = _en_rango(Suscripcion.objects.all(), 'fecha_inicio', desde, hasta)
+    anteriores = Suscripcion.objects.filter(user=OuterRef('user'), id__lt=OuterRef('id'))
+
+    ventas = defaultdict(lambda: dict.fromkeys(CAMPOS_VENTAS, 0))
+    for fila in (
+        pedidos.annotate(dia=TruncDate('creado_en')).values('dia')
+        .annotate(n=Count('id'), ingresos=Sum('monto_total'))
+    ):
+        ventas[fila['dia']].update(pedidos=fila['n'], ingresos_pedidos=fila['ingresos'])
+
+    productos = []
+    for fila in (
+        items.annotate(dia=TruncDate('pedido__creado_en')).values('dia', 'producto_id')
+        .annotate(unidades=Sum('cantidad'), ingresos=Sum(F('cantidad') * F('precio_al_momento_compra')))
+    ):
+        ventas[fila['dia']]['unidades'] += fila['unidades']
+        productos.append(ResumenProductoDiario(
+            fecha=fila['dia'], producto_id=fila['producto_id'],
+            unidades=fila['unidades'], ingresos=fila['ingresos'],
+        ))
+
+    planes = {}
+    for fila in (
+        suscripciones.annotate(dia=TruncDate('fecha_inicio'), renovada=Exists(anteriores))
+        .values('dia', 'plan_id', 'renovada')
+        .annotate(n=Count('id'), ingresos=Sum('plan__precio'))
+    ):
+        tipo = 'renovadas' if fila['renovada'] else 'nuevas'
+        resumen = planes.setdefault(
+            (fila['dia'], fila['plan_id']),
+            ResumenPlanDiario(fecha=fila['dia'], plan_id=fila['plan_id']),
+        )
+        setattr(resumen, tipo, fila['n'])
+        resumen.ingresos += int(fila['ingresos'])
+        ventas[fila['dia']][f'suscripciones_{tipo}'] += fila['n']
+        ventas[fila['dia']]['ingresos_suscripciones'] += int(fila['ingresos'])
+
+    with transaction.atomic():
+        _fechas_en_rango(ResumenProductoDiario.objects.all(), desde, hasta).delete()
+        _fechas_en_rango(ResumenPlanDiario.objects.all(), desde, hasta).delete()
+        ResumenProductoDiario.objects.bulk_create(productos, batch_size=500)
+        ResumenPlanDiario.objects.bulk_create(planes.values(), batch_size=500)
+
+        # Días que ya no tienen movimiento quedan en cero (salvo pagos_fallidos)
+        _fechas_en_rango(ResumenVentasDiario.objects.all(), desde, hasta).exclude(
+            fecha__in=list(ventas)
+        ).update(**dict.fromkeys(CAMPOS_VENTAS, 0))
+        ResumenVentasDiario.objects.bulk_create(
+            [ResumenVentasDiario(fecha=dia, **valores) for dia, valores in ventas.items()],
+            update_conflicts=True, unique_fields=['fecha'], update_fields=list(CAMPOS_VENTAS),
+            batch_size=500,
+        )
+    return len(ventas)
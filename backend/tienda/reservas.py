@@ -0,0 +1,92 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Sum
+from django.utils import timezone
+
+from .models import Producto, ReservaStock
+
+
+class StockInsuficiente(Exception):
+    pass
+
+
+# --- RESERVAS DE STOCK DURANTE EL CHECKOUT ---
+
+def reservas_vigentes(producto_ids, excluir_orden=None):
+    """{producto_id: unidades reservadas por checkouts aún no vencidos}."""
+    reservas = ReservaStock.objects.filter(producto_id__in=producto_ids, expira_en__gt=timezone.now())
+    if excluir_orden:
+        reservas = reservas.exclude(orden_compra=excluir_orden)
+    return dict(
+        reservas.values('producto_id').annotate(total=Sum('cantidad')).values_list('producto_id', 'total')
+    )
+
+def bloquear_productos(producto_ids):
+    """
+    Toma el lock de escritura de los productos en orden de id. El UPDATE sin
+    cambios bloquea las filas en PostgreSQL y el archivo en SQLite (donde
+    select_for_update no hace nada), así dos checkouts no leen las mismas reservas.
+    """
+    ids = sorted(producto_ids)
+    Producto.objects.filter(id__in=ids).update(stock=F('stock'))
+    return {p.id: p for p in Producto.objects.select_for_update().filter(id__in=ids).order_by('id')}
+
+def validar_disponibilidad(productos, cantidades, excluir_orden=None):
+    reservado = reservas_vigentes(cantidades.keys(), excluir_orden=excluir_orden)
+    for producto_id, cantidad in cantidades.items():
+        producto = productos.get(producto_id)
+        if producto is None:
+            raise StockInsuficiente(f"Producto {producto_id} no encontrado")
+        disponible = producto.stock - reservado.get(producto_id, 0)
+        if disponible < cantidad:
+            raise StockInsuficiente(
+                f"Stock insuficiente para {producto.nombre} (disponible: {max(disponible, 0)})"
+            )
+
+def cantidades_carrito(carrito):
+    """Unidades por producto (una línea por producto: restricción única)."""
+    return dict(carrito.items.values_list('producto_id', 'cantidad'))
+
+def reservar_carrito(user, carrito, orden_compra):
+    """
+    Reserva las cantidades del carrito por RESERVA_STOCK_MINUTOS. Reemplaza
+    cualquier reserva previa del usuario (un checkout a la vez).
+    """
+    cantidades = cantidades_carrito(carrito)
+    if not cantidades:
+        raise StockInsuficiente("El carrito está vacío")
+
+    with transaction.atomic():
+        productos = bloquear_productos(cantidades)
+        ReservaStock.objects.filter(user=user).delete()
+        validar_disponibilidad(productos, cantidades)
+
+        expira_en = timezone.now() + timedelta(minutes=settings.RESERVA_STOCK_MINUTOS)
+        ReservaStock.objects.bulk_create([
+            ReservaStock(
+                producto_id=producto_id, user=user, orden_compra=orden_compra,
+                cantidad=cantidad, expira_en=expira_en,
+            )
+            for producto_id, cantidad in cantidades.items()
+        ])
+    return expira_en
+
+def liberar_reservas(orden_compra):
+    return ReservaStock.objects.filter(orden_compra=orden_compra).delete()[0]
+
+async def aliberar_reservas(orden_compra):
+    return (await ReservaStock.objects.filter(orden_compra=orden_compra).adelete())[0]
+
+def purgar_reservas_vencidas(lote=1000):
+    """Borra reservas vencidas en lotes para no mantener un lock largo sobre la tabla."""
+    total = 0
+    while True:
+        ids = list(
+            ReservaStock.objects.filter(expira_en__lte=timezone.now())
+            .order_by('id').values_list('id', flat=True)[:lote]
+        )
+        if not ids:
+            return total
+        total += ReservaStock.objects.filter(id__in=ids).delete()[0]
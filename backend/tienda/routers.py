@@ -0,0 +1,197 @@
+import hashlib
+import time
+from contextvars import ContextVar
+from datetime import timedelta
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.utils import timezone
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import AccessToken
+
+
+# --- RÉPLICA DE LECTURA ---
+# Con un alias 'replica' en DATABASES, las peticiones GET/HEAD/OPTIONS (list y
+# retrieve de los viewsets, vistas de función GET) leen de la réplica. Escribir
+# siempre va a la primaria, y una petición vuelve a la primaria en cuanto escribe,
+# abre una transacción o viene de un cliente que escribió hace menos de
+# DB_REPLICA_PEGADO segundos: así cada usuario ve lo que acaba de cambiar (su
+# carrito, su pedido recién pagado) aunque la réplica vaya atrasada. La marca de
+# escritura vive en la primaria (EscrituraReciente), por usuario del JWT o por
+# carrito invitado: la siguiente petición puede caer en otro worker.
+# Fuera de una petición (comandos, hilos de imágenes o boletas) todo va a la primaria.
+
+REPLICA = 'replica'
+METODOS_LECTURA = ('GET', 'HEAD', 'OPTIONS')
+
+_peticion = ContextVar('tienda_peticion', default=None)
+
+
+def hay_replica():
+    return REPLICA in settings.DATABASES
+
+def clave_usuario(user_id):
+    return f"u:{user_id}"
+
+def clave_cliente(request):
+    """Usuario del JWT (sin ir a la BD) o carrito invitado; None si es anónimo."""
+    auth = request.headers.get('Authorization', '')
+    if auth.startswith('Bearer '):
+        try:
+            return clave_usuario(AccessToken(auth.removeprefix('Bearer ').strip())[api_settings.USER_ID_CLAIM])
+        except (TokenError, KeyError):
+            return None
+    invitado = request.headers.get('X-Carrito-Invitado')
+    if invitado:
+        return "i:" + hashlib.sha1(invitado.encode('utf-8')).hexdigest()
+    return None
+
+_purgado = 0
+
+def marcar_escritura(clave):
+    """Sus lecturas van a la primaria durante DB_REPLICA_PEGADO segundos."""
+    global _purgado
+    if not clave or not hay_replica():
+        return
+    from .models import EscrituraReciente
+    ahora = timezone.now()
+    # Una fila por cliente, actualizada en el mismo INSERT (upsert)
+    EscrituraReciente.objects.bulk_create(
+        [EscrituraReciente(clave=clave, hasta=ahora + timedelta(seconds=settings.DB_REPLICA_PEGADO))],
+        update_conflicts=True, unique_fields=['clave'], update_fields=['hasta'],
+    )
+    if time.monotonic() - _purgado > 60:
+        EscrituraReciente.objects.filter(hasta__lte=ahora).delete()
+        _purgado = time.monotonic()
+
+def _escribio_hace_poco(clave):
+    from .models import EscrituraReciente
+    # using(): la marca se lee siempre de la primaria, sin volver a pasar por el router
+    marcas = EscrituraReciente.objects.using(DEFAULT_DB_ALIAS)
+    return marcas.filter(clave=clave, hasta__gt=timezone.now()).exists()
+
+
+class _Peticion:
+    def __init__(self, request):
+        self.request = request
+        self.lectura = request.method in METODOS_LECTURA
+        self.primaria = False
+        self.escribio = False
+        self._clave = self._pegado = None
+
+    @property
+    def clave(self):
+        if self._clave is None:
+            self._clave = clave_cliente(self.request) or ''
+        return self._clave
+
+    def usa_replica(self):
+        if not self.lectura or self.primaria or self.escribio:
+            return False
+        # Dentro de una transacción se lee lo que ella misma escribió
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return False
+        if self._pegado is None:
+            self._pegado = bool(self.clave) and _escribio_hace_poco(self.clave)
+        return not self._pegado
+
+
+class RouterReplica:
+    def db_for_read(self, model, **hints):
+        peticion = _peticion.get()
+        if peticion is not None and peticion.usa_replica():
+            return REPLICA
+        return DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        # Explícito: un objeto leído de la réplica se guarda igual en la primaria
+        peticion = _peticion.get()
+        if peticion is not None:
+            peticion.escribio = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db != REPLICA
+
+
+def _iterar_en(peticion, contenido):
+    # Las exportaciones leen mientras se envía la respuesta, ya fuera del middleware
+    anterior = _peticion.get()
+    _peticion.set(peticion)
+    try:
+        yield from contenido
+    finally:
+        _peticion.set(anterior)
+
+class LecturaReplicaMiddleware:
+    # Async bajo ASGI: un middleware solo síncrono obligaría a correr cada vista
+    # async dentro de un hilo. Las consultas que hace la vista en sus hilos
+    # (sync_to_async) heredan el contextvar y con él la petición.
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        if not hay_replica():
+            return self.get_response(request)
+        peticion = _Peticion(request)
+        token = _peticion.set(peticion)
+        try:
+            response = self.get_response(request)
+        finally:
+            _peticion.reset(token)
+        if peticion.escribio:
+            marcar_escritura(peticion.clave)
+        return self._terminar(peticion, response)
+
+    async def __acall__(self, request):
+        if not hay_replica():
+            return await self.get_response(request)
+        peticion = _Peticion(request)
+        token = _peticion.set(peticion)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _peticion.reset(token)
+        if peticion.escribio:
+            await sync_to_async(marcar_escritura)(peticion.clave)
+        return self._terminar(peticion, response)
+
+    def _terminar(self, peticion, response):
+        if not peticion.escribio and peticion.lectura and response.streaming and not response.is_async:
+            response.streaming_content = _iterar_en(peticion, response.streaming_content)
+        return response
+
+
+def en_primaria(vista):
+    """Para vistas que deciden en base a lo que leen (p. ej. no procesar dos veces un pago)."""
+    def marcar():
+        peticion = _peticion.get()
+        if peticion is not None:
+            peticion.primaria = True
+
+    if iscoroutinefunction(vista):
+        @wraps(vista)
+        async def aenvuelta(request, *args, **kwargs):
+            marcar()
+            return await vista(request, *args, **kwargs)
+        return aenvuelta
+
+    @wraps(vista)
+    def envuelta(request, *args, **kwargs):
+        marcar()
+        return vista(request, *args, **kwargs)
+    return envuelta
@@ -1,23 +1,12 @@
 from rest_framework import serializers
-from django.db.models import Avg, Sum
 from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
 from django.contrib.auth.models import User
+from django.utils import timezone
 from .models import (
     Profile, Producto, Plan, Suscripcion, Carrito, CarritoItem, 
-<<<<<<< HEAD
-<<<<<<< HEAD
-<<<<<<< HEAD
     Pedido, PedidoItem, Review, Noticia, Notificacion, ProductoImagen # <-- CONSOLIDADO
-=======
-    Pedido, PedidoItem
->>>>>>> parent of 281861c (se añadió el blog y sus respectivas funciones)
-=======
-    Pedido, PedidoItem
->>>>>>> parent of 281861c (se añadió el blog y sus respectivas funciones)
-=======
-    Pedido, PedidoItem
->>>>>>> parent of 281861c (se añadió el blog y sus respectivas funciones)
 )
+from .imagenes import urls_variantes
 
 # --- Serializador para Token JWT (con roles) ---
 class MyTokenObtainPairSerializer(TokenObtainPairSerializer):
@@ -28,13 +17,21 @@ class MyTokenObtainPairSerializer(TokenObtainPairSerializer):
         token['is_superuser'] = user.is_superuser
         token['is_staff'] = user.is_staff
         token['user_id'] = user.id
-        profile = getattr(user, 'profile', None)
+        # Perfil y plan vigente en una sola consulta (puntero mantenido por el cron de vencimiento)
+        profile = Profile.objects.select_related('suscripcion_actual__plan').filter(user=user).first()
         if user.is_superuser:
             token['role'] = 'admin'
         elif profile and getattr(profile, 'role', None):
             token['role'] = profile.role
         else:
             token['role'] = 'cliente'
+        suscripcion = profile.suscripcion_actual if profile else None
+        if suscripcion and suscripcion.activa and suscripcion.fecha_vencimiento > timezone.now():
+            token['plan'] = suscripcion.plan.nombre
+            token['plan_id'] = suscripcion.plan_id
+            token['plan_vence'] = int(suscripcion.fecha_vencimiento.timestamp())
+        else:
+            token['plan'] = token['plan_id'] = token['plan_vence'] = None
         return token
 
 # --- Serializador para Registro de Usuarios ---
@@ -72,11 +69,14 @@ class ProfileSerializer(serializers.ModelSerializer):
     id = serializers.IntegerField(source='user.id', read_only=True)
     username = serializers.CharField(source='user.username', read_only=True)
     email = serializers.EmailField(source='user.email')
+    avatar_variantes = serializers.SerializerMethodField()
     class Meta:
         model = Profile
-        fields = ['id', 'username', 'email', 'avatar', 'nombre', 'apellidos', 
+        fields = ['id', 'username', 'email', 'avatar', 'avatar_variantes', 'nombre', 'apellidos', 
                   'rut', 'numero_personal', 'numero_emergencia', 'role']
         read_only_fields = ['rut', 'username']
+    def get_avatar_variantes(self, obj):
+        return urls_variantes(obj.avatar, obj.avatar_variantes, self.context.get('request'))
     def update(self, instance, validated_data):
         user_data = validated_data.pop('user', {})
         email = user_data.get('email')
@@ -101,29 +101,56 @@ class ProfileSerializer(serializers.ModelSerializer):
         user.save()
         return instance
 
+class ProfileAdminSerializer(ProfileSerializer):
+    # El queryset trae el usuario con select_related: no hay consulta por fila
+    activo = serializers.BooleanField(source='user.is_active', read_only=True)
+    class Meta(ProfileSerializer.Meta):
+        fields = ProfileSerializer.Meta.fields + ['activo']
+
 class ProductoImagenSerializer(serializers.ModelSerializer):
+    imagen_variantes = serializers.SerializerMethodField()
+
     class Meta:
         model = ProductoImagen
-        fields = ['id', 'imagen']
+        fields = ['id', 'imagen', 'imagen_variantes']
+
+    def get_imagen_variantes(self, obj):
+        return urls_variantes(obj.imagen, obj.imagen_variantes, self.context.get('request'))
 
 class ProductoSerializer(serializers.ModelSerializer):
-    rating_promedio = serializers.SerializerMethodField()
-    total_vendidos = serializers.SerializerMethodField()
+    # Agregados desnormalizados en Producto: no generan consultas por fila
+    rating_promedio = serializers.FloatField(read_only=True)
     
     # Incluimos las imágenes extra (read_only porque la subida la manejamos manual en la vista)
     imagenes = ProductoImagenSerializer(many=True, read_only=True)
 
+    # WebP redimensionados [{ancho, url}] para srcset; vacío hasta que el worker los genere
+    imagen_variantes = serializers.SerializerMethodField()
+
     class Meta:
         model = Producto
         fields = '__all__'
-
-    def get_rating_promedio(self, obj):
-        promedio = obj.reviews.aggregate(Avg('rating'))['rating__avg']
-        return round(promedio, 1) if promedio else 0
-
-    def get_total_vendidos(self, obj):
-        total = obj.pedidoitem_set.filter(pedido__estado='PAGADO').aggregate(Sum('cantidad'))['cantidad__sum']
-        return total if total else 0
+        read_only_fields = ['total_reviews', 'suma_ratings', 'total_vendidos']
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Sparse fieldsets: ?fields=id,nombre,precio,imagen limita la respuesta (solo en lecturas)
+        campos = self.campos_solicitados(self.context.get('request'))
+        if campos is not None:
+            for nombre in set(self.fields) - campos:
+                self.fields.pop(nombre)
+
+    @staticmethod
+    def campos_solicitados(request):
+        if request is None or request.method != 'GET':
+            return None
+        campos = request.query_params.get('fields')
+        if not campos:
+            return None
+        return {campo.strip() for campo in campos.split(',') if campo.strip()}
+
+    def get_imagen_variantes(self, obj):
+        return urls_variantes(obj.imagen, obj.imagen_variantes, self.context.get('request'))
 
 class PlanSerializer(serializers.ModelSerializer):
     class Meta:
@@ -142,6 +169,7 @@ class CarritoItemSerializer(serializers.ModelSerializer):
     nombre_producto = serializers.CharField(source='producto.nombre', read_only=True)
     precio_producto = serializers.IntegerField(source='producto.precio', read_only=True)
     imagen_producto = serializers.ImageField(source='producto.imagen', read_only=True)
+    imagen_producto_variantes = serializers.SerializerMethodField()
     
 
     # Este es el campo que causaba el error si no estaba en 'fields'
@@ -159,7 +187,11 @@ class CarritoItemSerializer(serializers.ModelSerializer):
 
         # AÑADIDO 'stock_producto' AQUÍ ABAJO:
 
-        fields = ['id', 'producto', 'nombre_producto', 'precio_producto', 'imagen_producto', 'stock_producto', 'cantidad', 'subtotal']
+        fields = ['id', 'producto', 'nombre_producto', 'precio_producto', 'imagen_producto',
+                  'imagen_producto_variantes', 'stock_producto', 'cantidad', 'subtotal']
+
+    def get_imagen_producto_variantes(self, obj):
+        return urls_variantes(obj.producto.imagen, obj.producto.imagen_variantes, self.context.get('request'))
 
 class CarritoSerializer(serializers.ModelSerializer):
     items = CarritoItemSerializer(many=True, read_only=True)
@@ -170,6 +202,9 @@ class CarritoSerializer(serializers.ModelSerializer):
         fields = ['id', 'user', 'items', 'total']
 
     def get_total(self, obj):
+        # carrito_con_items lo anota con un SUM en la misma consulta del carrito
+        if hasattr(obj, 'total'):
+            return obj.total
         return sum(item.subtotal for item in obj.items.all())
 
 
@@ -204,9 +239,6 @@ class ReviewSerializer(serializers.ModelSerializer):
             'rating', 'comentario', 'creado_en', 
             'is_visible' 
         ]
-<<<<<<< HEAD
-<<<<<<< HEAD
-<<<<<<< HEAD
         read_only_fields = ('user', 'producto')
 
 
@@ -226,16 +258,10 @@ class NotificacionSerializer(serializers.ModelSerializer):
         fields = ['id', 'titulo', 'mensaje', 'tipo', 'creado_en', 'leida']
 
     def get_leida(self, obj):
+        # La vista la anota en la misma consulta (marca del usuario + Exists sobre leido_por)
+        if hasattr(obj, 'leida'):
+            return obj.leida
         request = self.context.get('request')
         if request and request.user and request.user.is_authenticated:
             return obj.leido_por.filter(id=request.user.id).exists()
         return False
-=======
-        read_only_fields = ('user', 'producto')
->>>>>>> parent of 281861c (se añadió el blog y sus respectivas funciones)
-=======
-        read_only_fields = ('user', 'producto')
->>>>>>> parent of 281861c (se añadió el blog y sus respectivas funciones)
-=======
-        read_only_fields = ('user', 'producto')
->>>>>>> parent of 281861c (se añadió el blog y sus respectivas funciones)
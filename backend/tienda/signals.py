@@ -0,0 +1,114 @@
+from django.db import transaction
+from django.db.models import F
+from django.db.models.signals import pre_save, post_save, post_delete, m2m_changed
+from django.dispatch import receiver
+
+from .models import Producto, ProductoImagen, Profile, Review, PedidoItem, Plan, Noticia, Notificacion
+from .cache import incrementar_version
+from .eventos import publicar
+from .imagenes import encolar_variantes
+from .serializers import NotificacionSerializer
+
+
+# --- AGREGADOS DE PRODUCTO (reseñas y ventas) ---
+# Se actualizan con UPDATE ... SET campo = campo + n para no leer el producto
+# ni pisar cambios concurrentes. `recalcular_agregados` los reconstruye desde cero.
+
+@receiver(pre_save, sender=Review)
+def guardar_rating_anterior(sender, instance, **kwargs):
+    instance._rating_anterior = None
+    if instance.pk:
+        instance._rating_anterior = (
+            Review.objects.filter(pk=instance.pk).values_list('rating', flat=True).first()
+        )
+
+@receiver(post_save, sender=Review)
+def actualizar_agregados_review(sender, instance, created, **kwargs):
+    if created:
+        Producto.objects.filter(pk=instance.producto_id).update(
+            total_reviews=F('total_reviews') + 1,
+            suma_ratings=F('suma_ratings') + instance.rating,
+        )
+        return
+
+    rating_anterior = getattr(instance, '_rating_anterior', None)
+    if rating_anterior is not None and rating_anterior != instance.rating:
+        Producto.objects.filter(pk=instance.producto_id).update(
+            suma_ratings=F('suma_ratings') + (instance.rating - rating_anterior),
+        )
+
+@receiver(post_delete, sender=Review)
+def descontar_agregados_review(sender, instance, **kwargs):
+    Producto.objects.filter(pk=instance.producto_id).update(
+        total_reviews=F('total_reviews') - 1,
+        suma_ratings=F('suma_ratings') - instance.rating,
+    )
+
+@receiver(post_save, sender=PedidoItem)
+def actualizar_total_vendidos(sender, instance, created, **kwargs):
+    if created and instance.pedido.estado == 'PAGADO':
+        Producto.objects.filter(pk=instance.producto_id).update(
+            total_vendidos=F('total_vendidos') + instance.cantidad,
+        )
+
+
+# --- INVALIDACIÓN DE LA CACHE DE LECTURAS ---
+# Review y PedidoItem cambian los agregados del catálogo vía UPDATE (sin señales de
+# Producto), por eso también versionan.
+MODELOS_CACHEADOS = (Producto, ProductoImagen, Review, PedidoItem, Plan, Noticia)
+
+def invalidar_cache_modelo(sender, **kwargs):
+    incrementar_version(sender)
+
+for modelo in MODELOS_CACHEADOS:
+    post_save.connect(invalidar_cache_modelo, sender=modelo, dispatch_uid=f'cache_{modelo.__name__}_save')
+    post_delete.connect(invalidar_cache_modelo, sender=modelo, dispatch_uid=f'cache_{modelo.__name__}_delete')
+
+
+# --- VARIANTES DE IMÁGENES ---
+# Cualquier guardado con una imagen nueva (vistas, admin, shell) encola sus variantes;
+# si la imagen no cambió encolar_variantes no hace nada.
+CAMPOS_IMAGEN = {Producto: 'imagen', ProductoImagen: 'imagen', Profile: 'avatar'}
+
+def generar_variantes_imagen(sender, instance, **kwargs):
+    encolar_variantes(instance, CAMPOS_IMAGEN[sender])
+
+for modelo in CAMPOS_IMAGEN:
+    post_save.connect(generar_variantes_imagen, sender=modelo, dispatch_uid=f'variantes_{modelo.__name__}')
+
+
+# --- STREAM DE NOTIFICACIONES (SSE) ---
+# Se publica al confirmar la transacción para no anunciar filas que luego se revierten.
+
+def _destinatarios(notificacion):
+    # None = todos los conectados; las personales solo a su dueño
+    return {notificacion.destinatario_id} if notificacion.destinatario_id else None
+
+@receiver(post_save, sender=Notificacion)
+def publicar_notificacion(sender, instance, created, **kwargs):
+    data = NotificacionSerializer(instance).data
+    evento = 'notificacion' if created else 'actualizada'
+    event_id = instance.id if created else None
+    user_ids = _destinatarios(instance)
+    transaction.on_commit(
+        lambda: publicar(evento, data, event_id=event_id, user_ids=user_ids)
+    )
+
+@receiver(post_delete, sender=Notificacion)
+def publicar_notificacion_eliminada(sender, instance, **kwargs):
+    data = {'id': instance.id}
+    user_ids = _destinatarios(instance)
+    transaction.on_commit(lambda: publicar('eliminada', data, user_ids=user_ids))
+
+@receiver(m2m_changed, sender=Notificacion.leido_por.through)
+def publicar_lectura(sender, instance, action, reverse, pk_set, **kwargs):
+    if action != 'post_add' or not pk_set:
+        return
+    if reverse:
+        # user.notificaciones_leidas.add(...): instance es el User
+        user_ids, ids = {instance.id}, sorted(pk_set)
+    else:
+        user_ids, ids = set(pk_set), [instance.id]
+    transaction.on_commit(
+        lambda: publicar('leida', {'ids': ids}, user_ids=user_ids)
+    )
@@ -0,0 +1,94 @@
+from datetime import timedelta
+from itertools import islice
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .eventos import publicar_varios
+from .models import Notificacion, Profile, Suscripcion
+from .serializers import NotificacionSerializer
+
+
+# --- CICLO DE VIDA DE SUSCRIPCIONES ---
+# Vencer una suscripción no depende de que el usuario entre a la web: un cron
+# (`vencer_suscripciones`) pasa a inactivas todas las vencidas con un solo UPDATE
+# sobre el índice parcial de activas por fecha de vencimiento, limpia el puntero
+# Profile.suscripcion_actual y deja los avisos con bulk_create. Así MiPlanView y
+# el JWT leen el plan del perfil sin filtrar suscripciones en cada petición.
+# bulk_create no dispara post_save, así que los avisos se publican al stream a
+# mano al confirmar; el cron corre en otro proceso y llegan por EventoNotificacion.
+
+LOTE = 5000
+
+
+def _trozos(filas, tamano):
+    while trozo := list(islice(filas, tamano)):
+        yield trozo
+
+def _crear_avisos(notificaciones):
+    creadas = Notificacion.objects.bulk_create(notificaciones)
+    eventos = [
+        ('notificacion', NotificacionSerializer(n).data, n.id, {n.destinatario_id})
+        for n in creadas
+    ]
+    transaction.on_commit(lambda: publicar_varios(eventos))
+
+def vencidas(ahora=None):
+    return Suscripcion.objects.filter(activa=True, fecha_vencimiento__lte=ahora or timezone.now())
+
+def por_vencer(ahora=None, dias=None):
+    ahora = ahora or timezone.now()
+    dias = settings.SUSCRIPCION_AVISO_DIAS if dias is None else dias
+    return Suscripcion.objects.filter(
+        activa=True, aviso_enviado=False,
+        fecha_vencimiento__gt=ahora, fecha_vencimiento__lte=ahora + timedelta(days=dias),
+    )
+
+
+def vencer_suscripciones(ahora=None, lote=LOTE):
+    """
+    Desactiva las suscripciones vencidas y avisa a sus dueños. Todo en una
+    transacción: si algo falla no quedan avisos sin vencimiento ni al revés.
+    Devuelve cuántas se vencieron.
+    """
+    ahora = ahora or timezone.now()
+    pendientes = vencidas(ahora)
+    with transaction.atomic():
+        # Escritura primero: toma el lock de escritura (SQLite) antes de leer
+        Profile.objects.filter(suscripcion_actual__in=pendientes.values('id')).update(suscripcion_actual=None)
+        filas = pendientes.order_by().values_list('user_id', 'plan__nombre').iterator(chunk_size=lote)
+        for trozo in _trozos(filas, lote):
+            _crear_avisos([
+                Notificacion(
+                    destinatario_id=user_id, tipo='alerta', titulo="Tu plan venció",
+                    mensaje=f"Tu plan {plan} venció. Renuévalo para seguir disfrutando de sus beneficios.",
+                )
+                for user_id, plan in trozo
+            ])
+        return pendientes.update(activa=False)
+
+
+def avisar_por_vencer(ahora=None, dias=None, lote=LOTE):
+    """Avisa una sola vez a quienes vencen dentro de `dias`. Devuelve cuántos avisos dejó."""
+    total = 0
+    filas = por_vencer(ahora, dias).order_by('id').values_list('id', 'user_id', 'plan__nombre', 'fecha_vencimiento')
+    # Cada lote marca sus filas, así que la siguiente lectura ya no las trae
+    while trozo := list(filas[:lote]):
+        with transaction.atomic():
+            marcadas = Suscripcion.objects.filter(
+                id__in=[fila[0] for fila in trozo], aviso_enviado=False,
+            ).update(aviso_enviado=True)
+            if marcadas != len(trozo):
+                # Otra ejecución tomó parte del lote: se reintenta con lo que quede
+                transaction.set_rollback(True)
+                continue
+            _crear_avisos([
+                Notificacion(
+                    destinatario_id=user_id, tipo='info', titulo="Tu plan está por vencer",
+                    mensaje=f"Tu plan {plan} vence el {timezone.localtime(vence):%d-%m-%Y}. Renuévalo para no perder sus beneficios.",
+                )
+                for _, user_id, plan, vence in trozo
+            ])
+        total += len(trozo)
+    return total
@@ -1,3 +1,821 @@
-from django.test import TestCase
+import asyncio
+import csv
+import io
+import json
+import os
+import shutil
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import skipUnless
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import connection, connections
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework_simplejwt.tokens import AccessToken
+
+from backend.asgi import application as asgi_application
+
+from .boletas import zip_boletas
+from .cache import get_cache
+from .carrito import fijar_cantidad, sumar_al_carrito
+from .eventos import Receptor, fanout_notificaciones, origen_proceso, publicar, receptor_notificaciones
+from .management.commands.benchmark_sse import ConexionAsgi, scope_stream
+from .management.commands.verificar_indices import Command as VerificarIndices
+from .models import (
+    Carrito, CarritoItem, EscrituraReciente, EventoNotificacion, Notificacion, Pedido, PedidoItem, Plan, Producto,
+    ProductoImagen, Profile, ReservaStock, ResumenVentasDiario, Suscripcion, TicketStream,
+)
+from .reservas import StockInsuficiente, purgar_reservas_vencidas, reservar_carrito
+from .routers import REPLICA, clave_usuario
+from .suscripciones import avisar_por_vencer, vencer_suscripciones
+from .transbank import breaker_transbank
+from .views_webpay import _finalizar_pedido_carrito
+
+
+# --- CATÁLOGO: CONSULTAS CONSTANTES ---
+# list y retrieve de productos cuestan 2 consultas (productos + galería) sin
+# importar el tamaño del catálogo: los agregados están desnormalizados en Producto.
+
+class CatalogoConsultasTests(TestCase):
+    TAMANOS = (1, 100, 10_000)
+
+    def setUp(self):
+        get_cache().clear()
+
+    def crear_catalogo(self, cantidad):
+        productos = Producto.objects.bulk_create(
+            Producto(nombre=f'Producto {n}', precio=1000 + n, stock=10) for n in range(cantidad)
+        )
+        ProductoImagen.objects.bulk_create(
+            ProductoImagen(producto=producto, imagen=f'productos/galeria/{producto.id}-{n}.jpg')
+            for producto in productos[:100] for n in range(2)
+        )
+        return productos
+
+    def test_list_consultas_constantes(self):
+        for cantidad in self.TAMANOS:
+            with self.subTest(productos=cantidad):
+                Producto.objects.all().delete()
+                self.crear_catalogo(cantidad)
+                get_cache().clear()
+                with self.assertNumQueries(2):
+                    respuesta = self.client.get(reverse('producto-list'))
+                self.assertEqual(respuesta.status_code, 200)
+                self.assertEqual(len(respuesta.json()['results']), min(cantidad, 24))
+
+    def test_retrieve_consultas_constantes(self):
+        for cantidad in self.TAMANOS:
+            with self.subTest(productos=cantidad):
+                Producto.objects.all().delete()
+                producto = self.crear_catalogo(cantidad)[0]
+                get_cache().clear()
+                with self.assertNumQueries(2):
+                    respuesta = self.client.get(reverse('producto-detail', args=[producto.id]))
+                self.assertEqual(respuesta.status_code, 200)
+                self.assertEqual(len(respuesta.json()['imagenes']), 2)
+
+    def test_respuesta_cacheada_sin_consultas(self):
+        self.crear_catalogo(100)
+        self.client.get(reverse('producto-list'))
+        with self.assertNumQueries(0):
+            respuesta = self.client.get(reverse('producto-list'))
+        self.assertEqual(respuesta.status_code, 200)
+
+
+# --- ADMINISTRACIÓN DE USUARIOS: CONSULTAS CONSTANTES ---
+# Cada página del listado cuesta el usuario del JWT + los perfiles con su user,
+# también al buscar o filtrar por rol.
+
+class UsuariosConsultasTests(TestCase):
+    TAMANOS = (1, 5_000)
+
+    def setUp(self):
+        admin = User.objects.create(username='admin', password='!', is_staff=True)
+        Profile.objects.create(user=admin, rut='1-9', role='admin')
+        self.headers = {'Authorization': f'Bearer {AccessToken.for_user(admin)}'}
+
+    def crear_usuarios(self, cantidad):
+        Profile.objects.exclude(role='admin').delete()
+        User.objects.exclude(username='admin').delete()
+        users = User.objects.bulk_create(
+            User(username=f'usuario{n}', email=f'usuario{n}@correo.cl', password='!') for n in range(cantidad)
+        )
+        Profile.objects.bulk_create(
+            Profile(user=user, rut=f'{n + 2}-{n % 10}', role='contadora' if n % 10 == 0 else 'cliente')
+            for n, user in enumerate(users)
+        )
+
+    def listar(self, consultas, **params):
+        with self.assertNumQueries(consultas):
+            respuesta = self.client.get(reverse('profile-list'), params, headers=self.headers)
+        self.assertEqual(respuesta.status_code, 200)
+        return respuesta.json()
+
+    def test_listado_paginado(self):
+        for cantidad in self.TAMANOS:
+            with self.subTest(usuarios=cantidad):
+                self.crear_usuarios(cantidad)
+                pagina = self.listar(2)
+                self.assertEqual(len(pagina['results']), min(cantidad + 1, 50))
+                if pagina['next']:
+                    with self.assertNumQueries(2):
+                        self.client.get(pagina['next'], headers=self.headers)
+
+    def test_busqueda(self):
+        for cantidad in self.TAMANOS:
+            with self.subTest(usuarios=cantidad):
+                self.crear_usuarios(cantidad)
+                pagina = self.listar(2, search='usuario0@')
+                self.assertEqual([u['username'] for u in pagina['results']], ['usuario0'])
+
+    def test_filtro_por_rol(self):
+        for cantidad in self.TAMANOS:
+            with self.subTest(usuarios=cantidad):
+                self.crear_usuarios(cantidad)
+                pagina = self.listar(2, role='contadora')
+                self.assertTrue(pagina['results'])
+                self.assertTrue(all(u['role'] == 'contadora' for u in pagina['results']))
+                self.listar(2, search='contadora')
+
+
+
+# --- VENCIMIENTO DE SUSCRIPCIONES: CONSULTAS CONSTANTES ---
+# El cron vence y avisa con UPDATE y bulk_create por lote (LOTE filas): cuesta lo
+# mismo con 1 suscripción que con cientos, incluido publicar los avisos al stream.
+# 150 porque SQLite admite 999 parámetros por consulta y Django parte un bulk_create
+# de avisos cada 166 filas (un INSERT más, no uno por fila).
+# `manage.py benchmark_suscripciones` lo mide con 1M.
+
+class SuscripcionesConsultasTests(TestCase):
+    TAMANOS = (1, 150)
+    CONSULTAS = 7
+
+    def setUp(self):
+        self.plan = Plan.objects.create(nombre='Mensual', precio=5000)
+        self.ahora = timezone.now()
+
+    def crear_suscripciones(self, cantidad, vence_en):
+        Profile.objects.all().delete()
+        User.objects.all().delete()
+        usuarios = User.objects.bulk_create(User(username=f'usuario{n}', password='!') for n in range(cantidad))
+        suscripciones = Suscripcion.objects.bulk_create(
+            Suscripcion(user=user, plan=self.plan, fecha_vencimiento=self.ahora + vence_en) for user in usuarios
+        )
+        Profile.objects.bulk_create(
+            Profile(user=user, rut=f'{n}-9', suscripcion_actual=suscripcion)
+            for n, (user, suscripcion) in enumerate(zip(usuarios, suscripciones))
+        )
+
+    def test_vencer_consultas_constantes(self):
+        for cantidad in self.TAMANOS:
+            with self.subTest(suscripciones=cantidad):
+                self.crear_suscripciones(cantidad, timedelta(days=-1))
+                with self.assertNumQueries(self.CONSULTAS), self.captureOnCommitCallbacks(execute=True):
+                    self.assertEqual(vencer_suscripciones(ahora=self.ahora), cantidad)
+                self.assertFalse(Suscripcion.objects.filter(activa=True).exists())
+                self.assertFalse(Profile.objects.filter(suscripcion_actual__isnull=False).exists())
+                self.assertEqual(Notificacion.objects.filter(titulo="Tu plan venció").count(), cantidad)
+
+    def test_avisar_consultas_constantes(self):
+        for cantidad in self.TAMANOS:
+            with self.subTest(suscripciones=cantidad):
+                self.crear_suscripciones(cantidad, timedelta(days=1))
+                with self.assertNumQueries(self.CONSULTAS), self.captureOnCommitCallbacks(execute=True):
+                    self.assertEqual(avisar_por_vencer(ahora=self.ahora), cantidad)
+                self.assertFalse(Suscripcion.objects.filter(aviso_enviado=False).exists())
+                self.assertEqual(Notificacion.objects.filter(titulo="Tu plan está por vencer").count(), cantidad)
+
+# --- CONFIGURACIÓN DE LA CONEXIÓN ---
+
+@skipUnless(connection.vendor == 'sqlite', "PRAGMAs de SQLite")
+class ConexionSqliteTests(TestCase):
+    def test_pragmas_al_conectar(self):
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA journal_mode')
+            self.assertEqual(cursor.fetchone()[0], 'wal')
+            cursor.execute('PRAGMA busy_timeout')
+            self.assertEqual(cursor.fetchone()[0], settings.SQLITE_BUSY_TIMEOUT)
+            cursor.execute('PRAGMA synchronous')
+            self.assertEqual(cursor.fetchone()[0], 1)  # NORMAL
+
+
+# --- ÍNDICES DE LAS CONSULTAS FRECUENTES ---
+# Las mismas consultas que `manage.py verificar_indices`: cada plan de EXPLAIN debe
+# usar un índice (ni SCAN en SQLite ni Seq Scan en PostgreSQL).
+
+class IndicesConsultasTests(TestCase):
+    def test_consultas_frecuentes_usan_indices(self):
+        comando = VerificarIndices()
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute("SET LOCAL enable_seqscan = off")
+        for nombre, queryset, admite_indice in comando.consultas():
+            with self.subTest(consulta=nombre):
+                plan = queryset.explain()
+                self.assertEqual(comando.recorridos(plan, admite_indice), [], plan)
+
+    def test_detecta_recorridos_completos(self):
+        comando = VerificarIndices()
+        if connection.vendor == 'postgresql':
+            self.assertEqual(comando.recorridos("Seq Scan on tienda_producto", False), ['tienda_producto'])
+        else:
+            self.assertEqual(comando.recorridos("SCAN tienda_producto", False), ['tienda_producto'])
+            self.assertEqual(comando.recorridos("SCAN tienda_producto USING INDEX x", True), [])
+            self.assertEqual(comando.recorridos("SCAN tienda_producto USING INDEX x", False), ['tienda_producto'])
+            self.assertEqual(comando.recorridos("SEARCH tienda_producto USING INDEX x (id=?)", False), [])
+
+
+# --- CARRITO BAJO CONCURRENCIA ---
+# Lo mismo que `manage.py estres_carrito`: hilos reales con su propia conexión,
+# soltados a la vez con una barrera.
+
+def en_paralelo(funcion, argumentos):
+    """Corre funcion(arg) en un hilo por argumento y devuelve 'ok', 'sin_stock' o el error."""
+    barrera = threading.Barrier(len(argumentos))
+
+    def correr(argumento):
+        try:
+            barrera.wait()
+            funcion(argumento)
+            return 'ok'
+        except StockInsuficiente:
+            return 'sin_stock'
+        except Exception as e:
+            return f'{type(e).__name__}: {e}'
+        finally:
+            connection.close()
+
+    with ThreadPoolExecutor(max_workers=len(argumentos)) as pool:
+        return list(pool.map(correr, argumentos))
+
+
+class CarritoConcurrenteTests(TransactionTestCase):
+    CONCURRENTES = 100
+
+    def setUp(self):
+        self.user = User.objects.create(username='comprador', password='!')
+
+    def lineas(self, producto):
+        return list(CarritoItem.objects.filter(carrito__user=self.user, producto=producto).values_list('cantidad', flat=True))
+
+    def test_sumas_simultaneas_no_se_pierden(self):
+        producto = Producto.objects.create(nombre='Polera', precio=1000, stock=1000)
+        resultados = en_paralelo(lambda _: sumar_al_carrito(self.user, producto.id, 1), range(self.CONCURRENTES))
+        self.assertEqual(resultados, ['ok'] * self.CONCURRENTES)
+        self.assertEqual(self.lineas(producto), [self.CONCURRENTES])
+
+    def test_sumas_simultaneas_respetan_el_stock(self):
+        producto = Producto.objects.create(nombre='Polera', precio=1000, stock=30)
+        resultados = en_paralelo(lambda _: sumar_al_carrito(self.user, producto.id, 1), range(self.CONCURRENTES))
+        self.assertEqual(resultados.count('ok'), 30)
+        self.assertEqual(resultados.count('sin_stock'), self.CONCURRENTES - 30)
+        self.assertEqual(self.lineas(producto), [30])
+
+    def test_cantidades_fijadas_a_la_vez(self):
+        producto = Producto.objects.create(nombre='Polera', precio=1000, stock=50)
+        sumar_al_carrito(self.user, producto.id, 1)
+        item = CarritoItem.objects.get(carrito__user=self.user, producto=producto)
+        resultados = en_paralelo(lambda cantidad: fijar_cantidad(item, cantidad), range(1, self.CONCURRENTES + 1))
+        self.assertEqual(resultados.count('ok'), 50)
+        self.assertEqual(resultados.count('sin_stock'), self.CONCURRENTES - 50)
+        [cantidad] = self.lineas(producto)
+        self.assertLessEqual(cantidad, 50)
+
+
+# --- RÉPLICA DE LECTURA ---
+# La réplica es un segundo archivo SQLite, copia de la primaria solo cuando se
+# llama a `replicar()`: entre copias va atrasada, como una réplica real. Se ve
+# de dónde leyó cada petición por si devuelve el dato viejo o el nuevo.
+
+@skipUnless(connection.vendor == 'sqlite', "la réplica de prueba es un archivo SQLite")
+class RouterReplicaTests(TransactionTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        # El alias se agrega ya creada la base de prueba: el runner no debe crearla ni migrarla
+        cls.directorio = tempfile.mkdtemp()
+        cls.ruta = os.path.join(cls.directorio, 'replica.sqlite3')
+        # Mismo dict en settings.DATABASES (hay_replica) y en el manejador de conexiones
+        settings.DATABASES[REPLICA] = {**connections['default'].settings_dict, 'NAME': cls.ruta}
+        cls.databases = cls.databases | {REPLICA}
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.databases = cls.databases - {REPLICA}
+        connections[REPLICA].close()
+        del connections[REPLICA]
+        del settings.DATABASES[REPLICA]
+        shutil.rmtree(cls.directorio)
+        super().tearDownClass()
+
+    def setUp(self):
+        get_cache().clear()
+        self.ana = self.crear_usuario('ana', '1-9')
+        self.ana_id = User.objects.get(username='ana').id
+        self.beto = self.crear_usuario('beto', '2-7')
+        self.replicar()
+        # Cambios que la réplica todavía no tiene
+        Profile.objects.update(nombre='nuevo')
+
+    def crear_usuario(self, username, rut):
+        user = User.objects.create(username=username, password='!')
+        Profile.objects.create(user=user, rut=rut, nombre='viejo')
+        return {'Authorization': f'Bearer {AccessToken.for_user(user)}'}
+
+    def replicar(self):
+        connections[REPLICA].close()
+        connections['default'].ensure_connection()
+        destino = sqlite3.connect(self.ruta)
+        try:
+            connections['default'].connection.backup(destino)
+        finally:
+            destino.close()
+
+    def nombre(self, headers):
+        respuesta = self.client.get(reverse('profile'), headers=headers)
+        self.assertEqual(respuesta.status_code, 200)
+        return respuesta.json()['nombre']
+
+    def test_lecturas_van_a_la_replica(self):
+        self.assertEqual(self.nombre(self.ana), 'viejo')
+        self.replicar()
+        self.assertEqual(self.nombre(self.ana), 'nuevo')
+
+    def test_escritura_pega_al_usuario_a_la_primaria(self):
+        respuesta = self.client.patch(
+            reverse('profile'), {'apellidos': 'Soto'}, content_type='application/json', headers=self.ana,
+        )
+        self.assertEqual(respuesta.status_code, 200)
+        # Ana lee lo último de la primaria; Beto, que no escribió, sigue en la réplica
+        self.assertEqual(self.nombre(self.ana), 'nuevo')
+        self.assertEqual(self.nombre(self.beto), 'viejo')
+
+    def test_pegado_vale_en_otro_worker(self):
+        self.client.patch(reverse('profile'), {'apellidos': 'Soto'}, content_type='application/json', headers=self.ana)
+        # Otro worker no comparte la LocMemCache de este: la marca vive en la primaria
+        get_cache().clear()
+        self.assertEqual(self.nombre(self.ana), 'nuevo')
+        self.assertEqual(list(EscrituraReciente.objects.values_list('clave', flat=True)), [clave_usuario(self.ana_id)])
+
+    @override_settings(DB_REPLICA_PEGADO=1)
+    def test_pegado_vence_tras_la_ventana(self):
+        self.client.patch(reverse('profile'), {'apellidos': 'Soto'}, content_type='application/json', headers=self.ana)
+        self.assertEqual(self.nombre(self.ana), 'nuevo')
+        time.sleep(1.1)
+        self.assertEqual(self.nombre(self.ana), 'viejo')
+
+
+# --- VALIDACIÓN DE ENTRADA DEL CARRITO ---
+
+class CarritoEntradaTests(TestCase):
+    def setUp(self):
+        user = User.objects.create(username='comprador', password='!')
+        self.headers = {'Authorization': f'Bearer {AccessToken.for_user(user)}'}
+        producto = Producto.objects.create(nombre='Polera', precio=1000, stock=10)
+        self.item = CarritoItem.objects.create(carrito=Carrito.objects.create(user=user), producto=producto, cantidad=2)
+
+    def actualizar(self, cuerpo):
+        return self.client.patch(
+            reverse('actualizar_item_carrito', args=[self.item.id]), cuerpo,
+            content_type='application/json', headers=self.headers,
+        )
+
+    def test_cantidad_no_entera_responde_400(self):
+        for cantidad in ('dos', None, [3], {'n': 3}):
+            with self.subTest(cantidad=cantidad):
+                respuesta = self.actualizar(json.dumps({'cantidad': cantidad}))
+                self.assertEqual(respuesta.status_code, 400)
+        self.item.refresh_from_db()
+        self.assertEqual(self.item.cantidad, 2)
+
+    def test_cuerpo_json_que_no_es_objeto_responde_400(self):
+        for cuerpo in ('[]', '"x"', '3', 'null', '{'):
+            with self.subTest(cuerpo=cuerpo):
+                self.assertEqual(self.actualizar(cuerpo).status_code, 400)
+                respuesta = self.client.post(
+                    reverse('agregar_al_carrito'), cuerpo, content_type='application/json', headers=self.headers,
+                )
+                self.assertEqual(respuesta.status_code, 400)
+                self.assertEqual(respuesta.json(), {'detail': 'Cuerpo de la petición mal formado'})
+
+    def test_cantidad_valida(self):
+        respuesta = self.actualizar(json.dumps({'cantidad': '5'}))
+        self.assertEqual(respuesta.status_code, 200)
+        self.item.refresh_from_db()
+        self.assertEqual(self.item.cantidad, 5)
+
+
+# --- RESERVAS DE STOCK EN EL CHECKOUT ---
+# Checkouts simultáneos contra la BD real, y los caminos que devuelven el stock
+# reservado: pago abortado, Transbank caído, pago rechazado y reserva vencida.
+
+class _GatewayHandler(BaseHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+    def _responder(self):
+        self.rfile.read(int(self.headers.get('Content-Length') or 0))
+        status, datos = self.server.respuestas[self.command]
+        cuerpo = json.dumps(datos).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(cuerpo)))
+        self.end_headers()
+        self.wfile.write(cuerpo)
+
+    do_POST = do_PUT = do_GET = _responder
+
+
+class GatewayFalso(ThreadingHTTPServer):
+    """Transbank de prueba: a cada método responde lo que diga `respuestas`."""
+    daemon_threads = True
+
+    def __init__(self, respuestas):
+        super().__init__(('127.0.0.1', 0), _GatewayHandler)
+        self.respuestas = respuestas
+        self.url = f'http://127.0.0.1:{self.server_address[1]}'
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+
+    def cerrar(self):
+        self.shutdown()
+        self.server_close()
+
+
+class ReservasStockTests(TransactionTestCase):
+    def setUp(self):
+        breaker_transbank.exito()
+        self.producto = Producto.objects.create(nombre='Polera', precio=1000, stock=5)
+
+    def comprador(self, username, cantidad):
+        user = User.objects.create(username=username, password='!')
+        sumar_al_carrito(user, self.producto.id, cantidad)
+        return user
+
+    def reservar(self, user):
+        return reservar_carrito(user, Carrito.objects.get(user=user), f'C{user.id}T1')
+
+    def reservado(self):
+        return sum(ReservaStock.objects.values_list('cantidad', flat=True))
+
+    def con_gateway(self, respuestas):
+        gateway = GatewayFalso(respuestas)
+        self.addCleanup(gateway.cerrar)
+        ajuste = override_settings(TRANSBANK_BASE_URL=gateway.url, TRANSBANK_BACKOFF=0)
+        ajuste.enable()
+        self.addCleanup(ajuste.disable)
+
+    def test_dos_checkouts_no_reservan_mas_que_el_stock(self):
+        compradores = [self.comprador('uno', 3), self.comprador('dos', 3)]
+        resultados = en_paralelo(self.reservar, compradores)
+        self.assertEqual(sorted(resultados), ['ok', 'sin_stock'])
+        self.assertEqual(self.reservado(), 3)
+
+    def test_muchos_checkouts_no_sobrevenden(self):
+        compradores = [self.comprador(f'comprador{n}', 1) for n in range(20)]
+        resultados = en_paralelo(self.reservar, compradores)
+        self.assertEqual(resultados.count('ok'), 5)
+        self.assertEqual(resultados.count('sin_stock'), 15)
+        self.assertEqual(self.reservado(), 5)
+
+    def abortar(self, user):
+        return self.client.post(reverse('webpay_return'), {'TBK_TOKEN': 'tbk', 'TBK_ORDEN_COMPRA': f'C{user.id}T1'})
+
+    def test_pago_abortado_libera_la_reserva(self):
+        user = self.comprador('uno', 5)
+        self.reservar(user)
+        self.con_gateway({'GET': (200, {'buy_order': f'C{user.id}T1', 'status': 'INITIALIZED'})})
+        respuesta = self.abortar(user)
+        self.assertEqual(respuesta.status_code, 302)
+        self.assertIn('status=aborted', respuesta['Location'])
+        self.assertEqual(self.reservado(), 0)
+
+    def test_aborto_no_confirmado_mantiene_la_reserva(self):
+        user = self.comprador('uno', 5)
+        self.reservar(user)
+        casos = {
+            'token desconocido': (404, {'error_message': 'no existe'}),
+            'token de otra orden': (200, {'buy_order': 'C999T1', 'status': 'INITIALIZED'}),
+            'pago cobrado': (200, {'buy_order': f'C{user.id}T1', 'status': 'AUTHORIZED'}),
+        }
+        for caso, respuesta in casos.items():
+            with self.subTest(caso):
+                self.con_gateway({'GET': respuesta})
+                self.assertIn('status=aborted', self.abortar(user)['Location'])
+                self.assertEqual(self.reservado(), 5)
+
+    def test_transbank_caido_libera_la_reserva(self):
+        self.con_gateway({'POST': (503, {'error_message': 'no disponible'})})
+        user = self.comprador('uno', 5)
+        respuesta = self.client.post(
+            reverse('webpay_create'), {'amount': 5000, 'buy_order': f'C{user.id}T1'},
+            content_type='application/json', headers={'Authorization': f'Bearer {AccessToken.for_user(user)}'},
+        )
+        self.assertEqual(respuesta.status_code, 503)
+        self.assertEqual(self.reservado(), 0)
+
+    def test_pago_rechazado_libera_la_reserva(self):
+        user = self.comprador('uno', 5)
+        self.reservar(user)
+        self.con_gateway({'PUT': (200, {'buy_order': f'C{user.id}T1', 'amount': 5000, 'response_code': -1})})
+        respuesta = self.client.get(reverse('webpay_return'), {'token_ws': 'abc'})
+        self.assertIn('status=failed', respuesta['Location'])
+        self.assertEqual(self.reservado(), 0)
+        self.assertFalse(Pedido.objects.exists())
+
+    def test_solo_los_rechazos_reales_cuentan_como_pago_fallido(self):
+        user = self.comprador('uno', 5)
+        self.con_gateway({'PUT': (404, {'error_message': 'token no existe'})})
+        self.client.get(reverse('webpay_return'), {'token_ws': 'inventado'})
+        self.assertFalse(ResumenVentasDiario.objects.filter(pagos_fallidos__gt=0).exists())
+
+        self.con_gateway({'PUT': (200, {'buy_order': f'C{user.id}T1', 'amount': 5000, 'response_code': -1})})
+        self.client.get(reverse('webpay_return'), {'token_ws': 'abc'})
+        self.assertEqual(ResumenVentasDiario.objects.get().pagos_fallidos, 1)
+
+    def test_confirmacion_fallida_no_registra_el_token(self):
+        self.con_gateway({'PUT': (503, {'error_message': 'no disponible'})})
+        token = 'e9d555262db0f989e49d724b4db0b0af367cc415cde41f500a776550fc5fddd3'
+        with self.assertLogs('tienda.views_webpay', 'WARNING') as registro:
+            respuesta = self.client.get(reverse('webpay_return'), {'token_ws': token})
+        self.assertIn('status=failed', respuesta['Location'])
+        self.assertNotIn(token, '\n'.join(registro.output))
+
+    def test_reserva_vencida_no_cuenta(self):
+        primero, segundo = self.comprador('uno', 5), self.comprador('dos', 5)
+        self.reservar(primero)
+        with self.assertRaises(StockInsuficiente):
+            self.reservar(segundo)
+
+        ReservaStock.objects.update(expira_en=timezone.now() - timedelta(seconds=1))
+        self.reservar(segundo)
+        self.assertEqual(purgar_reservas_vencidas(), 1)
+        self.assertEqual(list(ReservaStock.objects.values_list('user__username', 'cantidad')), [('dos', 5)])
+
+
+
+# --- CIERRE DEL PEDIDO: CONSULTAS CONSTANTES ---
+# `_finalizar_pedido_carrito` cuesta lo mismo con 1 ítem que con 200: locks,
+# PedidoItem, stock y agregados de reportes van en consultas por lote.
+# `manage.py benchmark_checkout` mide además la latencia.
+
+class CheckoutConsultasTests(TestCase):
+    CONSULTAS = 18
+
+    def carrito_pagado(self, items):
+        user = User.objects.create(username=f'comprador{items}', password='!')
+        productos = Producto.objects.bulk_create(
+            Producto(nombre=f'Producto {items}-{n}', precio=1000, stock=10) for n in range(items)
+        )
+        carrito = Carrito.objects.create(user=user)
+        CarritoItem.objects.bulk_create(CarritoItem(carrito=carrito, producto=p, cantidad=2) for p in productos)
+        reservar_carrito(user, carrito, f'C{user.id}T1')
+        return user, productos
+
+    def test_consultas_constantes(self):
+        for items in (1, 200):
+            with self.subTest(items=items):
+                user, productos = self.carrito_pagado(items)
+                with self.assertNumQueries(self.CONSULTAS):
+                    pedido = _finalizar_pedido_carrito(user, f'C{user.id}T1', 2000 * items)
+                self.assertEqual(pedido.items.count(), items)
+                self.assertEqual(
+                    set(Producto.objects.filter(id__in=[p.id for p in productos]).values_list('stock', 'total_vendidos')),
+                    {(8, 2)},
+                )
+                self.assertFalse(CarritoItem.objects.filter(carrito__user=user).exists())
+                self.assertFalse(ReservaStock.objects.filter(user=user).exists())
+
+
+
+# --- EXPORTACIÓN DE BOLETAS ---
+
+@override_settings(BOLETAS_WORKERS=0)
+class ExportacionBoletasTests(TestCase):
+    def setUp(self):
+        media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media)
+        ajuste = override_settings(MEDIA_ROOT=media)
+        ajuste.enable()
+        self.addCleanup(ajuste.disable)
+        # Un archivo donde va el directorio de boletas: escribir el PDF en disco falla con OSError
+        open(os.path.join(media, 'boletas'), 'w').close()
+
+        user = User.objects.create(username='cliente', password='!')
+        Profile.objects.create(user=user, rut='1-9')
+        producto = Producto.objects.create(nombre='Polera', precio=1000, stock=10)
+        for n in range(2):
+            pedido = Pedido.objects.create(user=user, orden_compra=f'C{user.id}T{n}', monto_total=1000, estado='PAGADO')
+            PedidoItem.objects.create(pedido=pedido, producto=producto, cantidad=1, precio_al_momento_compra=1000)
+
+    def test_zip_completo_aunque_falle_una_boleta(self):
+        with self.assertLogs('tienda.boletas', 'ERROR') as registro:
+            contenido = b''.join(zip_boletas(Pedido.objects.order_by('id')))
+        self.assertEqual([issubclass(r.exc_info[0], OSError) for r in registro.records], [True, True])
+
+        with zipfile.ZipFile(io.BytesIO(contenido)) as archivo_zip:
+            self.assertEqual(archivo_zip.namelist(), ['ERRORES.txt'])
+            errores = archivo_zip.read('ERRORES.txt').decode()
+        for pedido in Pedido.objects.all():
+            self.assertIn(pedido.orden_compra, errores)
+
+
+# --- EXPORTACIONES CSV ---
+
+class ExportacionesTests(TestCase):
+    def setUp(self):
+        admin = User.objects.create(username='admin', password='!', is_staff=True)
+        self.headers = {'Authorization': f'Bearer {AccessToken.for_user(admin)}'}
+
+    def exportar(self, nombre, **params):
+        respuesta = self.client.get(reverse(nombre), params, headers=self.headers)
+        self.assertEqual(respuesta.status_code, 200)
+        contenido = b''.join(respuesta.streaming_content).decode('utf-8-sig')
+        return list(csv.DictReader(io.StringIO(contenido)))
+
+    def test_texto_que_parece_formula_queda_como_texto(self):
+        for n, nombre in enumerate(('=HYPERLINK("http://x")', '+1', '-1', '@SUMA(A1)', '\tx', 'normal')):
+            User.objects.create(username=f'u{n}', email=nombre, password='!')
+        emails = [fila['email'] for fila in self.exportar('exportar_usuarios') if fila['usuario'] != 'admin']
+        self.assertEqual(emails, ["'=HYPERLINK(\"http://x\")", "'+1", "'-1", "'@SUMA(A1)", "'\tx", 'normal'])
+
+    def test_rango_de_fechas_por_dia_local(self):
+        user = User.objects.get(username='admin')
+        producto = Producto.objects.create(nombre='Polera', precio=1000, stock=10)
+        dia = date(2026, 3, 10)
+        momentos = {
+            'ultimo_minuto': timezone.make_aware(datetime.combine(dia, datetime.max.time())),
+            'dia_siguiente': timezone.make_aware(datetime.combine(dia + timedelta(days=1), datetime.min.time())),
+        }
+        for orden, momento in momentos.items():
+            pedido = Pedido.objects.create(user=user, orden_compra=orden, monto_total=1000, estado='PAGADO')
+            PedidoItem.objects.create(pedido=pedido, producto=producto, cantidad=1, precio_al_momento_compra=1000)
+            Pedido.objects.filter(id=pedido.id).update(creado_en=momento)
+
+        def ordenes(**params):
+            return [fila['orden_compra'] for fila in self.exportar('exportar_pedidos', **params)]
+
+        self.assertEqual(ordenes(hasta=dia.isoformat()), ['ultimo_minuto'])
+        self.assertEqual(ordenes(desde=(dia + timedelta(days=1)).isoformat()), ['dia_siguiente'])
+        self.assertEqual(ordenes(desde=dia.isoformat(), hasta=dia.isoformat()), ['ultimo_minuto'])
+
+# --- TICKETS DEL STREAM DE NOTIFICACIONES ---
+
+class TicketStreamTests(TestCase):
+    def setUp(self):
+        # Abrir el stream arranca el hilo que lee eventos de otros procesos
+        self.addCleanup(receptor_notificaciones.detener)
+        user = User.objects.create(username='lector', password='!')
+        self.headers = {'Authorization': f'Bearer {AccessToken.for_user(user)}'}
+
+    def ticket(self):
+        respuesta = self.client.post(reverse('ticket_stream_notificaciones'), headers=self.headers)
+        self.assertEqual(respuesta.status_code, 200)
+        return respuesta.json()['ticket']
+
+    def stream(self, **params):
+        return self.client.get(reverse('notificaciones_stream'), params)
+
+    def test_ticket_requiere_jwt(self):
+        self.assertEqual(self.client.post(reverse('ticket_stream_notificaciones')).status_code, 401)
+
+    def test_ticket_es_de_un_solo_uso(self):
+        ticket = self.ticket()
+        self.assertEqual(self.stream(ticket=ticket).status_code, 200)
+        self.assertEqual(self.stream(ticket=ticket).status_code, 401)
+
+    def test_ticket_no_depende_de_la_cache_del_proceso(self):
+        ticket = self.ticket()
+        # Otro worker no ve la LocMemCache de este: el ticket vive en la BD
+        get_cache().clear()
+        self.assertEqual(self.stream(ticket=ticket).status_code, 200)
+        self.assertFalse(TicketStream.objects.exists())
+
+    def test_ticket_vencido(self):
+        ticket = self.ticket()
+        TicketStream.objects.update(expira_en=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(self.stream(ticket=ticket).status_code, 401)
+        # Emitir otro purga los vencidos
+        self.ticket()
+        self.assertEqual(TicketStream.objects.count(), 1)
+
+    def test_no_acepta_jwt_en_la_url(self):
+        token = self.headers['Authorization'].removeprefix('Bearer ')
+        self.assertEqual(self.stream(token=token).status_code, 401)
+        self.assertEqual(self.stream(ticket=token).status_code, 401)
+
+
+# --- STREAMS ABIERTOS BAJO ASGI ---
+# Con la aplicación de backend/asgi.py un stream inactivo no retiene un hilo.
+# `manage.py benchmark_sse` lo mide con 5.000 conexiones.
+
+class StreamAsgiTests(TransactionTestCase):
+    CONEXIONES = 20
+
+    def setUp(self):
+        self.addCleanup(receptor_notificaciones.detener)
+
+    def test_streams_inactivos_sin_hilo_por_conexion(self):
+        user = User.objects.create(username='lector', password='!')
+        # Un event loop propio, como el de uvicorn: un test async correría lo síncrono
+        # de vuelta en el hilo del test y no mediría nada
+        asyncio.run(self.abrir_streams(str(AccessToken.for_user(user))))
+
+    async def abrir_streams(self, token):
+        hilos = threading.active_count()
+        conexiones = [ConexionAsgi() for _ in range(self.CONEXIONES)]
+        tareas = [asyncio.create_task(asgi_application(scope_stream(token), c.receive, c.send)) for c in conexiones]
+        await asyncio.wait_for(asyncio.gather(*(c.abierta.wait() for c in conexiones)), timeout=10)
+        self.assertEqual({c.status for c in conexiones}, {200})
+        # El receptor de eventos y el hilo compartido de asgiref, no uno por stream
+        self.assertLessEqual(threading.active_count() - hilos, 2)
+
+        await sync_to_async(fanout_notificaciones.publicar)('noticia', {'titulo': 'Hola'})
+        for _ in range(100):
+            if all(c.eventos for c in conexiones):
+                break
+            await asyncio.sleep(0.05)
+        self.assertTrue(all(c.eventos for c in conexiones))
+
+        for conexion in conexiones:
+            conexion.cerrar.set()
+        await asyncio.wait_for(asyncio.gather(*tareas), timeout=10)
+        self.assertEqual(fanout_notificaciones.conectados(), 0)
+
+
+# --- EVENTOS DEL STREAM ENTRE PROCESOS ---
+
+async def recibir(suscriptor):
+    _, mensaje = await asyncio.wait_for(suscriptor.cola.get(), timeout=5)
+    return mensaje
+
+@override_settings(NOTIFICACIONES_INTERVALO=0.05)
+class EventosEntreProcesosTests(TransactionTestCase):
+    def setUp(self):
+        self.receptor = Receptor(fanout_notificaciones)
+        self.addCleanup(self.receptor.detener)
+
+    def suscribir(self, user_id):
+        suscriptor = fanout_notificaciones.suscribir(user_id)
+        self.addCleanup(fanout_notificaciones.cancelar, suscriptor)
+        return suscriptor
+
+    async def test_evento_de_otro_proceso_llega_a_los_conectados(self):
+        destinatario, otro = self.suscribir(7), self.suscribir(8)
+        self.receptor.iniciar()
+        await EventoNotificacion.objects.acreate(
+            evento='notificacion', data={'id': 1, 'titulo': 'Hola'}, event_id=1, user_ids=[7], origen='otro-proceso',
+        )
+        mensaje = await recibir(destinatario)
+        self.assertIn('event: notificacion', mensaje)
+        self.assertIn('"titulo":"Hola"', mensaje)
+        self.assertTrue(otro.cola.empty())
+
+    async def test_lo_publicado_aqui_llega_una_sola_vez(self):
+        suscriptor = self.suscribir(7)
+        self.receptor.iniciar()
+        await sync_to_async(publicar)('leida', {'ids': [1]}, user_ids={7})
+        self.assertIn('event: leida', await recibir(suscriptor))
+        self.assertTrue(await EventoNotificacion.objects.filter(origen=origen_proceso()).aexists())
+        await asyncio.sleep(0.3)
+        self.assertTrue(suscriptor.cola.empty())
+
+
+    @skipUnless(connection.vendor == 'sqlite', "el proceso hijo abre la base de prueba por DB_NAME")
+    async def test_avisos_del_cron_llegan_desde_otro_proceso(self):
+        vencido, por_vencer = await sync_to_async(self.crear_suscripciones)()
+        suscriptores = self.suscribir(vencido), self.suscribir(por_vencer)
+        self.receptor.iniciar()
+
+        cron = await asyncio.create_subprocess_exec(
+            sys.executable, os.path.join(settings.BASE_DIR, 'manage.py'), 'vencer_suscripciones',
+            env={**os.environ, 'DB_NAME': connection.settings_dict['NAME']},
+            stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+        )
+        _, errores = await cron.communicate()
+        self.assertEqual(cron.returncode, 0, errores.decode())
+
+        self.assertIn('Tu plan venci', await recibir(suscriptores[0]))
+        self.assertIn('Tu plan est', await recibir(suscriptores[1]))
+
+    def crear_suscripciones(self):
+        plan = Plan.objects.create(nombre='Mensual', precio=5000)
+        user_ids = []
+        for username, vence_en in (('vencido', timedelta(days=-1)), ('por_vencer', timedelta(days=2))):
+            user = User.objects.create(username=username, password='!')
+            Profile.objects.create(user=user, rut=f'{len(user_ids) + 1}-9')
+            suscripcion = Suscripcion.objects.create(user=user, plan=plan)
+            Suscripcion.objects.filter(id=suscripcion.id).update(fecha_vencimiento=timezone.now() + vence_en)
+            user_ids.append(user.id)
+        return user_ids
@@ -0,0 +1,286 @@
+import asyncio
+import random
+import ssl
+import threading
+import time
+import weakref
+from collections import namedtuple
+
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+
+try:
+    import certifi
+    import httpx
+except ImportError:  # El cliente async cae a un hilo con el cliente síncrono
+    httpx = None
+
+
+# --- CLIENTE WEBPAY PLUS ---
+# Una sola sesión HTTP por proceso (pool de conexiones keep-alive), timeouts de
+# conexión/lectura, reintentos con backoff solo donde es seguro repetir y un
+# circuit breaker compartido: si Transbank está caído fallamos al instante en vez
+# de dejar cada worker colgado esperando el timeout.
+
+RUTA_TRANSACCIONES = "/rswebpaytransaction/api/webpay/v1.2/transactions"
+
+Respuesta = namedtuple('Respuesta', ['status_code', 'data'])
+
+
+class TransbankError(Exception):
+    """No se obtuvo respuesta válida de Transbank (timeout, conexión o 5xx)."""
+
+
+class TransbankNoDisponible(TransbankError):
+    """Circuito abierto: ni siquiera se intentó la llamada."""
+
+
+class CircuitBreaker:
+    """
+    Cerrado -> abierto tras `umbral` fallos seguidos. Pasado `enfriamiento`
+    segundos deja pasar una sola llamada de prueba (semiabierto): si funciona
+    se cierra, si falla vuelve a abrirse.
+    """
+
+    def __init__(self, umbral=5, enfriamiento=30):
+        self.umbral = umbral
+        self.enfriamiento = enfriamiento
+        self._fallos = 0
+        self._abierto_desde = None
+        self._probando = False
+        self._lock = threading.Lock()
+
+    @property
+    def estado(self):
+        with self._lock:
+            if self._abierto_desde is None:
+                return 'cerrado'
+            if time.monotonic() - self._abierto_desde >= self.enfriamiento:
+                return 'semiabierto'
+            return 'abierto'
+
+    def permitir(self):
+        with self._lock:
+            if self._abierto_desde is None:
+                return True
+            if time.monotonic() - self._abierto_desde < self.enfriamiento or self._probando:
+                return False
+            self._probando = True
+            return True
+
+    def exito(self):
+        with self._lock:
+            self._fallos = 0
+            self._abierto_desde = None
+            self._probando = False
+
+    def fallo(self):
+        with self._lock:
+            self._fallos += 1
+            self._probando = False
+            if self._fallos >= self.umbral:
+                self._abierto_desde = time.monotonic()
+
+
+def _espera_backoff(intento):
+    base = settings.TRANSBANK_BACKOFF
+    return min(base * (2 ** intento), 5) * random.uniform(0.5, 1)
+
+
+def _datos(status_code, leer_json):
+    try:
+        return leer_json()
+    except ValueError:
+        return {"error": f"Respuesta no JSON de Transbank (HTTP {status_code})"}
+
+
+class _Base:
+    def __init__(self, base_url=None, api_key_id=None, api_key_secret=None, breaker=None):
+        self.url = (base_url or settings.TRANSBANK_BASE_URL).rstrip('/') + RUTA_TRANSACCIONES
+        self.headers = {
+            "Tbk-Api-Key-Id": api_key_id or settings.TRANSBANK_API_KEY_ID,
+            "Tbk-Api-Key-Secret": api_key_secret or settings.TRANSBANK_API_KEY_SECRET,
+            "Content-Type": "application/json",
+        }
+        self.breaker = breaker or breaker_transbank
+        self.timeout = (settings.TRANSBANK_CONNECT_TIMEOUT, settings.TRANSBANK_READ_TIMEOUT)
+        self.reintentos = settings.TRANSBANK_REINTENTOS
+
+    def _payload_crear(self, buy_order, session_id, amount, return_url):
+        return {
+            "buy_order": buy_order,
+            "session_id": session_id,
+            "amount": amount,
+            "return_url": return_url,
+        }
+
+
+class ClienteTransbank(_Base):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.session = requests.Session()
+        self.session.headers.update(self.headers)
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=settings.TRANSBANK_POOL)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+    def _llamar(self, metodo, url, json=None, idempotente=False):
+        """
+        Un POST solo se repite si la conexión no llegó a establecerse; un PUT/GET
+        también ante timeout de lectura o 5xx. Los 4xx se devuelven tal cual.
+        """
+        if not self.breaker.permitir():
+            raise TransbankNoDisponible("Transbank no disponible, intenta en unos segundos")
+
+        intentos = 1 + (self.reintentos if idempotente else 1)
+        for intento in range(intentos):
+            try:
+                response = self.session.request(metodo, url, json=json, timeout=self.timeout)
+            except requests.ConnectionError as e:
+                # ConnectTimeout hereda de ConnectionError: la petición no salió
+                error = e
+            except requests.Timeout as e:
+                error = e
+                if not idempotente:
+                    break
+            else:
+                if response.status_code < 500:
+                    self.breaker.exito()
+                    return Respuesta(response.status_code, _datos(response.status_code, response.json))
+                error = TransbankError(f"Transbank respondió HTTP {response.status_code}")
+                if not idempotente:
+                    break
+            if intento + 1 < intentos:
+                time.sleep(_espera_backoff(intento))
+
+        self.breaker.fallo()
+        raise TransbankError(str(error)) from error
+
+    def crear_transaccion(self, buy_order, session_id, amount, return_url):
+        return self._llamar('POST', self.url, json=self._payload_crear(buy_order, session_id, amount, return_url))
+
+    def confirmar_transaccion(self, token):
+        respuesta = self._llamar('PUT', f"{self.url}/{token}", idempotente=True)
+        if respuesta.status_code == 422:
+            # Un reintento tras perder la respuesta ve "ya confirmada": el estado dice cómo quedó
+            return self.estado_transaccion(token)
+        return respuesta
+
+    def estado_transaccion(self, token):
+        return self._llamar('GET', f"{self.url}/{token}", idempotente=True)
+
+
+class ClienteTransbankAsync(_Base):
+    """
+    Misma API que ClienteTransbank pero con corrutinas, para vistas ASGI. Usa
+    httpx si está instalado; si no, delega al cliente síncrono en un hilo para
+    no bloquear el event loop.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        if httpx is not None:
+            self.client = httpx.AsyncClient(
+                headers=self.headers,
+                verify=_contexto_ssl(),
+                timeout=httpx.Timeout(self.timeout[1], connect=self.timeout[0]),
+                limits=httpx.Limits(max_connections=settings.TRANSBANK_POOL),
+            )
+        else:
+            self.client = None
+            self._sync = ClienteTransbank(*args, **kwargs)
+
+    async def _llamar(self, metodo, url, json=None, idempotente=False):
+        if not self.breaker.permitir():
+            raise TransbankNoDisponible("Transbank no disponible, intenta en unos segundos")
+
+        intentos = 1 + (self.reintentos if idempotente else 1)
+        for intento in range(intentos):
+            try:
+                response = await self.client.request(metodo, url, json=json)
+            except (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout) as e:
+                error = e
+            except httpx.TransportError as e:
+                error = e
+                if not idempotente:
+                    break
+            else:
+                if response.status_code < 500:
+                    self.breaker.exito()
+                    return Respuesta(response.status_code, _datos(response.status_code, response.json))
+                error = TransbankError(f"Transbank respondió HTTP {response.status_code}")
+                if not idempotente:
+                    break
+            if intento + 1 < intentos:
+                await asyncio.sleep(_espera_backoff(intento))
+
+        self.breaker.fallo()
+        raise TransbankError(str(error)) from error
+
+    async def crear_transaccion(self, buy_order, session_id, amount, return_url):
+        if self.client is None:
+            return await asyncio.to_thread(self._sync.crear_transaccion, buy_order, session_id, amount, return_url)
+        return await self._llamar('POST', self.url, json=self._payload_crear(buy_order, session_id, amount, return_url))
+
+    async def confirmar_transaccion(self, token):
+        if self.client is None:
+            return await asyncio.to_thread(self._sync.confirmar_transaccion, token)
+        respuesta = await self._llamar('PUT', f"{self.url}/{token}", idempotente=True)
+        if respuesta.status_code == 422:
+            return await self.estado_transaccion(token)
+        return respuesta
+
+    async def estado_transaccion(self, token):
+        if self.client is None:
+            return await asyncio.to_thread(self._sync.estado_transaccion, token)
+        return await self._llamar('GET', f"{self.url}/{token}", idempotente=True)
+
+    async def cerrar(self):
+        if self.client is not None:
+            await self.client.aclose()
+
+
+# --- INSTANCIAS COMPARTIDAS ---
+
+breaker_transbank = CircuitBreaker(
+    umbral=settings.TRANSBANK_CIRCUITO_UMBRAL,
+    enfriamiento=settings.TRANSBANK_CIRCUITO_SEGUNDOS,
+)
+
+_cliente = None
+_cliente_lock = threading.Lock()
+_clientes_async = weakref.WeakKeyDictionary()
+_ssl = None
+
+
+def get_cliente():
+    global _cliente
+    if _cliente is None:
+        with _cliente_lock:
+            if _cliente is None:
+                _cliente = ClienteTransbank()
+    return _cliente
+
+
+def _contexto_ssl():
+    """
+    Cargar los certificados cuesta ~40 ms de CPU por AsyncClient. Bajo WSGI cada
+    petición a una vista async trae su propio event loop (y su cliente), así que
+    todos comparten un mismo SSLContext.
+    """
+    global _ssl
+    if _ssl is None:
+        with _cliente_lock:
+            if _ssl is None:
+                _ssl = ssl.create_default_context(cafile=certifi.where())
+    return _ssl
+
+
+def get_cliente_async():
+    """Un AsyncClient de httpx no se puede compartir entre event loops: uno por loop."""
+    loop = asyncio.get_running_loop()
+    cliente = _clientes_async.get(loop)
+    if cliente is None:
+        cliente = _clientes_async[loop] = ClienteTransbankAsync()
+    return cliente
@@ -7,33 +7,31 @@ from .views import MyTokenObtainPairView
 
 # Importamos el resto de vistas
 from .views import (
-    ProductoViewSet, UserAdminViewSet, RegisterView, ProfileView, PlanViewSet, MiPlanView,
+    ProductoViewSet, UserAdminViewSet, RegisterView, perfil, PlanViewSet, MiPlanView,
     obtener_carrito, agregar_al_carrito, actualizar_item_carrito, eliminar_item_carrito,
-    vaciar_carrito,
+    vaciar_carrito, carrito_batch, carrito_invitado,
     HistorialPedidosView,
     # Asegúrate de tener esta vista importada si la usas en tus rutas (MiPlan.js la necesita)
     # Si tienes HistorialPlanesView importala aquí, si no, omítela
     # Si tienes HistorialPlanesView importala aquí, si no, omítela
     HistorialPlanesView, 
     descargar_boleta,
+    exportar_boletas,
     product_reviews,
-<<<<<<< HEAD
-<<<<<<< HEAD
-<<<<<<< HEAD
     moderate_review_detail,
     NoticiaViewSet,
     NotificacionViewSet,
-=======
-    moderate_review_detail  # <--- AÑADIDO
->>>>>>> parent of 281861c (se añadió el blog y sus respectivas funciones)
-=======
-    moderate_review_detail  # <--- AÑADIDO
->>>>>>> parent of 281861c (se añadió el blog y sus respectivas funciones)
-=======
-    moderate_review_detail  # <--- AÑADIDO
->>>>>>> parent of 281861c (se añadió el blog y sus respectivas funciones)
+    estadisticas_cache,
+    notificaciones_stream,
+    ticket_stream_notificaciones,
+    marcar_todas_leidas,
+    notificaciones_no_leidas,
 )
 from .views_webpay import webpay_create, webpay_return 
+from .views_reportes import (
+    reporte_mrr, reporte_top_productos, reporte_ventas,
+    exportar_pedidos, exportar_suscripciones, exportar_usuarios,
+)
 
 router = DefaultRouter()
 
@@ -41,24 +39,15 @@ router = DefaultRouter()
 router.register(r'productos', ProductoViewSet, basename='producto')
 router.register(r'usuarios', UserAdminViewSet)
 router.register(r'planes', PlanViewSet)
-<<<<<<< HEAD
-<<<<<<< HEAD
-<<<<<<< HEAD
 router.register(r'noticias', NoticiaViewSet)
 router.register(r'notificaciones', NotificacionViewSet) # <-- ¡CONSOLIDADO!
-=======
->>>>>>> parent of 281861c (se añadió el blog y sus respectivas funciones)
-=======
->>>>>>> parent of 281861c (se añadió el blog y sus respectivas funciones)
-=======
->>>>>>> parent of 281861c (se añadió el blog y sus respectivas funciones)
 
 urlpatterns = [
     path('token/', MyTokenObtainPairView.as_view(), name='token_obtain_pair'),
     path('token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
     
     path('register/', RegisterView.as_view(), name='register'),
-    path('profile/', ProfileView.as_view(), name='profile'),
+    path('profile/', perfil, name='profile'),
     path('mi-plan/', MiPlanView.as_view(), name='mi_plan'),
     
     # Asegúrate de tener esta vista importada si usas esta ruta
@@ -67,6 +56,7 @@ urlpatterns = [
     path('historial-pedidos/', HistorialPedidosView.as_view(), name='historial_pedidos'),
 
     path('pedido/<int:pedido_id>/boleta/', descargar_boleta, name='descargar_boleta'),
+    path('boletas/exportar/', exportar_boletas, name='exportar_boletas'),
 
     path('webpay/create/', webpay_create, name='webpay_create'),
     path('webpay/return/', webpay_return, name='webpay_return'),
@@ -76,10 +66,27 @@ urlpatterns = [
     path('carrito/item/<int:item_id>/actualizar/', actualizar_item_carrito, name='actualizar_item_carrito'),
     path('carrito/item/<int:item_id>/eliminar/', eliminar_item_carrito, name='eliminar_item_carrito'),
     path('carrito/vaciar/', vaciar_carrito, name='vaciar_carrito'),
+    path('carrito/batch/', carrito_batch, name='carrito_batch'),
+    path('carrito/invitado/', carrito_invitado, name='carrito_invitado'),
     
     path('productos/<int:producto_id>/reviews/', product_reviews, name='product-reviews'),
 
     path('reviews/<int:review_id>/moderate/', moderate_review_detail, name='moderate-review-detail'),
 
+    path('cache/estadisticas/', estadisticas_cache, name='estadisticas_cache'),
+
+    path('reportes/ventas/', reporte_ventas, name='reporte_ventas'),
+    path('reportes/top-productos/', reporte_top_productos, name='reporte_top_productos'),
+    path('reportes/mrr/', reporte_mrr, name='reporte_mrr'),
+    path('exportar/pedidos/', exportar_pedidos, name='exportar_pedidos'),
+    path('exportar/suscripciones/', exportar_suscripciones, name='exportar_suscripciones'),
+    path('exportar/usuarios/', exportar_usuarios, name='exportar_usuarios'),
+
+    # Deben ir antes del router para que "stream", etc. no se tomen como pk
+    path('notificaciones/stream/', notificaciones_stream, name='notificaciones_stream'),
+    path('notificaciones/stream/ticket/', ticket_stream_notificaciones, name='ticket_stream_notificaciones'),
+    path('notificaciones/marcar_todas_leidas/', marcar_todas_leidas, name='marcar_todas_leidas'),
+    path('notificaciones/unread-count/', notificaciones_no_leidas, name='notificaciones_no_leidas'),
+
     path('', include(router.urls)),
 ]
\ No newline at end of file
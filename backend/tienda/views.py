@@ -1,59 +1,116 @@
 # Pega esto AL INICIO de backend/tienda/views.py, antes de las clases
 
+from datetime import datetime, timedelta
+
 from rest_framework import viewsets, status
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated, IsAuthenticatedOrReadOnly, IsAdminUser, AllowAny
-from rest_framework.parsers import MultiPartParser, FormParser, JSONParser
 from rest_framework_simplejwt.views import TokenObtainPairView
 from django.contrib.auth.models import User
-from django.db.models import Avg, Sum 
+from django.db import transaction
+from django.db.models import (
+    Prefetch, Count, Max, Sum, Q, F, Exists, OuterRef, ExpressionWrapper, BooleanField,
+)
+from django.utils.decorators import method_decorator
 from rest_framework.decorators import api_view, permission_classes, action
+from rest_framework.exceptions import ValidationError
+from rest_framework.filters import SearchFilter, OrderingFilter
 import json 
+import asyncio
+import hashlib
+import secrets
+from concurrent.futures import TimeoutError as FuturesTimeout
+from django.http import JsonResponse, StreamingHttpResponse
 from django.shortcuts import get_object_or_404
+from django.conf import settings
+from django.utils.dateparse import parse_date
+from django.utils import timezone
+from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
 
 # --- Importación de Modelos ---
 from .models import (
     Profile, Producto, Plan, Suscripcion, Carrito, CarritoItem,
-<<<<<<< HEAD
-<<<<<<< HEAD
-<<<<<<< HEAD
-    Pedido, PedidoItem, Review, Noticia, Notificacion, ProductoImagen
-=======
-    Pedido, PedidoItem, Review # <-- AÑADIDO Review
->>>>>>> parent of 281861c (se añadió el blog y sus respectivas funciones)
-=======
-    Pedido, PedidoItem, Review # <-- AÑADIDO Review
->>>>>>> parent of 281861c (se añadió el blog y sus respectivas funciones)
-=======
-    Pedido, PedidoItem, Review # <-- AÑADIDO Review
->>>>>>> parent of 281861c (se añadió el blog y sus respectivas funciones)
+    Pedido, PedidoItem, Review, Noticia, Notificacion, ProductoImagen,
+    EstadoNotificaciones, TicketStream,
 )
 # --- Importación de Serializers ---
 from .serializers import (
     RegisterSerializer, ProfileSerializer, MyTokenObtainPairSerializer, 
     ProductoSerializer, PlanSerializer, SuscripcionSerializer, 
     CarritoSerializer, CarritoItemSerializer,
-<<<<<<< HEAD
-<<<<<<< HEAD
-<<<<<<< HEAD
-    PedidoSerializer, ReviewSerializer, NoticiaSerializer, NotificacionSerializer
-=======
-    PedidoSerializer, ReviewSerializer # <-- AÑADIDO ReviewSerializer
->>>>>>> parent of 281861c (se añadió el blog y sus respectivas funciones)
-=======
-    PedidoSerializer, ReviewSerializer # <-- AÑADIDO ReviewSerializer
->>>>>>> parent of 281861c (se añadió el blog y sus respectivas funciones)
-=======
-    PedidoSerializer, ReviewSerializer # <-- AÑADIDO ReviewSerializer
->>>>>>> parent of 281861c (se añadió el blog y sus respectivas funciones)
+    PedidoSerializer, ReviewSerializer, NoticiaSerializer, NotificacionSerializer,
+    ProfileAdminSerializer,
+)
+from .utils import ErrorPDF
+from .boletas import cargar_pedido, obtener_boleta, pdf_boletas, servir_pdf, zip_boletas
+from .pagination import ProductoCursorPagination, UsuarioCursorPagination
+from .cache import CachedReadMixin, estadisticas, etag_de, etag_condicional
+from .eventos import fanout_notificaciones, formatear_evento, publicar, receptor_notificaciones
+from .imagenes import SubidaConHash, agregar_galeria, borrar_variantes
+from .carrito import (
+    OperacionInvalida, aplicar_operaciones, aplicar_operaciones_invitado, carrito_con_items,
+    detalle_invitado, fijar_cantidad, firmar_invitado, fusionar_invitado, obtener_invitado,
+    resumen, sumar_al_carrito,
 )
-from .utils import render_to_pdf
+from .reservas import StockInsuficiente
+from .asincrono import api_async, en_hilo, usuario_jwt
+from .routers import en_primaria
+
+# --- ETAGS BARATOS PARA GET CONDICIONAL ---
+# Un solo aggregate por petición (conteos y máximos); nunca se serializa el cuerpo
+# para saber si cambió. Incluyen el usuario y la ruta porque el contenido es personal.
+
+def _etag_suscripciones(request, *args, **kwargs):
+    resumen = Suscripcion.objects.filter(user=request.user).aggregate(
+        total=Count('id'), ultima=Max('id'),
+        activas=Count('id', filter=Q(activa=True)),
+        # Cambia al pasar la fecha aunque el cron todavía no la haya vencido
+        vigentes=Count('id', filter=Q(activa=True, fecha_vencimiento__gt=timezone.now())),
+        vencimiento=Max('fecha_vencimiento'), plan=Max('plan__actualizado_en'),
+    )
+    return etag_de(request.path, request.user.id, *resumen.values())
+
+def _etag_pedidos(request, *args, **kwargs):
+    resumen = Pedido.objects.filter(user=request.user).aggregate(
+        total=Count('id', distinct=True), ultimo=Max('id'),
+        pagados=Count('id', filter=Q(estado='PAGADO'), distinct=True),
+        producto=Max('items__producto__actualizado_en'),
+    )
+    return etag_de(request.path, request.user.id, *resumen.values())
+
+def _etag_carrito(request, *args, **kwargs):
+    resumen = CarritoItem.objects.filter(carrito__user=request.user).aggregate(
+        total=Count('id'), unidades=Sum('cantidad'),
+        firma=Sum(F('id') * F('cantidad')), producto=Max('producto__actualizado_en'),
+    )
+    return etag_de(request.path, request.user.id, *resumen.values())
+
+def _etag_notificaciones(request, *args, **kwargs):
+    resumen = _notificaciones_visibles(request.user).aggregate(
+        total=Count('id', distinct=True), ultima=Max('actualizado_en'),
+        leidas=Count('id', filter=Q(leido_por=request.user), distinct=True),
+    )
+    return etag_de(request.path, request.user.id, _ultima_leida(request.user), *resumen.values())
+
 
 # --- VISTA DE AUTENTICACIÓN ---
 class MyTokenObtainPairView(TokenObtainPairView):
     serializer_class = MyTokenObtainPairSerializer
 
+    def post(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        try:
+            serializer.is_valid(raise_exception=True)
+        except TokenError as e:
+            raise InvalidToken(e.args[0])
+        data = dict(serializer.validated_data)
+        # Si el visitante armó un carrito antes de entrar, se fusiona con el suyo
+        token_invitado = request.data.get('carrito_invitado')
+        if token_invitado:
+            data['carrito_fusionado'] = fusionar_invitado(serializer.user, token_invitado)
+        return Response(data, status=status.HTTP_200_OK)
+
 # --- VISTA DE REGISTRO ---
 class RegisterView(APIView):
     def post(self, request):
@@ -65,41 +122,43 @@ class RegisterView(APIView):
         return Response(serializer.errors, status=400)
 
 # --- VISTA DE PERFIL (CLIENTE/ADMIN) ---
-class ProfileView(APIView):
-    permission_classes = [IsAuthenticated]
-    parser_classes = (MultiPartParser, FormParser, JSONParser)
-    def get_object(self, user):
-        try: return Profile.objects.get(user=user)
-        except Profile.DoesNotExist: return None
-    def get(self, request):
-        profile = self.get_object(request.user)
-        if not profile: return Response({"error": "Perfil no encontrado"}, status=404)
-        return Response(ProfileSerializer(profile).data)
-    def patch(self, request):
-        profile = self.get_object(request.user)
-        if not profile: return Response({"error": "Perfil no encontrado"}, status=404)
-        serializer = ProfileSerializer(profile, data=request.data, partial=True)
-        if serializer.is_valid():
-            serializer.save()
-            return Response(serializer.data)
-        return Response(serializer.errors, status=400)
+def _actualizar_perfil(profile, data):
+    serializer = ProfileSerializer(profile, data=data, partial=True)
+    if serializer.is_valid():
+        serializer.save()
+        return serializer.data, 200
+    return serializer.errors, 400
+
+@api_async('GET', 'PATCH')
+async def perfil(request):
+    try:
+        profile = await Profile.objects.select_related('user').aget(user=request.user)
+    except Profile.DoesNotExist:
+        return JsonResponse({"error": "Perfil no encontrado"}, status=404)
+    if request.method == 'GET':
+        return JsonResponse(ProfileSerializer(profile).data)
+    # Guardar el avatar (y sus variantes) y el usuario va en un hilo
+    data, estado = await en_hilo(_actualizar_perfil, profile, request.data)
+    return JsonResponse(data, status=estado)
 
 # --- VISTA DE GESTIÓN DE USUARIOS (ADMIN) ---
 class UserAdminViewSet(viewsets.ModelViewSet):
-    queryset = Profile.objects.all()
-    serializer_class = ProfileSerializer
+    queryset = Profile.objects.select_related('user')
+    serializer_class = ProfileAdminSerializer
     permission_classes = [IsAuthenticated]
-    def list(self, request, *args, **kwargs):
-        queryset = self.get_queryset()
-        serializer = self.get_serializer(queryset, many=True)
-        data = []
-        for profile, ser_data in zip(queryset, serializer.data):
-            ser_data['activo'] = profile.user.is_active
-            data.append(ser_data)
-        return Response(data)
+    pagination_class = UsuarioCursorPagination
+    # ?search= busca en username, RUT y email; "=role" exige el rol exacto
+    filter_backends = [SearchFilter]
+    search_fields = ['user__username', 'rut', 'user__email', '=role']
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        role = self.request.query_params.get('role')
+        if role:
+            queryset = queryset.filter(role=role)
+        return queryset
     def get_object(self):
         user_id = self.kwargs.get('pk')
-        return get_object_or_404(Profile, user__id=user_id)
+        return get_object_or_404(self.get_queryset(), user__id=user_id)
     def update(self, request, *args, **kwargs):
         profile = self.get_object()
         is_active = request.data.get('is_active')
@@ -120,14 +179,13 @@ class UserAdminViewSet(viewsets.ModelViewSet):
         serializer = self.get_serializer(profile, data=request.data, partial=True)
         serializer.is_valid(raise_exception=True)
         serializer.save()
-        response_data = serializer.data
-        response_data['activo'] = profile.user.is_active
-        return Response(response_data)
+        return Response(serializer.data)
     
 # --- VISTA DE PLANES ---
-class PlanViewSet(viewsets.ModelViewSet):
+class PlanViewSet(CachedReadMixin, viewsets.ModelViewSet):
     queryset = Plan.objects.all()
     serializer_class = PlanSerializer
+    cache_modelos = (Plan,)
     def get_permissions(self):
         if self.action in ['list', 'retrieve']:
             permission_classes = [IsAuthenticatedOrReadOnly]
@@ -138,11 +196,23 @@ class PlanViewSet(viewsets.ModelViewSet):
 # --- VISTA DE MI PLAN ACTUAL ---
 class MiPlanView(APIView):
     permission_classes = [IsAuthenticated]
+    @method_decorator(etag_condicional(_etag_suscripciones))
     def get(self, request):
-        suscripcion = Suscripcion.objects.filter(
-            user=request.user, 
-            activa=True
-        ).order_by('-fecha_vencimiento').first()
+        # Una consulta por clave primaria: el puntero lo mantienen Suscripcion.save
+        # y el cron `vencer_suscripciones`
+        perfil = (
+            Profile.objects.select_related('suscripcion_actual__plan')
+            .filter(user=request.user).first()
+        )
+        if perfil is not None:
+            suscripcion = perfil.suscripcion_actual
+        else:
+            suscripcion = Suscripcion.objects.filter(
+                user=request.user, activa=True
+            ).select_related('plan').order_by('-fecha_vencimiento').first()
+        # Entre el vencimiento y la pasada del cron el puntero aún no se limpió
+        if suscripcion and (not suscripcion.activa or suscripcion.fecha_vencimiento <= timezone.now()):
+            suscripcion = None
         if not suscripcion:
             return Response(None, status=status.HTTP_200_OK) 
         serializer = SuscripcionSerializer(suscripcion)
@@ -151,6 +221,7 @@ class MiPlanView(APIView):
 # --- VISTA DE HISTORIAL DE PLANES ---
 class HistorialPlanesView(APIView):
     permission_classes = [IsAuthenticated]
+    @method_decorator(etag_condicional(_etag_suscripciones))
     def get(self, request):
         suscripciones = Suscripcion.objects.filter(user=request.user).order_by('-fecha_inicio')
         serializer = SuscripcionSerializer(suscripciones, many=True)
@@ -158,22 +229,59 @@ class HistorialPlanesView(APIView):
 
 
 # --- VISTAS DE PRODUCTOS (GESTIÓN Y TIENDA) ---
-class ProductoViewSet(viewsets.ModelViewSet):
+class ProductoViewSet(CachedReadMixin, viewsets.ModelViewSet):
     serializer_class = ProductoSerializer
+    cache_modelos = (Producto, ProductoImagen, Review, PedidoItem)
+    pagination_class = ProductoCursorPagination
+    filter_backends = [SearchFilter, OrderingFilter]
+    search_fields = ['nombre', 'descripcion']
+    ordering_fields = ['creado_en', 'precio', 'nombre', 'total_vendidos']
+    ordering = ('-creado_en', '-id')
 
     def get_queryset(self):
-        if self.request.user.is_staff:
-            return Producto.objects.all()
-        return Producto.objects.filter(activo=True)
+        # Rating y ventas vienen desnormalizados en Producto, así que list y retrieve
+        # cuestan siempre 2 consultas: productos + galería de todos ellos.
+        queryset = Producto.objects.all()
+        if not self.request.user.is_staff:
+            queryset = queryset.filter(activo=True)
+
+        campos = ProductoSerializer.campos_solicitados(self.request)
+        if campos is None or 'imagenes' in campos:
+            queryset = queryset.prefetch_related(
+                Prefetch('imagenes', queryset=ProductoImagen.objects.order_by('id'))
+            )
+        if campos is not None and 'descripcion' not in campos:
+            queryset = queryset.defer('descripcion')
+
+        if self.action == 'list':
+            queryset = self.filtrar_catalogo(queryset)
+        return queryset
+
+    def filtrar_catalogo(self, queryset):
+        params = self.request.query_params
+        try:
+            if params.get('precio_min'):
+                queryset = queryset.filter(precio__gte=int(params['precio_min']))
+            if params.get('precio_max'):
+                queryset = queryset.filter(precio__lte=int(params['precio_max']))
+        except ValueError:
+            raise ValidationError({"error": "precio_min y precio_max deben ser enteros"})
+        if params.get('en_stock') in ('1', 'true', 'True'):
+            queryset = queryset.filter(stock__gt=0)
+        return queryset
+
+    def initialize_request(self, request, *args, **kwargs):
+        # Las subidas van directo a disco calculando su sha256 (ver agregar_galeria)
+        if request.method in ('POST', 'PUT', 'PATCH'):
+            request.upload_handlers = [SubidaConHash(request)]
+        return super().initialize_request(request, *args, **kwargs)
 
     def create(self, request, *args, **kwargs):
         serializer = self.get_serializer(data=request.data)
         serializer.is_valid(raise_exception=True)
         producto = serializer.save()
         
-        imagenes = request.FILES.getlist('imagenes_extra')
-        for img in imagenes:
-            ProductoImagen.objects.create(producto=producto, imagen=img)
+        agregar_galeria(producto, request.FILES.getlist('imagenes_extra'))
 
         headers = self.get_success_headers(serializer.data)
         return Response(serializer.data, status=status.HTTP_201_CREATED, headers=headers)
@@ -207,13 +315,16 @@ class ProductoViewSet(viewsets.ModelViewSet):
         if clear_main and 'imagen' not in request.FILES:
             if producto.imagen:
                 producto.imagen.delete(save=False) 
+            borrar_variantes(producto.imagen_variantes)
             producto.imagen = None
-            producto.save(update_fields=['imagen']) 
+            producto.imagen_variantes = {}
+            producto.save(update_fields=['imagen', 'imagen_variantes']) 
         
-        # 3. AGREGAR IMÁGENES NUEVAS
-        imagenes = request.FILES.getlist('imagenes_extra')
-        for img in imagenes:
-            ProductoImagen.objects.create(producto=producto, imagen=img)
+        # 3. AGREGAR IMÁGENES NUEVAS (las repetidas se omiten)
+        agregar_galeria(producto, request.FILES.getlist('imagenes_extra'))
+
+        # La galería venía precargada desde get_queryset; la descartamos para responder con la actual
+        producto._prefetched_objects_cache = {}
 
         return Response(serializer.data)
 
@@ -226,94 +337,145 @@ class ProductoViewSet(viewsets.ModelViewSet):
 
 
 # --- VISTAS DE CARRITO ---
-@api_view(['GET'])
-@permission_classes([IsAuthenticated])
-def obtener_carrito(request):
-    carrito, created = Carrito.objects.get_or_create(user=request.user)
-    serializer = CarritoSerializer(carrito)
-    return Response(serializer.data)
-
-@api_view(['POST'])
-@permission_classes([IsAuthenticated])
-def agregar_al_carrito(request):
+# Async: las transacciones con lock y la serialización (que lee ítems y productos)
+# corren en un hilo con tope; las lecturas simples usan el ORM async.
+def _carrito_serializado(user):
+    return CarritoSerializer(carrito_con_items(user)).data
+
+@api_async('GET')
+@etag_condicional(_etag_carrito)
+async def obtener_carrito(request):
+    return JsonResponse(await en_hilo(_carrito_serializado, request.user))
+
+@api_async('POST')
+async def agregar_al_carrito(request):
     producto_id = request.data.get('producto_id')
-    cantidad = int(request.data.get('cantidad', 1))
+    try:
+        cantidad = int(request.data.get('cantidad', 1))
+    except (TypeError, ValueError):
+        cantidad = 0
     
     if not producto_id:
-        return Response({"error": "producto_id es requerido"}, status=status.HTTP_400_BAD_REQUEST)
+        return JsonResponse({"error": "producto_id es requerido"}, status=status.HTTP_400_BAD_REQUEST)
+    if cantidad < 1:
+        return JsonResponse({"error": "cantidad debe ser un entero mayor a 0"}, status=status.HTTP_400_BAD_REQUEST)
 
-    try:
-        producto = Producto.objects.get(id=producto_id)
-    except Producto.DoesNotExist:
-        return Response({"error": "Producto no encontrado"}, status=status.HTTP_404_NOT_FOUND)
+    if not await Producto.objects.filter(id=producto_id).aexists():
+        return JsonResponse({"error": "Producto no encontrado"}, status=status.HTTP_404_NOT_FOUND)
 
-    carrito, created = Carrito.objects.get_or_create(user=request.user)
-    
-    carrito_item, created = CarritoItem.objects.get_or_create(
-        carrito=carrito, 
-        producto=producto
-    )
-    
-    if not created:
-        carrito_item.cantidad += cantidad
-    else:
-        carrito_item.cantidad = cantidad
-    
-    carrito_item.save()
+    try:
+        await en_hilo(sumar_al_carrito, request.user, producto_id, cantidad)
+    except StockInsuficiente as e:
+        return JsonResponse({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
     
-    serializer = CarritoSerializer(carrito)
-    return Response(serializer.data, status=status.HTTP_201_CREATED)
+    return JsonResponse(await en_hilo(_carrito_serializado, request.user), status=status.HTTP_201_CREATED)
 
-@api_view(['PATCH'])
-@permission_classes([IsAuthenticated])
-def actualizar_item_carrito(request, item_id):
+@api_async('PATCH')
+async def actualizar_item_carrito(request, item_id):
     try:
-        item = CarritoItem.objects.get(id=item_id, carrito__user=request.user)
+        item = await CarritoItem.objects.aget(id=item_id, carrito__user=request.user)
     except CarritoItem.DoesNotExist:
-        return Response({"error": "Item no encontrado"}, status=status.HTTP_404_NOT_FOUND)
+        return JsonResponse({"error": "Item no encontrado"}, status=status.HTTP_404_NOT_FOUND)
 
-    cantidad = int(request.data.get('cantidad', item.cantidad))
+    try:
+        cantidad = int(request.data.get('cantidad', item.cantidad))
+    except (TypeError, ValueError):
+        return JsonResponse({"error": "cantidad debe ser un entero"}, status=status.HTTP_400_BAD_REQUEST)
     
     if cantidad <= 0:
-        item.delete()
+        await item.adelete()
     else:
-        item.cantidad = cantidad
-        item.save()
+        try:
+            await en_hilo(fijar_cantidad, item, cantidad)
+        except StockInsuficiente as e:
+            return JsonResponse({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
     
-    carrito = Carrito.objects.get(user=request.user)
-    serializer = CarritoSerializer(carrito)
-    return Response(serializer.data)
+    return JsonResponse(await en_hilo(_carrito_serializado, request.user))
 
-@api_view(['DELETE'])
-@permission_classes([IsAuthenticated])
-def eliminar_item_carrito(request, item_id):
+@api_async('DELETE')
+async def eliminar_item_carrito(request, item_id):
     try:
-        item = CarritoItem.objects.get(id=item_id, carrito__user=request.user)
+        item = await CarritoItem.objects.aget(id=item_id, carrito__user=request.user)
     except CarritoItem.DoesNotExist:
-        return Response({"error": "Item no encontrado"}, status=status.HTTP_404_NOT_FOUND)
+        return JsonResponse({"error": "Item no encontrado"}, status=status.HTTP_404_NOT_FOUND)
     
-    item.delete()
+    await item.adelete()
     
-    carrito = Carrito.objects.get(user=request.user)
-    serializer = CarritoSerializer(carrito)
-    return Response(serializer.data)
+    return JsonResponse(await en_hilo(_carrito_serializado, request.user))
 
-@api_view(['POST'])
-@permission_classes([IsAuthenticated])
-def vaciar_carrito(request):
+@api_async('POST')
+async def vaciar_carrito(request):
     try:
-        carrito = Carrito.objects.get(user=request.user)
-        carrito.items.all().delete()
-        serializer = CarritoSerializer(carrito)
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        carrito = await Carrito.objects.aget(user=request.user)
+        await carrito.items.all().adelete()
+        return JsonResponse(await en_hilo(_carrito_serializado, request.user), status=status.HTTP_200_OK)
     except Carrito.DoesNotExist:
-        return Response({"error": "Carrito no encontrado"}, status=status.HTTP_404_NOT_FOUND)
+        return JsonResponse({"error": "Carrito no encontrado"}, status=status.HTTP_404_NOT_FOUND)
     except Exception as e:
-        return Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+        return JsonResponse({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+def _respuesta_batch(user, operaciones, completo):
+    items, eliminados, carrito = aplicar_operaciones(user, operaciones)
+    if completo:
+        return _carrito_serializado(user)
+    return {
+        "id": carrito.id,
+        "actualizados": CarritoItemSerializer(items, many=True).data,
+        "eliminados": eliminados,
+        **resumen(carrito.id),
+    }
+
+@api_async('POST')
+async def carrito_batch(request):
+    """
+    Varias operaciones sobre el carrito en una petición y una transacción:
+    {"operaciones": [{"op": "add"|"set"|"remove", "producto_id": 1, "cantidad": 2}, ...]}
+    Responde solo lo que cambió (ítems modificados, productos eliminados y el
+    nuevo total); con ?completo=1 devuelve el carrito entero.
+    """
+    try:
+        datos = await en_hilo(
+            _respuesta_batch, request.user, request.data.get('operaciones'),
+            request.GET.get('completo') in ('1', 'true'),
+        )
+    except OperacionInvalida as e:
+        return JsonResponse({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    return JsonResponse(datos)
+
+# --- CARRITO DE INVITADO (SIN CUENTA) ---
+def _respuesta_invitado(carrito):
+    items, total = detalle_invitado(carrito)
+    return {
+        "token": firmar_invitado(carrito) if carrito else None,
+        "items": CarritoItemSerializer(items, many=True).data,
+        "total": total,
+    }
+
+def _obtener_invitado(token):
+    return _respuesta_invitado(obtener_invitado(token))
+
+def _operar_invitado(token, operaciones):
+    return _respuesta_invitado(aplicar_operaciones_invitado(token, operaciones))
+
+@api_async('GET', 'POST', autenticado=False)
+async def carrito_invitado(request):
+    """
+    Carrito del token en el header X-Carrito-Invitado. POST recibe las mismas
+    operaciones que /carrito/batch/, crea el carrito si no hay uno vigente y
+    devuelve el token que el cliente debe guardar y mandar al iniciar sesión.
+    """
+    token = request.headers.get('X-Carrito-Invitado')
+    if request.method == 'GET':
+        return JsonResponse(await en_hilo(_obtener_invitado, token))
+    try:
+        return JsonResponse(await en_hilo(_operar_invitado, token, request.data.get('operaciones')))
+    except OperacionInvalida as e:
+        return JsonResponse({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
 # --- VISTAS DE PEDIDO / BOLETA ---
 class HistorialPedidosView(APIView):
     permission_classes = [IsAuthenticated]
+    @method_decorator(etag_condicional(_etag_pedidos))
     def get(self, request):
         pedidos = Pedido.objects.filter(user=request.user).order_by('-creado_en')
         serializer = PedidoSerializer(pedidos, many=True, context={'request': request})
@@ -322,17 +484,71 @@ class HistorialPedidosView(APIView):
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def descargar_boleta(request, pedido_id):
-    pedido = get_object_or_404(Pedido, id=pedido_id)
-    if pedido.user != request.user and not request.user.is_staff:
+    try:
+        pedido = cargar_pedido(pedido_id)
+    except Pedido.DoesNotExist:
+        return Response({"error": "Pedido no encontrado"}, status=status.HTTP_404_NOT_FOUND)
+    if pedido.user_id != request.user.id and not request.user.is_staff:
         return Response({"error": "No autorizado"}, status=status.HTTP_403_FORBIDDEN)
-    context = {
-        'pedido': pedido,
-    }
-    # Aseguramos que los subtotales se calculen para el template PDF
-    for item in context['pedido'].items.all():
-        item.subtotal = item.cantidad * item.precio_al_momento_compra 
-    pdf = render_to_pdf('tienda/boleta.html', context)
-    return pdf
+    try:
+        digest, ruta = obtener_boleta(pedido)
+    except ErrorPDF as e:
+        return Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+    except FuturesTimeout:
+        return Response(
+            {"error": "La boleta se está generando, intenta en unos segundos"},
+            status=status.HTTP_503_SERVICE_UNAVAILABLE, headers={'Retry-After': '5'},
+        )
+    return servir_pdf(request, ruta, digest, f"boleta-pedido-{pedido.id}.pdf")
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])  # admin y contadora (ambos is_staff)
+def exportar_boletas(request):
+    """
+    Boletas de pedidos pagados en un solo archivo, para el cierre de mes.
+    ?desde=AAAA-MM-DD&hasta=AAAA-MM-DD&user=<id>&formato=zip|pdf
+    """
+    pedidos = Pedido.objects.filter(estado='PAGADO').order_by('creado_en', 'id')
+    # Rango sobre creado_en tal cual (no creado_en__date) para que use el índice pedido_pagado_fecha
+    filtros = {'desde': ('creado_en__gte', 0), 'hasta': ('creado_en__lt', 1)}
+    for param, (lookup, dias) in filtros.items():
+        valor = request.query_params.get(param)
+        if valor:
+            try:
+                fecha = parse_date(valor)
+            except ValueError:
+                fecha = None
+            if fecha is None:
+                return Response({"error": f"'{param}' debe tener formato AAAA-MM-DD"}, status=status.HTTP_400_BAD_REQUEST)
+            inicio = timezone.make_aware(datetime.combine(fecha + timedelta(days=dias), datetime.min.time()))
+            pedidos = pedidos.filter(**{lookup: inicio})
+    user_id = request.query_params.get('user')
+    if user_id:
+        if not user_id.isdigit():
+            return Response({"error": "'user' debe ser un id"}, status=status.HTTP_400_BAD_REQUEST)
+        pedidos = pedidos.filter(user_id=user_id)
+    if not any(request.query_params.get(p) for p in ('desde', 'hasta', 'user')):
+        return Response({"error": "Indica un rango de fechas y/o un usuario"}, status=status.HTTP_400_BAD_REQUEST)
+
+    formato = request.query_params.get('formato', 'zip')
+    if formato == 'pdf':
+        total = pedidos.count()
+        if total > settings.BOLETAS_EXPORT_MAX_PDF:
+            return Response(
+                {"error": f"Son {total} boletas; en PDF el máximo es {settings.BOLETAS_EXPORT_MAX_PDF}. Usa formato=zip."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        response = StreamingHttpResponse(pdf_boletas(pedidos), content_type='application/pdf')
+    elif formato == 'zip':
+        response = StreamingHttpResponse(zip_boletas(pedidos), content_type='application/zip')
+    else:
+        return Response({"error": "formato debe ser 'zip' o 'pdf'"}, status=status.HTTP_400_BAD_REQUEST)
+
+    nombre = '-'.join(
+        ['boletas'] + [request.query_params[p] for p in ('desde', 'hasta') if request.query_params.get(p)]
+    )
+    response['Content-Disposition'] = f'attachment; filename="{nombre}.{formato}"'
+    return response
 
 
 # --- VISTAS DE RESEÑAS ---
@@ -346,6 +562,7 @@ def product_reviews(request, producto_id):
             reviews = Review.objects.filter(producto=producto).order_by('-creado_en')
         else:
             reviews = Review.objects.filter(producto=producto, is_visible=True).order_by('-creado_en')
+        reviews = reviews.select_related('user')
             
         serializer = ReviewSerializer(reviews, many=True, context={'request': request})
         return Response(serializer.data)
@@ -374,17 +591,43 @@ def moderate_review_detail(request, review_id):
         serializer.save()
         return Response(serializer.data)
     
-<<<<<<< HEAD
-<<<<<<< HEAD
-<<<<<<< HEAD
     return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
 # --- VISTAS DE NOTIFICACIONES ---
+def _ultima_leida(user):
+    return (
+        EstadoNotificaciones.objects.filter(user=user)
+        .values_list('ultima_leida_id', flat=True).first()
+    ) or 0
+
+def _notificaciones_visibles(user, queryset=None):
+    """Las globales más las dirigidas al usuario (avisos de su suscripción)."""
+    if queryset is None:
+        queryset = Notificacion.objects.all()
+    return queryset.filter(Q(destinatario__isnull=True) | Q(destinatario=user))
+
+def _notificaciones_con_lectura(user, queryset=None):
+    """Anota `leida` con una sola subconsulta: bajo la marca del usuario o en leido_por."""
+    queryset = _notificaciones_visibles(user, queryset)
+    leidas_m2m = Notificacion.leido_por.through.objects.filter(
+        notificacion=OuterRef('pk'), user=user
+    )
+    return queryset.annotate(leida=ExpressionWrapper(
+        Q(id__lte=_ultima_leida(user)) | Exists(leidas_m2m),
+        output_field=BooleanField(),
+    ))
+
 class NotificacionViewSet(viewsets.ModelViewSet):
     queryset = Notificacion.objects.all().order_by('-creado_en')
     serializer_class = NotificacionSerializer
     pagination_class = None 
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.request.user.is_authenticated:
+            return _notificaciones_con_lectura(self.request.user, queryset)
+        return queryset
     
     def get_permissions(self):
         if self.action in ['list', 'retrieve']:
@@ -394,20 +637,160 @@ class NotificacionViewSet(viewsets.ModelViewSet):
     def list(self, request, *args, **kwargs):
         if not request.user.is_authenticated:
             return Response({'detail': 'No autenticado'}, status=status.HTTP_401_UNAUTHORIZED)
+        return self._list_condicional(request, *args, **kwargs)
+
+    @method_decorator(etag_condicional(_etag_notificaciones))
+    def _list_condicional(self, request, *args, **kwargs):
         return super().list(request, *args, **kwargs)
 
-@api_view(['POST'])
-@permission_classes([IsAuthenticated])
-def marcar_todas_leidas(request):
+def _marcar_todas_leidas(user):
+    LeidoPor = Notificacion.leido_por.through
+    with transaction.atomic():
+        # Escritura primero: toma el lock de escritura (SQLite) antes de leer
+        EstadoNotificaciones.objects.filter(user=user).update(ultima_leida_id=F('ultima_leida_id'))
+        estado, _ = EstadoNotificaciones.objects.select_for_update().get_or_create(user=user)
+        tope = Notificacion.objects.aggregate(tope=Max('id'))['tope'] or 0
+        if tope <= estado.ultima_leida_id:
+            return
+
+        # Solo hace falta mirar lo posterior a la marca anterior
+        nuevas = list(
+            _notificaciones_visibles(user).filter(id__gt=estado.ultima_leida_id, id__lte=tope)
+            .exclude(leido_por=user).values_list('id', flat=True)
+        )
+        if nuevas:
+            # Un solo INSERT en la tabla intermedia (bulk_create no dispara m2m_changed)
+            LeidoPor.objects.bulk_create(
+                [LeidoPor(notificacion_id=notif_id, user_id=user.id) for notif_id in nuevas],
+                ignore_conflicts=True,
+            )
+            transaction.on_commit(lambda: publicar(
+                'leida', {'ids': nuevas}, user_ids={user.id}
+            ))
+        estado.ultima_leida_id = tope
+        estado.save(update_fields=['ultima_leida_id'])
+
+@api_async('POST')
+async def marcar_todas_leidas(request):
+    await en_hilo(_marcar_todas_leidas, request.user)
+    return JsonResponse({"status": "ok", "message": "Todas marcadas como leídas"})
+
+@api_async('GET')
+async def notificaciones_no_leidas(request):
     user = request.user
-    notificaciones_no_leidas = Notificacion.objects.exclude(leido_por=user)
-    for notif in notificaciones_no_leidas:
-        notif.leido_por.add(user)
-    return Response({"status": "ok", "message": "Todas marcadas como leídas"})
+    ultima_leida = await (
+        EstadoNotificaciones.objects.filter(user=user).values_list('ultima_leida_id', flat=True).afirst()
+    ) or 0
+    # Solo se cuentan las posteriores a la marca, sin recorrer todo leido_por
+    no_leidas = await (
+        _notificaciones_visibles(user).filter(id__gt=ultima_leida)
+        .exclude(leido_por=user).acount()
+    )
+    return JsonResponse({"no_leidas": no_leidas})
+
+# --- STREAM DE NOTIFICACIONES (Server-Sent Events, requiere ASGI) ---
+# Reemplaza el polling cada 10 s: la conexión queda abierta y solo viaja algo cuando
+# se crea una notificación o el usuario marca como leídas. En ASGI cada conexión
+# inactiva es una corrutina esperando su cola, no un hilo.
+SSE_HEARTBEAT_SEGUNDOS = 25
+SSE_MAX_PENDIENTES = 200
+
+def _notificaciones_pendientes(request, desde_id):
+    pendientes = _notificaciones_con_lectura(
+        request.user, Notificacion.objects.filter(id__gt=desde_id).order_by('id')
+    )[:SSE_MAX_PENDIENTES]
+    return NotificacionSerializer(pendientes, many=True, context={'request': request}).data
+
+# EventSource no permite cabeceras propias y una URL con el JWT quedaría en logs
+# e historial: el navegador pide antes un ticket de un solo uso (POST con su JWT)
+# que vence a los SSE_TICKET_SEGUNDOS. Vive en la BD (TicketStream), compartida
+# por todos los workers.
+SSE_TICKET_SEGUNDOS = 30
+
+def _clave_ticket(ticket):
+    return hashlib.sha256(ticket.encode('utf-8')).hexdigest()
+
+def _emitir_ticket(user):
+    ticket = secrets.token_urlsafe(32)
+    ahora = timezone.now()
+    TicketStream.objects.filter(expira_en__lte=ahora).delete()
+    TicketStream.objects.create(
+        clave=_clave_ticket(ticket), user=user, expira_en=ahora + timedelta(seconds=SSE_TICKET_SEGUNDOS),
+    )
+    return ticket
+
+@api_async('POST')
+async def ticket_stream_notificaciones(request):
+    ticket = await en_hilo(_emitir_ticket, request.user)
+    return JsonResponse({'ticket': ticket, 'expira_en': SSE_TICKET_SEGUNDOS})
+
+def _canjear_ticket(ticket):
+    """user_id del ticket, o None si no existe, venció o ya se usó."""
+    fila = TicketStream.objects.filter(
+        clave=_clave_ticket(ticket), expira_en__gt=timezone.now(),
+    ).values_list('id', 'user_id').first()
+    # Si dos conexiones llegan con el mismo ticket solo una logra borrarlo
+    if fila is None or not TicketStream.objects.filter(id=fila[0]).delete()[0]:
+        return None
+    return fila[1]
+
+@en_primaria  # Un ticket recién emitido puede no estar aún en la réplica
+async def notificaciones_stream(request):
+    # Navegador: ?ticket= (ver ticket_stream_notificaciones). Otros clientes: Authorization
+    ticket = request.GET.get('ticket')
+    if ticket:
+        user_id = await en_hilo(_canjear_ticket, ticket)
+        user = user_id and await User.objects.filter(id=user_id, is_active=True).afirst()
+    else:
+        auth = request.headers.get('Authorization', '')
+        user = await usuario_jwt(auth.removeprefix('Bearer ').strip()) if auth.startswith('Bearer ') else None
+    if user is None:
+        return JsonResponse({'detail': 'No autenticado'}, status=401)
+    request.user = user
 
-class NoticiaViewSet(viewsets.ModelViewSet):
+    ultimo_id = request.headers.get('Last-Event-ID') or request.GET.get('last_event_id')
+    try:
+        ultimo_id = int(ultimo_id) if ultimo_id else None
+    except ValueError:
+        ultimo_id = None
+
+    # Suscribimos antes de leer lo pendiente para no perder nada en medio
+    receptor_notificaciones.iniciar()
+    suscriptor = fanout_notificaciones.suscribir(user.id)
+
+    async def eventos():
+        ultimo = ultimo_id
+        try:
+            yield "retry: 5000\n\n"
+            if ultimo is not None:
+                for data in await en_hilo(_notificaciones_pendientes, request, ultimo):
+                    yield formatear_evento('notificacion', data, data['id'])
+                    ultimo = data['id']
+            while True:
+                try:
+                    item = await asyncio.wait_for(suscriptor.cola.get(), timeout=SSE_HEARTBEAT_SEGUNDOS)
+                except asyncio.TimeoutError:
+                    yield ": ping\n\n"
+                    continue
+                if item is None:
+                    break
+                event_id, mensaje = item
+                if event_id is not None and ultimo is not None and event_id <= ultimo:
+                    continue
+                yield mensaje
+        finally:
+            fanout_notificaciones.cancelar(suscriptor)
+
+    response = StreamingHttpResponse(eventos(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+class NoticiaViewSet(CachedReadMixin, viewsets.ModelViewSet):
     queryset = Noticia.objects.all().order_by('-creado_en')
     serializer_class = NoticiaSerializer
+    cache_modelos = (Noticia,)
 
     def get_permissions(self):
         if self.action in ['list', 'retrieve']:
@@ -415,12 +798,10 @@ class NoticiaViewSet(viewsets.ModelViewSet):
         else:
             permission_classes = [IsAdminUser]
         return [permission() for permission in permission_classes]
-=======
-    return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
->>>>>>> parent of 281861c (se añadió el blog y sus respectivas funciones)
-=======
-    return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
->>>>>>> parent of 281861c (se añadió el blog y sus respectivas funciones)
-=======
-    return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
->>>>>>> parent of 281861c (se añadió el blog y sus respectivas funciones)
+
+
+# --- ESTADÍSTICAS DE CACHE (ADMIN) ---
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def estadisticas_cache(request):
+    return Response(estadisticas(['producto', 'plan', 'noticia']))
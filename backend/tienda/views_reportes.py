@@ -0,0 +1,226 @@
+from datetime import timedelta
+
+from dateutil.relativedelta import relativedelta
+from django.db.models import Sum
+from django.db.models.functions import TruncMonth, TruncWeek
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.exceptions import ValidationError
+from rest_framework.permissions import IsAdminUser
+from rest_framework.response import Response
+
+from . import exportaciones
+from .models import Pedido, Plan, Profile, ResumenPlanDiario, ResumenProductoDiario, ResumenVentasDiario
+from .reportes import CAMPOS_VENTAS
+
+
+# --- REPORTES (ADMIN / CONTADORA) ---
+# Solo leen los resúmenes diarios: el costo depende del rango pedido, no de
+# cuántos pedidos haya en la historia.
+
+AGRUPACIONES = {'semana': TruncWeek, 'mes': TruncMonth}
+
+
+def _fecha(request, nombre, por_defecto):
+    valor = request.query_params.get(nombre)
+    if not valor:
+        return por_defecto
+    try:
+        fecha = parse_date(valor)
+    except ValueError:
+        fecha = None
+    if fecha is None:
+        raise ValidationError({"error": f"'{nombre}' debe tener formato AAAA-MM-DD"})
+    return fecha
+
+def _rango(request, dias=30):
+    hasta = _fecha(request, 'hasta', timezone.localdate())
+    desde = _fecha(request, 'desde', hasta - timedelta(days=dias - 1))
+    if desde > hasta:
+        raise ValidationError({"error": "'desde' no puede ser posterior a 'hasta'"})
+    return desde, hasta
+
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def reporte_ventas(request):
+    """Serie de ventas, suscripciones y pagos fallidos. ?desde&hasta&agrupar=dia|semana|mes"""
+    desde, hasta = _rango(request)
+    agrupar = request.query_params.get('agrupar', 'dia')
+    if agrupar != 'dia' and agrupar not in AGRUPACIONES:
+        raise ValidationError({"error": "agrupar debe ser 'dia', 'semana' o 'mes'"})
+
+    campos = CAMPOS_VENTAS + ('pagos_fallidos',)
+    resumenes = ResumenVentasDiario.objects.filter(fecha__range=(desde, hasta))
+    if agrupar == 'dia':
+        serie = list(resumenes.order_by('fecha').values('fecha', *campos))
+        for fila in serie:
+            fila['periodo'] = fila.pop('fecha')
+    else:
+        serie = list(
+            resumenes.annotate(periodo=AGRUPACIONES[agrupar]('fecha')).values('periodo')
+            .annotate(**{campo: Sum(campo) for campo in campos}).order_by('periodo')
+        )
+
+    totales = {campo: sum(fila[campo] for fila in serie) for campo in campos}
+    return Response({
+        "desde": desde, "hasta": hasta, "agrupar": agrupar,
+        "totales": totales, "serie": serie,
+    })
+
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def reporte_top_productos(request):
+    """Productos más vendidos del rango. ?desde&hasta&limite=10&orden=unidades|ingresos"""
+    desde, hasta = _rango(request)
+    orden = request.query_params.get('orden', 'unidades')
+    if orden not in ('unidades', 'ingresos'):
+        raise ValidationError({"error": "orden debe ser 'unidades' o 'ingresos'"})
+    try:
+        limite = min(max(int(request.query_params.get('limite', 10)), 1), 100)
+    except ValueError:
+        raise ValidationError({"error": "limite debe ser un entero"})
+
+    productos = (
+        ResumenProductoDiario.objects.filter(fecha__range=(desde, hasta))
+        .values('producto_id', 'producto__nombre')
+        .annotate(unidades=Sum('unidades'), ingresos=Sum('ingresos'))
+        .order_by(f'-{orden}', 'producto_id')[:limite]
+    )
+    return Response({
+        "desde": desde, "hasta": hasta, "orden": orden,
+        "productos": [
+            {
+                "producto_id": fila['producto_id'],
+                "nombre": fila['producto__nombre'],
+                "unidades": fila['unidades'],
+                "ingresos": fila['ingresos'],
+            }
+            for fila in productos
+        ],
+    })
+
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def reporte_mrr(request):
+    """
+    MRR por plan al día `fecha` (hoy por defecto): lo cobrado en los últimos
+    `duracion_meses` de cada plan dividido por esa duración. También entrega las
+    altas nuevas y renovadas del mes en curso.
+    """
+    fecha = _fecha(request, 'fecha', timezone.localdate())
+    planes = list(Plan.objects.order_by('id'))
+    if not planes:
+        return Response({"fecha": fecha, "mrr_total": 0, "planes": []})
+
+    inicio_mes = fecha.replace(day=1)
+    ventana = {plan.id: fecha - relativedelta(months=plan.duracion_meses or 1) for plan in planes}
+    desde = min(min(ventana.values()), inicio_mes)
+    datos = {
+        plan.id: {'ingresos': 0, 'suscripciones': 0, 'nuevas_mes': 0, 'renovadas_mes': 0}
+        for plan in planes
+    }
+    for fila in ResumenPlanDiario.objects.filter(fecha__gt=desde, fecha__lte=fecha).values(
+        'plan_id', 'fecha', 'nuevas', 'renovadas', 'ingresos',
+    ):
+        plan = datos.get(fila['plan_id'])
+        if plan is None:
+            continue
+        if fila['fecha'] > ventana[fila['plan_id']]:
+            plan['ingresos'] += fila['ingresos']
+            plan['suscripciones'] += fila['nuevas'] + fila['renovadas']
+        if fila['fecha'] >= inicio_mes:
+            plan['nuevas_mes'] += fila['nuevas']
+            plan['renovadas_mes'] += fila['renovadas']
+
+    resultado = []
+    for plan in planes:
+        meses = plan.duracion_meses or 1
+        resultado.append({
+            "plan_id": plan.id,
+            "nombre": plan.nombre,
+            "precio": plan.precio,
+            "duracion_meses": meses,
+            "suscripciones_vigentes": datos[plan.id]['suscripciones'],
+            "mrr": round(datos[plan.id]['ingresos'] / meses),
+            "nuevas_mes": datos[plan.id]['nuevas_mes'],
+            "renovadas_mes": datos[plan.id]['renovadas_mes'],
+        })
+    return Response({
+        "fecha": fecha,
+        "mrr_total": sum(plan['mrr'] for plan in resultado),
+        "planes": resultado,
+    })
+
+
+# --- EXPORTACIONES CSV / XLSX (ADMIN / CONTADORA) ---
+# Sin rango de fechas se exporta todo: las filas se envían a medida que se leen.
+
+def _formato(request):
+    formato = request.query_params.get('formato', 'csv')
+    if formato not in ('csv', 'xlsx'):
+        raise ValidationError({"error": "formato debe ser 'csv' o 'xlsx'"})
+    if formato == 'xlsx' and exportaciones.xlsxwriter is None:
+        raise ValidationError({"error": "Exportar a XLSX requiere el paquete XlsxWriter"})
+    return formato
+
+def _booleano(request, nombre):
+    valor = request.query_params.get(nombre)
+    if valor in (None, ''):
+        return None
+    if valor.lower() in ('1', 'true', 'si'):
+        return True
+    if valor.lower() in ('0', 'false', 'no'):
+        return False
+    raise ValidationError({"error": f"'{nombre}' debe ser true o false"})
+
+def _entero(request, nombre):
+    valor = request.query_params.get(nombre)
+    if valor and not valor.isdigit():
+        raise ValidationError({"error": f"'{nombre}' debe ser un id"})
+    return valor or None
+
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def exportar_pedidos(request):
+    """Ítems de pedidos. ?desde&hasta&estado=PAGADO|PENDIENTE|FALLIDO&user=<id>&formato=csv|xlsx"""
+    formato = _formato(request)
+    estado = request.query_params.get('estado')
+    if estado and estado not in dict(Pedido.ESTADO_CHOICES):
+        raise ValidationError({"error": "estado no válido"})
+    encabezado, filas = exportaciones.filas_pedidos(
+        desde=_fecha(request, 'desde', None), hasta=_fecha(request, 'hasta', None),
+        estado=estado, user_id=_entero(request, 'user'),
+    )
+    return exportaciones.respuesta_exportacion('pedidos', formato, encabezado, filas)
+
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def exportar_suscripciones(request):
+    """?desde&hasta&plan=<id>&activa=true|false&formato=csv|xlsx"""
+    formato = _formato(request)
+    encabezado, filas = exportaciones.filas_suscripciones(
+        desde=_fecha(request, 'desde', None), hasta=_fecha(request, 'hasta', None),
+        plan_id=_entero(request, 'plan'), activa=_booleano(request, 'activa'),
+    )
+    return exportaciones.respuesta_exportacion('suscripciones', formato, encabezado, filas)
+
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def exportar_usuarios(request):
+    """?desde&hasta (registro)&rol=cliente|admin|contadora&activo=true|false&formato=csv|xlsx"""
+    formato = _formato(request)
+    rol = request.query_params.get('rol')
+    if rol and rol not in dict(Profile.ROLE_CHOICES):
+        raise ValidationError({"error": "rol no válido"})
+    encabezado, filas = exportaciones.filas_usuarios(
+        desde=_fecha(request, 'desde', None), hasta=_fecha(request, 'hasta', None),
+        rol=rol, activo=_booleano(request, 'activo'),
+    )
+    return exportaciones.respuesta_exportacion('usuarios', formato, encabezado, filas)
@@ -1,31 +1,134 @@
+import hashlib
 import json
-import requests
+import logging
 import time
 import re # <-- IMPORTANTE: Importamos Regex
 
 from django.conf import settings
 from django.http import HttpResponseRedirect, JsonResponse
 from django.views.decorators.csrf import csrf_exempt
-from rest_framework.decorators import api_view, permission_classes
-from rest_framework.permissions import IsAuthenticated
 
 from django.contrib.auth.models import User
 from .models import Plan, Suscripcion, Carrito, Pedido, PedidoItem, Producto 
 from django.shortcuts import get_object_or_404
 from django.db import transaction 
+from django.db.models import Case, When, F, IntegerField
+from django.utils import timezone
+from .asincrono import api_async, en_hilo
+from .boletas import encolar_boleta
+from .cache import incrementar_version
+from .reportes import registrar_pago_fallido, registrar_pedido, registrar_suscripcion
+from .reservas import (
+    StockInsuficiente, aliberar_reservas, bloquear_productos, cantidades_carrito,
+    liberar_reservas, reservar_carrito, validar_disponibilidad,
+)
+from .routers import clave_usuario, en_primaria, marcar_escritura
+from .transbank import TransbankError, get_cliente_async
 
+logger = logging.getLogger(__name__)
 
-# Credenciales de Integración (Test)
-TBK_API_KEY_ID = "597055555532"
-TBK_API_KEY_SECRET = "579B532A7440BB0C9079DED94D31EA1615BACEB56610332264630D42D0A36B1C"
-TBK_URL_CREATE = "https://webpay3gint.transbank.cl/rswebpaytransaction/api/webpay/v1.2/transactions"
 
-@api_view(['POST'])
-@permission_classes([IsAuthenticated])
-def webpay_create(request):
+def _finalizar_pedido_carrito(user, buy_order, monto_total):
+    """
+    Convierte el carrito pagado en Pedido con un número fijo de consultas, sin
+    importar cuántos ítems tenga: bloquea los productos en orden de id (evita
+    deadlocks entre compras simultáneas), valida stock en memoria, crea los
+    PedidoItem con bulk_create y descuenta stock con un solo UPDATE ... CASE.
+    La reserva hecha en webpay_create se consume aquí. Si algo falla se revierte
+    todo el pedido.
+    """
+    with transaction.atomic():
+        # Escritura primero: toma el lock de escritura (SQLite) antes de leer
+        Carrito.objects.filter(user=user).update(creado_en=F('creado_en'))
+        try:
+            carrito = Carrito.objects.get(user=user)
+        except Carrito.DoesNotExist:
+            raise Exception("Carrito no encontrado para pago")
+
+        cantidades = cantidades_carrito(carrito)
+        if not cantidades:
+            raise Exception("Intento de pago de carrito vacío")
+
+        productos = bloquear_productos(cantidades)
+        # Nuestra propia reserva no cuenta en contra; las de otros checkouts sí
+        validar_disponibilidad(productos, cantidades, excluir_orden=buy_order)
+
+        nuevo_pedido = Pedido.objects.create(
+            user=user,
+            orden_compra=buy_order,
+            monto_total=monto_total,
+            estado='PAGADO'
+        )
+        PedidoItem.objects.bulk_create([
+            PedidoItem(
+                pedido=nuevo_pedido,
+                producto_id=producto_id,
+                cantidad=cantidad,
+                precio_al_momento_compra=productos[producto_id].precio,
+            )
+            for producto_id, cantidad in cantidades.items()
+        ])
+        registrar_pedido(nuevo_pedido, cantidades, {pid: p.precio for pid, p in productos.items()})
+
+        # bulk_create no dispara señales: stock y total_vendidos se ajustan aquí mismo
+        Producto.objects.filter(id__in=cantidades).update(
+            stock=Case(
+                *[When(id=pid, then=F('stock') - cant) for pid, cant in cantidades.items()],
+                default=F('stock'), output_field=IntegerField(),
+            ),
+            total_vendidos=Case(
+                *[When(id=pid, then=F('total_vendidos') + cant) for pid, cant in cantidades.items()],
+                default=F('total_vendidos'), output_field=IntegerField(),
+            ),
+            actualizado_en=timezone.now(),
+        )
+        # Red de seguridad donde select_for_update no bloquea (SQLite)
+        if Producto.objects.filter(id__in=cantidades, stock__lt=0).exists():
+            raise Exception("Stock insuficiente al confirmar el pedido")
+
+        carrito.items.all().delete()
+        liberar_reservas(buy_order)
+
+        # La cache del catálogo depende de Producto; el UPDATE no dispara su señal
+        transaction.on_commit(lambda: incrementar_version(Producto))
+        # El pedido ya no cambia: su boleta se genera en segundo plano
+        transaction.on_commit(lambda: encolar_boleta(nuevo_pedido.id), robust=True)
+    return nuevo_pedido
+
+
+def _guardar_suscripcion(user_id, plan_id, buy_order, monto):
+    user = get_object_or_404(User, id=user_id)
+    plan = get_object_or_404(Plan, id=plan_id)
+    # Solo clasifica el pago para los reportes: se lee antes de la transacción, que
+    # así empieza escribiendo (Suscripcion.save desactiva la anterior)
+    renovada = Suscripcion.objects.filter(user=user).exists()
+    with transaction.atomic():
+        suscripcion = Suscripcion.objects.create(
+            user=user,
+            plan=plan,
+            orden_compra=buy_order
+        )
+        registrar_suscripcion(suscripcion, monto, renovada)
+    # Viene de Transbank sin JWT: se marca al comprador para que vea su plan
+    marcar_escritura(clave_usuario(user.id))
+
+
+def _guardar_pedido(user_id, buy_order, monto):
+    user = get_object_or_404(User, id=user_id)
+    _finalizar_pedido_carrito(user, buy_order, monto)
+    marcar_escritura(clave_usuario(user.id))
+
+
+# Ambas vistas son async: la llamada a Transbank (cientos de ms) se espera en el
+# event loop con el cliente httpx en vez de retener un hilo. Lo transaccional
+# (reservar stock, cerrar el pedido) sigue siendo síncrono y va con en_hilo.
+
+@api_async('POST')
+async def webpay_create(request):
     """
     1. El Frontend llama aquí para iniciar el pago.
     """
+    buy_order = None
     try:
         data = request.data
         amount = int(data.get('amount', 1000))
@@ -37,25 +140,28 @@ def webpay_create(request):
             return JsonResponse({"error": "buy_order es requerida"}, status=400)
             
         session_id = data.get('session_id', f"SES-{int(time.time())}")
+
+        # Compra de carrito: reservamos el stock ANTES de cobrar, así no se vende
+        # dos veces lo mismo y el pago no queda huérfano en webpay_return.
+        if buy_order.startswith("C"):
+            match = re.fullmatch(r'C(\d+)T(\d+)', buy_order)
+            if not match or int(match.group(1)) != request.user.id:
+                return JsonResponse({"error": "buy_order no corresponde al usuario"}, status=400)
+            carrito, _ = await Carrito.objects.aget_or_create(user=request.user)
+            try:
+                await en_hilo(reservar_carrito, request.user, carrito, buy_order)
+            except StockInsuficiente as e:
+                return JsonResponse({"error": str(e)}, status=409)
         
         # Usamos la return_url de settings.py
         return_url = settings.WEBPAY_RETURN_URL
 
-        headers = {
-            "Tbk-Api-Key-Id": TBK_API_KEY_ID,
-            "Tbk-Api-Key-Secret": TBK_API_KEY_SECRET,
-            "Content-Type": "application/json",
-        }
-
-        payload = {
-            "buy_order": buy_order,
-            "session_id": session_id,
-            "amount": amount,
-            "return_url": return_url,
-        }
-
-        response = requests.post(TBK_URL_CREATE, headers=headers, json=payload)
-        resp_data = response.json()
+        try:
+            response = await get_cliente_async().crear_transaccion(buy_order, session_id, amount, return_url)
+        except TransbankError as e:
+            await aliberar_reservas(buy_order)
+            return JsonResponse({"error": str(e)}, status=503)
+        resp_data = response.data
 
         if response.status_code == 200 and "token" in resp_data:
             return JsonResponse({
@@ -64,15 +170,39 @@ def webpay_create(request):
                 "buy_order": buy_order
             })
         else:
+            await aliberar_reservas(buy_order)
             return JsonResponse({"error": "Error creando transacción en Transbank", "details": resp_data}, status=400)
 
     except Exception as e:
+        if buy_order:
+            await aliberar_reservas(buy_order)
         return JsonResponse({"error": str(e)}, status=500)
 
 
+# Estados de Transbank en que el cobro se hizo: la reserva ya no se puede soltar
+ESTADOS_PAGADOS = {"AUTHORIZED", "CAPTURED"}
+
+
+async def _aborto_confirmado(tbk_token, buy_order):
+    """
+    Cualquiera puede llamar a webpay_return con un TBK_TOKEN y una orden ajena:
+    solo se libera la reserva si Transbank dice que ese token es de esa orden y
+    que no se cobró. Si no se puede confirmar, la reserva vence sola.
+    """
+    try:
+        response = await get_cliente_async().estado_transaccion(tbk_token)
+    except TransbankError:
+        return False
+    return (
+        response.status_code == 200
+        and response.data.get("buy_order") == buy_order
+        and response.data.get("status") not in ESTADOS_PAGADOS
+    )
+
+
 @csrf_exempt
-@transaction.atomic 
-def webpay_return(request):
+@en_primaria  # Los "ya existe" de abajo no pueden leer una réplica atrasada
+async def webpay_return(request):
     """
     2. Transbank devuelve al usuario aquí.
     3. Confirmamos la transacción.
@@ -83,22 +213,29 @@ def webpay_return(request):
     
     tbk_token = request.POST.get("TBK_TOKEN") or request.GET.get("TBK_TOKEN")
     if tbk_token and not token:
+        # Pago abortado: devolvemos el stock reservado
+        orden_abortada = request.POST.get("TBK_ORDEN_COMPRA") or request.GET.get("TBK_ORDEN_COMPRA")
+        if orden_abortada and await _aborto_confirmado(tbk_token, orden_abortada):
+            await aliberar_reservas(orden_abortada)
         frontend_url = f"{settings.WEBPAY_FINAL_URL}?status=aborted"
         return HttpResponseRedirect(frontend_url)
 
     if not token:
         return JsonResponse({"error": "Token no recibido"}, status=400)
 
-    # Confirmar transacción (PUT)
-    url_commit = f"{TBK_URL_CREATE}/{token}"
-    headers = {
-        "Tbk-Api-Key-Id": TBK_API_KEY_ID,
-        "Tbk-Api-Key-Secret": TBK_API_KEY_SECRET,
-        "Content-Type": "application/json",
-    }
-
-    response = requests.put(url_commit, headers=headers)
-    result = response.json()
+    # Confirmar transacción (PUT). Va fuera de cualquier transacción de BD: la
+    # llamada puede tardar y no debe retener locks; cada escritura abre la suya.
+    try:
+        response = await get_cliente_async().confirmar_transaccion(token)
+    except TransbankError as e:
+        # No sabemos si el cobro se aplicó: la reserva queda hasta su vencimiento
+        # El token basta para consultar o confirmar el pago: se registra solo su huella
+        logger.warning(
+            "No se pudo confirmar el token %s…: %s",
+            hashlib.sha256(token.encode()).hexdigest()[:12], e,
+        )
+        return HttpResponseRedirect(f"{settings.WEBPAY_FINAL_URL}?status=failed")
+    result = response.data
     
     status = "failed"
     buy_order = result.get('buy_order', '')
@@ -110,7 +247,7 @@ def webpay_return(request):
             # A. ¿Es una compra de Plan?
             # Formato: P<plan.id>U<user.id>T<timestamp>
             if buy_order.startswith("P"): # <-- MODIFICADO
-                if not Suscripcion.objects.filter(orden_compra=buy_order).exists():
+                if not await Suscripcion.objects.filter(orden_compra=buy_order).aexists():
                 
                     # --- MODIFICADO: Parsear la nueva buy_order CORTA ---
                     match = re.search(r'P(\d+)U(\d+)T(\d+)', buy_order)
@@ -121,19 +258,12 @@ def webpay_return(request):
                     user_id = match.group(2)
                     # --- FIN MODIFICACIÓN ---
                     
-                    user = get_object_or_404(User, id=user_id)
-                    plan = get_object_or_404(Plan, id=plan_id)
-                    
-                    Suscripcion.objects.create(
-                        user=user,
-                        plan=plan,
-                        orden_compra=buy_order
-                    )
+                    await en_hilo(_guardar_suscripcion, user_id, plan_id, buy_order, int(result.get('amount', 0)))
             
             # B. ¿Es una compra de Carrito?
             # Formato: C<user.id>T<timestamp>
             elif buy_order.startswith("C"): # <-- MODIFICADO
-                if not Pedido.objects.filter(orden_compra=buy_order).exists():
+                if not await Pedido.objects.filter(orden_compra=buy_order).aexists():
                 
                     # --- MODIFICADO: Parsear la nueva buy_order CORTA ---
                     match = re.search(r'C(\d+)T(\d+)', buy_order)
@@ -143,47 +273,20 @@ def webpay_return(request):
                     user_id = match.group(1)
                     # --- FIN MODIFICACIÓN ---
 
-                    user = get_object_or_404(User, id=user_id)
-                    
-                    try:
-                        carrito = Carrito.objects.get(user=user)
-                    except Carrito.DoesNotExist:
-                        raise Exception("Carrito no encontrado para pago")
-
-                    nuevo_pedido = Pedido.objects.create(
-                        user=user,
-                        orden_compra=buy_order,
-                        monto_total=result.get('amount', 0),
-                        estado='PAGADO'
-                    )
-
-                    items_carrito = carrito.items.all()
-                    
-                    if not items_carrito.exists():
-                         raise Exception("Intento de pago de carrito vacío")
-
-                    for item in items_carrito:
-                        PedidoItem.objects.create(
-                            pedido=nuevo_pedido,
-                            producto=item.producto,
-                            cantidad=item.cantidad,
-                            precio_al_momento_compra=item.producto.precio
-                        )
-                        
-                        producto_a_actualizar = Producto.objects.select_for_update().get(id=item.producto.id)
-                        
-                        if producto_a_actualizar.stock < item.cantidad:
-                            raise Exception(f"Stock insuficiente para {producto_a_actualizar.nombre}")
-                        
-                        producto_a_actualizar.stock -= item.cantidad
-                        producto_a_actualizar.save()
-                    
-                    items_carrito.delete()
+                    await en_hilo(_guardar_pedido, user_id, buy_order, result.get('amount', 0))
 
-        except Exception as e:
-            print(f"Error grave al guardar orden {buy_order}: {str(e)}")
+        except Exception:
+            logger.exception("Error grave al guardar orden %s", buy_order)
             status = "failed_post_payment"
+
+    # Solo un rechazo real de Transbank: un token_ws inventado recibe 4xx y no cuenta
+    if status == "failed" and response.status_code == 200:
+        await en_hilo(registrar_pago_fallido)
+
+    # Pago rechazado o pedido no guardado: el stock reservado vuelve a estar disponible
+    if status != "success" and buy_order:
+        await aliberar_reservas(buy_order)
     
     frontend_url = f"{settings.WEBPAY_FINAL_URL}?status={status}&amount={result.get('amount', 0)}&buy_order={buy_order}"
     
-    return HttpResponseRedirect(frontend_url)
\ No newline at end of file
+    return HttpResponseRedirect(frontend_url)
@@ -1,19 +1,7 @@
 import React, { useState, useEffect, useRef, useCallback } from "react"; // <-- AÑADIDO useCallback
 import { Link } from "react-router-dom";
-<<<<<<< HEAD
-<<<<<<< HEAD
-<<<<<<< HEAD
 import { useCart } from "../context/CartContext"; 
 import API_URL from "../api"; // Necesario para la API de Notificaciones
-=======
-import { useCart } from "../context/CartContext"; // <-- Importamos el hook del carrito
->>>>>>> parent of 281861c (se añadió el blog y sus respectivas funciones)
-=======
-import { useCart } from "../context/CartContext"; // <-- Importamos el hook del carrito
->>>>>>> parent of 281861c (se añadió el blog y sus respectivas funciones)
-=======
-import { useCart } from "../context/CartContext"; // <-- Importamos el hook del carrito
->>>>>>> parent of 281861c (se añadió el blog y sus respectivas funciones)
 
 // --- ICONOS ---
 const DumbbellIcon = () => (
@@ -58,9 +46,6 @@ const formatDateTime = (isoString) => {
 };
 
 function Navbar({ token, onLogout, role }) {
-<<<<<<< HEAD
-<<<<<<< HEAD
-<<<<<<< HEAD
   const { itemCount } = useCart();
   const [notificaciones, setNotificaciones] = useState([]);
   
@@ -73,15 +58,6 @@ function Navbar({ token, onLogout, role }) {
   const notifRef = useRef(null);
   const userMenuRef = useRef(null);
   const adminMenuRef = useRef(null);
-=======
-  const { itemCount } = useCart(); // <-- Obtenemos el contador de items
->>>>>>> parent of 281861c (se añadió el blog y sus respectivas funciones)
-=======
-  const { itemCount } = useCart(); // <-- Obtenemos el contador de items
->>>>>>> parent of 281861c (se añadió el blog y sus respectivas funciones)
-=======
-  const { itemCount } = useCart(); // <-- Obtenemos el contador de items
->>>>>>> parent of 281861c (se añadió el blog y sus respectivas funciones)
   
   const isAdmin = role === "admin";
   const isStaff = role === "contadora";
@@ -94,16 +70,78 @@ function Navbar({ token, onLogout, role }) {
           if (res.ok) {
               const data = await res.json();
               if (Array.isArray(data)) setNotificaciones(data);
+              return data;
           }
       } catch (err) { console.error(err); }
 
   }, [token]);
 
+  // --- STREAM DE NOTIFICACIONES (SSE) ---
+  // Carga inicial por REST y luego el servidor empuja los cambios. El JWT no va en
+  // la URL: cada conexión usa un ticket de un solo uso pedido por POST, así que al
+  // caerse reconectamos nosotros (con ticket nuevo) desde el último id recibido.
   useEffect(() => {
-      fetchNotificaciones();
-      const interval = setInterval(fetchNotificaciones, 10000);
-      return () => clearInterval(interval);
-  }, [fetchNotificaciones]); // Dependencia fetchNotificaciones
+      if (!token) return;
+      let source = null;
+      let reintento = null;
+      let cerrado = false;
+      let ultimoId = 0;
+
+      const conectar = async () => {
+          let ticket = null;
+          try {
+              const res = await fetch(`${API_URL}/notificaciones/stream/ticket/`, {
+                  method: 'POST',
+                  headers: { Authorization: `Bearer ${token}` }
+              });
+              if (res.ok) ticket = (await res.json()).ticket;
+          } catch (err) { console.error(err); }
+          if (cerrado) return;
+          if (!ticket) {
+              reintento = setTimeout(conectar, 5000);
+              return;
+          }
+
+          source = new EventSource(
+              `${API_URL}/notificaciones/stream/?ticket=${encodeURIComponent(ticket)}&last_event_id=${ultimoId}`
+          );
+          source.onerror = () => {
+              source.close();
+              if (!cerrado) reintento = setTimeout(conectar, 5000);
+          };
+
+          source.addEventListener('notificacion', (e) => {
+              const nueva = JSON.parse(e.data);
+              ultimoId = Math.max(ultimoId, nueva.id);
+              setNotificaciones(prev => prev.some(n => n.id === nueva.id) ? prev : [nueva, ...prev]);
+          });
+          source.addEventListener('actualizada', (e) => {
+              const editada = JSON.parse(e.data);
+              setNotificaciones(prev => prev.map(n => n.id === editada.id ? { ...editada, leida: n.leida } : n));
+          });
+          source.addEventListener('eliminada', (e) => {
+              const { id } = JSON.parse(e.data);
+              setNotificaciones(prev => prev.filter(n => n.id !== id));
+          });
+          source.addEventListener('leida', (e) => {
+              const { ids } = JSON.parse(e.data);
+              setNotificaciones(prev => prev.map(n => ids.includes(n.id) ? { ...n, leida: true } : n));
+          });
+      };
+
+      fetchNotificaciones().then((data) => {
+          if (cerrado) return;
+          // Pedimos al stream lo creado después de la última que ya tenemos
+          ultimoId = Array.isArray(data) && data.length ? Math.max(...data.map(n => n.id)) : 0;
+          conectar();
+      });
+
+      return () => {
+          cerrado = true;
+          clearTimeout(reintento);
+          if (source) source.close();
+      };
+  }, [token, fetchNotificaciones]);
 
   const unreadCount = notificaciones.filter(n => !n.leida).length;
 
@@ -114,7 +152,7 @@ function Navbar({ token, onLogout, role }) {
                   method: 'POST',
                   headers: { Authorization: `Bearer ${token}` }
               });
-              // Nota: Dejamos que el poll (cada 10s) actualice el estado a gris
+              // Nota: El stream (evento 'leida') actualiza el estado a gris
               // Nota: No actualizamos el estado local 'leida' aquí para que
               // el usuario siga viéndolas resaltadas hasta la próxima recarga.
 
@@ -161,63 +199,11 @@ function Navbar({ token, onLogout, role }) {
       {/* --- 3. DERECHA: ACCIONES --- */}
       <div className="flex items-center gap-3 sm:gap-4">
         
-<<<<<<< HEAD
         <div className="md:hidden flex gap-3">
             <Link to="/" className="text-neutral-300 hover:text-white">Tienda</Link>
             <Link to="/planes" className="text-neutral-300 hover:text-white">Planes</Link>
         </div>
 
-=======
-        {/* --- LINKS PÚBLICOS (Visibles para todos) --- */}
-        <Link
-          to="/"
-          className="text-neutral-300 font-medium px-3 py-2 rounded-lg transition-all duration-200 hover:bg-neutral-800 hover:text-white"
-        >
-          Tienda
-        </Link>
-        <Link
-          to="/planes"
-          className="text-neutral-300 font-medium px-3 py-2 rounded-lg transition-all duration-200 hover:bg-neutral-800 hover:text-white"
-        >
-          Planes
-        </Link>
-
-        {/* --- LINKS DE ADMIN/STAFF --- */}
-        {token && isAdmin && (
-          <Link
-            to="/gestion-usuarios"
-            className="px-3 py-2 bg-purple-600 hover:bg-purple-700 text-white rounded-lg transition-all duration-300 font-semibold flex items-center gap-2 shadow-md hover:shadow-lg"
-            title="Gestión de Usuarios"
-          >
-            <svg xmlns="http://www.w3.org/2000/svg" className="h-5 w-5" fill="currentColor" viewBox="0 0 20 20"><path d="M13 7a3 3 0 11-6 0 3 3 0 016 0z" /><path fillRule="evenodd" d="M5 14a7 7 0 1110 0H5z" /></svg>
-            <span className="hidden lg:inline">Usuarios</span>
-          </Link>
-        )}
-        {token && (isAdmin || isStaff) && (
-          <Link
-            to="/publicar-producto"
-            className="px-3 py-2 bg-green-600 hover:bg-green-700 text-white rounded-lg transition-all duration-300 font-semibold flex items-center gap-2 shadow-md hover:shadow-lg"
-            title="Gestión de Productos"
-          >
-            <svg xmlns="http://www.w3.org/2000/svg" className="h-5 w-5" fill="currentColor" viewBox="0 0 20 20"><path fillRule="evenodd" d="M10 3a1 1 0 011 1v5h5a1 1 0 110 2h-5v5a1 1 0 11-2 0v-5H4a1 1 0 110-2h5V4a1 1 0 011-1z" clipRule="evenodd" /></svg>
-            <span className="hidden lg:inline">Producto</span>
-          </Link>
-        )}
-        {token && (isAdmin || isStaff) && (
-          <Link
-            to="/gestion-planes"
-            className="px-3 py-2 bg-yellow-600 hover:bg-yellow-700 text-white rounded-lg transition-all duration-300 font-semibold flex items-center gap-2 shadow-md hover:shadow-lg"
-            title="Gestión de Planes"
-          >
-            <svg xmlns="http://www.w3.org/2000/svg" className="h-5 w-5" fill="currentColor" viewBox="0 0 20 20"><path d="M5 3a2 2 0 00-2 2v2a2 2 0 002 2h10a2 2 0 002-2V5a2 2 0 00-2-2H5z" /><path fillRule="evenodd" d="M3 11a2 2 0 012-2h10a2 2 0 012 2v4a2 2 0 01-2 2H5a2 2 0 01-2-2v-4z" clipRule="evenodd" /></svg>
-            <span className="hidden lg:inline">Planes</span>
-          </Link>
-        )}
-        {/* --- FIN LINKS ADMIN/STAFF --- */}
-
-
-        {/* --- LINKS DE AUTENTICACIÓN --- */}
->>>>>>> parent of 281861c (se añadió el blog y sus respectivas funciones)
         {token ? (
           <>
             {/* --- MENÚ ADMIN --- */}
@@ -244,9 +230,6 @@ function Navbar({ token, onLogout, role }) {
                 </div>
             )}
 
-<<<<<<< HEAD
-<<<<<<< HEAD
-<<<<<<< HEAD
             {/* --- CAMPANA DE NOTIFICACIONES --- */}
             <div className="relative" ref={notifRef}>
                 <button 
@@ -291,41 +274,6 @@ function Navbar({ token, onLogout, role }) {
             </div>
 
             {/* --- CARRITO --- */}
-=======
-=======
->>>>>>> parent of 281861c (se añadió el blog y sus respectivas funciones)
-=======
->>>>>>> parent of 281861c (se añadió el blog y sus respectivas funciones)
-            {/* --- AÑADIDO: Enlace a Historial de Pedidos --- */}
-            <Link
-              to="/historial"
-              className="text-neutral-300 font-medium px-3 py-2 rounded-lg transition-all duration-200 hover:bg-neutral-800 hover:text-white"
-            >
-              Mis Pedidos
-            </Link>
-            
-            <Link
-              to="/profile"
-              className="text-neutral-300 font-medium px-3 py-2 rounded-lg transition-all duration-200 hover:bg-neutral-800 hover:text-white"
-            >
-              Perfil
-            </Link>
-            
-            <button
-              onClick={onLogout}
-              className="px-4 py-2 bg-red-600 hover:bg-red-700 text-white rounded-lg transition-all duration-300 font-semibold shadow-md hover:shadow-lg"
-            >
-              Cerrar sesión
-            </button>
-
-            {/* --- ÍCONO DE CARRITO (NUEVO) --- */}
-<<<<<<< HEAD
-<<<<<<< HEAD
->>>>>>> parent of 281861c (se añadió el blog y sus respectivas funciones)
-=======
->>>>>>> parent of 281861c (se añadió el blog y sus respectivas funciones)
-=======
->>>>>>> parent of 281861c (se añadió el blog y sus respectivas funciones)
             <Link to="/carrito" className="relative text-neutral-300 p-2 rounded-full transition-all hover:bg-neutral-800 hover:text-white">
               <svg xmlns="http://www.w3.org/2000/svg" className="h-6 w-6" fill="none" viewBox="0 0 24 24" stroke="currentColor" strokeWidth={2}>
                 <path strokeLinecap="round" strokeLinejoin="round" d="M3 3h2l.4 2M7 13h10l4-8H5.4M7 13L5.4 5M7 13l-2.293 2.293c-.63.63-.184 1.707.707 1.707H17m0 0a2 2 0 100 4 2 2 0 000-4zm-8 2a2 2 0 11-4 0 2 2 0 014 0z" />
@@ -6,6 +6,13 @@ import toast from 'react-hot-toast'; // <-- AÑADIR IMPORT
 const CartContext = createContext();
 export const useCart = () => useContext(CartContext);
 
+// Token firmado del carrito de invitado; se manda al iniciar sesión para fusionarlo
+export const GUEST_CART_KEY = 'carritoInvitado';
+const guestHeaders = () => {
+  const token = localStorage.getItem(GUEST_CART_KEY);
+  return token ? { 'X-Carrito-Invitado': token } : {};
+};
+
 export const CartProvider = ({ children }) => {
   const { authToken } = useAuth();
   const [cartItems, setCartItems] = useState([]);
@@ -19,14 +26,12 @@ export const CartProvider = ({ children }) => {
   };
 
   const fetchCart = useCallback(async () => {
-    if (!authToken) {
-      updateCartState({}); 
-      return;
-    }
     try {
-      const res = await fetch(`${API_URL}/carrito/`, {
-        headers: { Authorization: `Bearer ${authToken}` },
-      });
+      const res = authToken
+        ? await fetch(`${API_URL}/carrito/`, {
+            headers: { Authorization: `Bearer ${authToken}` },
+          })
+        : await fetch(`${API_URL}/carrito/invitado/`, { headers: guestHeaders() });
       const data = await res.json();
       if (res.ok) {
         updateCartState(data);
@@ -40,89 +45,85 @@ export const CartProvider = ({ children }) => {
     fetchCart();
   }, [fetchCart]); 
 
-  const addToCart = async (producto) => {
-    if (!authToken) {
-      toast.error('Debes iniciar sesión para agregar productos'); // <-- MODIFICADO
-      return;
-    }
-    try {
-      const res = await fetch(`${API_URL}/carrito/agregar/`, {
-        method: 'POST',
-        headers: {
-          Authorization: `Bearer ${authToken}`,
-          'Content-Type': 'application/json',
-        },
-        body: JSON.stringify({ producto_id: producto.id, cantidad: 1 }),
-      });
-      const data = await res.json(); 
-      if (res.ok) {
-        updateCartState(data); 
-        toast.success(`${producto.nombre} añadido al carrito`); // <-- MODIFICADO
-      } else {
-        toast.error('Error al añadir producto'); // <-- MODIFICADO
-      }
-    } catch (err) {
-      console.error(err);
-      toast.error('Error de conexión'); // <-- MODIFICADO
-    }
+  // Aplica el diff de /carrito/batch/: reemplaza los ítems modificados por producto,
+  // agrega los nuevos y quita los eliminados, sin volver a pedir el carrito entero.
+  const mergeCartDiff = (diff) => {
+    setCartItems((items) => {
+      const actualizados = new Map(diff.actualizados.map((item) => [item.producto, item]));
+      const restantes = items
+        .filter((item) => !diff.eliminados.includes(item.producto))
+        .map((item) => actualizados.get(item.producto) || item);
+      const nuevos = diff.actualizados.filter(
+        (item) => !items.some((actual) => actual.producto === item.producto)
+      );
+      return [...restantes, ...nuevos];
+    });
+    setCartTotal(diff.total || 0);
+    setItemCount(diff.unidades || 0);
   };
 
-  const increaseQuantity = async (item) => {
-    if (!authToken) return;
+  // Sin sesión, las mismas operaciones van al carrito de invitado, que responde
+  // el carrito completo y el token a guardar.
+  const syncGuestCart = async (operaciones) => {
     try {
-      const res = await fetch(`${API_URL}/carrito/item/${item.id}/actualizar/`, {
-        method: 'PATCH',
-        headers: {
-          Authorization: `Bearer ${authToken}`,
-          'Content-Type': 'application/json',
-        },
-        body: JSON.stringify({ cantidad: item.cantidad + 1 }),
+      const res = await fetch(`${API_URL}/carrito/invitado/`, {
+        method: 'POST',
+        headers: { ...guestHeaders(), 'Content-Type': 'application/json' },
+        body: JSON.stringify({ operaciones }),
       });
       const data = await res.json();
-      if (res.ok) updateCartState(data);
+      if (!res.ok) return false;
+      localStorage.setItem(GUEST_CART_KEY, data.token);
+      updateCartState(data);
+      return true;
     } catch (err) {
       console.error(err);
+      return false;
     }
   };
 
-  const decreaseQuantity = async (item) => {
-    if (!authToken) return;
-    const nuevaCantidad = item.cantidad - 1;
-    
-    if (nuevaCantidad <= 0) return removeFromCart(item);
-    
+  // Envía varias operaciones ({ op: 'add' | 'set' | 'remove', producto_id, cantidad })
+  // en una sola petición. Devuelve true si el servidor las aplicó.
+  const syncCart = async (operaciones) => {
+    if (!authToken) return syncGuestCart(operaciones);
     try {
-      const res = await fetch(`${API_URL}/carrito/item/${item.id}/actualizar/`, {
-        method: 'PATCH',
+      const res = await fetch(`${API_URL}/carrito/batch/`, {
+        method: 'POST',
         headers: {
           Authorization: `Bearer ${authToken}`,
           'Content-Type': 'application/json',
         },
-        body: JSON.stringify({ cantidad: nuevaCantidad }),
+        body: JSON.stringify({ operaciones }),
       });
       const data = await res.json();
-      if (res.ok) updateCartState(data);
+      if (!res.ok) return false;
+      mergeCartDiff(data);
+      return true;
     } catch (err) {
       console.error(err);
+      return false;
     }
   };
 
-  const removeFromCart = async (item) => {
-    if (!authToken) return;
-    try {
-      const res = await fetch(`${API_URL}/carrito/item/${item.id}/eliminar/`, {
-        method: 'DELETE',
-        headers: { Authorization: `Bearer ${authToken}` },
-      });
-      const data = await res.json();
-      if (res.ok) updateCartState(data);
-    } catch (err) {
-      console.error(err);
+  const addToCart = async (producto) => {
+    const ok = await syncCart([{ op: 'add', producto_id: producto.id, cantidad: 1 }]);
+    if (ok) {
+      toast.success(`${producto.nombre} añadido al carrito`); // <-- MODIFICADO
+    } else {
+      toast.error('Error al añadir producto'); // <-- MODIFICADO
     }
   };
 
+  const increaseQuantity = (item) =>
+    syncCart([{ op: 'add', producto_id: item.producto, cantidad: 1 }]);
+
+  const decreaseQuantity = (item) =>
+    syncCart([{ op: 'add', producto_id: item.producto, cantidad: -1 }]);
+
+  const removeFromCart = (item) =>
+    syncCart([{ op: 'remove', producto_id: item.producto }]);
+
   const clearCart = async (confirm = true) => {
-    if (!authToken) return;
     
     // --- MODIFICADO: Usamos toast.custom para el confirm ---
     if (confirm) {
@@ -156,7 +157,12 @@ export const CartProvider = ({ children }) => {
   
   // Función interna para no duplicar código
   const executeClearCart = async () => {
-    if (!authToken) return;
+    if (!authToken) {
+      localStorage.removeItem(GUEST_CART_KEY);
+      updateCartState({});
+      toast.success('Carrito vaciado');
+      return;
+    }
     try {
       const res = await fetch(`${API_URL}/carrito/vaciar/`, {
         method: 'POST',
@@ -186,6 +192,7 @@ export const CartProvider = ({ children }) => {
     itemCount,
     totalPrice: cartTotal,
     fetchCart,
+    syncCart,
   };
 
   return <CartContext.Provider value={value}>{children}</CartContext.Provider>;
@@ -15,6 +15,9 @@ const getImageUrl = (path) => {
   return path.startsWith("http") ? path : `${BACKEND_BASE_URL}${path.startsWith("/") ? path : "/" + path}`;
 };
 
+const getSrcSet = (variantes) =>
+  (variantes || []).map((v) => `${getImageUrl(v.url)} ${v.ancho}w`).join(", ") || undefined;
+
 function Carrito() {
   const { cartItems, removeFromCart, increaseQuantity, decreaseQuantity, clearCart, itemCount, totalPrice } = useCart();
   const { authToken, user } = useAuth(); 
@@ -90,6 +93,9 @@ function Carrito() {
         form.appendChild(tokenInput);
         document.body.appendChild(form);
         form.submit();
+      } else if (response.status === 409) {
+        // Sin stock suficiente para reservar el carrito
+        toast.error(data.error);
       } else {
         toast.error("No se pudo iniciar la transacción con Webpay."); 
         console.error("Error en respuesta de Webpay:", data);
@@ -129,9 +135,11 @@ function Carrito() {
           {/* Columna de Items */}
           <div className="lg:col-span-2 space-y-4">
             {cartItems.map((item) => (
-              <div key={item.id} className="flex items-center bg-neutral-900 border border-neutral-800 rounded-xl p-4 shadow-lg">
+              <div key={item.producto} className="flex items-center bg-neutral-900 border border-neutral-800 rounded-xl p-4 shadow-lg">
                 <img
                   src={getImageUrl(item.imagen_producto) || "https://placehold.co/100x100/374151/9ca3af?text=N/A"}
+                  srcSet={getSrcSet(item.imagen_producto_variantes)}
+                  sizes="96px"
                   alt={item.nombre_producto}
                   className="w-20 h-20 sm:w-24 sm:h-24 object-cover rounded-lg"
                 />
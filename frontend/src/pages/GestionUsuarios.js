@@ -12,18 +12,28 @@ function GestionUsuarios() {
   const [activo, setActivo] = useState(true);
   const [role, setRole] = useState("cliente");
 
+  const [busqueda, setBusqueda] = useState("");
+  const [filtroRol, setFiltroRol] = useState("");
+  const [nextUrl, setNextUrl] = useState(null);
+  const [cargandoMas, setCargandoMas] = useState(false);
+
   const token = localStorage.getItem("token");
 
-  // --- fetchUsuarios dentro de useEffect para evitar warning ESLint ---
+  // --- La lista viene paginada por cursor; búsqueda y rol se filtran en el servidor ---
   useEffect(() => {
+    const params = new URLSearchParams();
+    if (busqueda.trim()) params.set("search", busqueda.trim());
+    if (filtroRol) params.set("role", filtroRol);
+
     const fetchUsuarios = async () => {
       try {
-        const response = await fetch(`${API_URL}/usuarios/`, {
+        const response = await fetch(`${API_URL}/usuarios/?${params.toString()}`, {
           headers: { Authorization: `Bearer ${token}` },
         });
         if (response.ok) {
           const data = await response.json();
-          setUsuarios(data);
+          setUsuarios(data.results);
+          setNextUrl(data.next);
         } else {
           console.error("Error al traer usuarios:", response.status);
         }
@@ -32,8 +42,29 @@ function GestionUsuarios() {
       }
     };
 
-    fetchUsuarios();
-  }, [token]);
+    // Espera a que el usuario deje de escribir antes de consultar
+    const timer = setTimeout(fetchUsuarios, 300);
+    return () => clearTimeout(timer);
+  }, [token, busqueda, filtroRol]);
+
+  const cargarMas = async () => {
+    if (!nextUrl) return;
+    setCargandoMas(true);
+    try {
+      const response = await fetch(nextUrl, {
+        headers: { Authorization: `Bearer ${token}` },
+      });
+      if (response.ok) {
+        const data = await response.json();
+        setUsuarios((prev) => [...prev, ...data.results]);
+        setNextUrl(data.next);
+      }
+    } catch (error) {
+      console.error("Error de red:", error);
+    } finally {
+      setCargandoMas(false);
+    }
+  };
 
   const handleEdit = (user) => {
     setEditingUser(user);
@@ -187,6 +218,25 @@ function GestionUsuarios() {
 
       {/* --- Tabla de usuarios --- */}
       <div className="bg-neutral-900 p-6 rounded-xl shadow-lg border border-neutral-800 max-w-5xl mx-auto overflow-x-auto">
+        <div className="flex flex-col md:flex-row gap-4 mb-4">
+          <input
+            type="text"
+            placeholder="Buscar por usuario, RUT o email"
+            value={busqueda}
+            onChange={(e) => setBusqueda(e.target.value)}
+            className="flex-1 p-2 rounded bg-neutral-800 border border-neutral-700"
+          />
+          <select
+            value={filtroRol}
+            onChange={(e) => setFiltroRol(e.target.value)}
+            className="p-2 rounded bg-neutral-800 border border-neutral-700"
+          >
+            <option value="">Todos los roles</option>
+            <option value="cliente">Cliente</option>
+            <option value="admin">Administrador</option>
+            <option value="contadora">Contadora</option>
+          </select>
+        </div>
         <table className="w-full text-left border-collapse">
           <thead>
             <tr className="text-neutral-400 text-sm uppercase tracking-wider border-b border-neutral-800">
@@ -228,6 +278,17 @@ function GestionUsuarios() {
             )}
           </tbody>
         </table>
+        {nextUrl && (
+          <div className="text-center mt-4">
+            <button
+              onClick={cargarMas}
+              disabled={cargandoMas}
+              className="px-6 py-2 rounded-lg bg-blue-600 hover:bg-blue-700 disabled:opacity-50 text-white font-semibold transition-colors"
+            >
+              {cargandoMas ? "Cargando..." : "Cargar más usuarios"}
+            </button>
+          </div>
+        )}
       </div>
     </div>
   );
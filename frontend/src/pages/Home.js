@@ -16,6 +16,13 @@ const getImageUrl = (path) => {
   return path.startsWith("http") ? path : `${BACKEND_BASE_URL}${path.startsWith("/") ? path : "/" + path}`;
 };
 
+// srcset con las variantes WebP del backend ([{ancho, url}]); el navegador elige la más chica que sirva
+const getSrcSet = (variantes) =>
+  (variantes || []).map((v) => `${getImageUrl(v.url)} ${v.ancho}w`).join(", ") || undefined;
+
+// Solo pedimos al backend los campos que usa la tarjeta (sparse fieldset)
+const CAMPOS_GRILLA = "id,nombre,precio,imagen,imagen_variantes,stock,rating_promedio,total_vendidos";
+
 // --- NUEVO: Lógica para formatear cantidad vendida ---
 const formatVentas = (cantidad) => {
     if (!cantidad) return "0 vendidos";
@@ -54,6 +61,9 @@ const ProductCard = ({ producto, onAddToCart, cantidadEnCarro }) => {
         <div className="aspect-square w-full overflow-hidden">
           <img
             src={imageUrl || "https://placehold.co/400x400/374151/9ca3af?text=Sin+Imagen"}
+            srcSet={getSrcSet(producto.imagen_variantes)}
+            sizes="(min-width: 1024px) 25vw, (min-width: 640px) 50vw, 100vw"
+            loading="lazy"
             alt={producto.nombre}
             className="w-full h-full object-cover transition-transform duration-500 group-hover:scale-110"
           />
@@ -104,22 +114,40 @@ const ProductCard = ({ producto, onAddToCart, cantidadEnCarro }) => {
 
 function Home({ token }) {
   const [productos, setProductos] = useState([]);
+  const [nextUrl, setNextUrl] = useState(null);
   const [loading, setLoading] = useState(true);
+  const [loadingMore, setLoadingMore] = useState(false);
   const navigate = useNavigate();
   const { addToCart, cartItems } = useCart(); 
 
   const fetchProductos = useCallback(async () => {
     setLoading(true);
     try {
-      const res = await fetch(`${API_URL}/productos/`);
+      const res = await fetch(`${API_URL}/productos/?fields=${CAMPOS_GRILLA}`);
       if (res.ok) {
         const data = await res.json();
-        setProductos(data);
+        setProductos(data.results);
+        setNextUrl(data.next);
       }
     } catch (err) { console.error("Error de red:", err); }
     setLoading(false);
   }, []);
 
+  // --- Paginación por cursor: "next" ya trae el cursor y los filtros ---
+  const fetchMasProductos = async () => {
+    if (!nextUrl) return;
+    setLoadingMore(true);
+    try {
+      const res = await fetch(nextUrl);
+      if (res.ok) {
+        const data = await res.json();
+        setProductos(prev => [...prev, ...data.results]);
+        setNextUrl(data.next);
+      }
+    } catch (err) { console.error("Error de red:", err); }
+    setLoadingMore(false);
+  };
+
   useEffect(() => {
     fetchProductos();
   }, [fetchProductos]);
@@ -169,6 +197,18 @@ function Home({ token }) {
             )}
           </div>
         )}
+
+        {!loading && nextUrl && (
+          <div className="flex justify-center mt-10">
+            <button
+              onClick={fetchMasProductos}
+              disabled={loadingMore}
+              className="px-6 py-2 rounded-lg bg-blue-600 hover:bg-blue-700 disabled:opacity-50 text-white font-semibold transition-colors"
+            >
+              {loadingMore ? "Cargando..." : "Cargar más productos"}
+            </button>
+          </div>
+        )}
       </div>
     </div>
   );
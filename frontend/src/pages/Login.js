@@ -2,6 +2,7 @@ import React, { useState } from "react";
 import { useNavigate } from "react-router-dom";
 import { useAuth } from "../AuthContext";
 import API_URL from "../api";
+import { GUEST_CART_KEY } from "../context/CartContext";
 import toast from 'react-hot-toast'; // <-- AÑADIR IMPORT
 
 function Login() {
@@ -18,12 +19,18 @@ function Login() {
       const response = await fetch(`${API_URL}/token/`, {
         method: "POST",
         headers: { "Content-Type": "application/json" },
-        body: JSON.stringify({ username, password }),
+        // El carrito armado sin sesión se fusiona con el del usuario en el mismo login
+        body: JSON.stringify({
+          username,
+          password,
+          carrito_invitado: localStorage.getItem(GUEST_CART_KEY),
+        }),
       });
 
       if (response.ok) {
         const data = await response.json();
         
+        localStorage.removeItem(GUEST_CART_KEY);
         login(data.access, { username });
         
         const pendingPlanId = localStorage.getItem('pendingPlanId');
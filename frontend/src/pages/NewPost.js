@@ -40,10 +40,17 @@ function NewPost() {
 
   const fetchProductos = async () => {
     try {
-      const response = await fetch(`${API_URL}/productos/`);
-      if (response.ok) {
-        setProductos(await response.json());
+      // El catálogo viene paginado por cursor: recorremos todas las páginas
+      let url = `${API_URL}/productos/?page_size=100`;
+      const todos = [];
+      while (url) {
+        const response = await fetch(url);
+        if (!response.ok) break;
+        const data = await response.json();
+        todos.push(...data.results);
+        url = data.next;
       }
+      setProductos(todos);
     } catch (error) {
       console.error("Error cargando productos:", error);
     }